@@ -18,6 +18,9 @@
 
 import time
 import typing
+import asyncio
+import concurrent.futures
+from collections import deque
 from datetime import datetime
 
 import bittensor as bt
@@ -29,8 +32,22 @@ import sturdy
 # import base miner class which takes care of most of the boilerplate
 from sturdy.base.miner import BaseMinerNeuron
 from sturdy.constants import CHUNK_RATIO
-from sturdy.utils.lazy import lazy_allocation_algorithm
-from sturdy.utils.misc import greedy_allocation_algorithm
+from sturdy.utils.admission import RequestShed
+from sturdy.utils.ip_log import IPLog
+from sturdy.utils.lazy import (
+    lazy_allocation_algorithm,
+    lazy_and_humble_allocation_algorithm,
+)
+from sturdy.utils.misc import cached_allocation_algorithm, greedy_allocation_algorithm
+from sturdy.utils.optimal import IncrementalAllocator, optimal_allocation_algorithm
+
+# allocation algorithms selectable with --neuron.allocation_algorithm
+ALLOCATION_ALGORITHMS = {
+    "greedy": greedy_allocation_algorithm,
+    "lazy": lazy_allocation_algorithm,
+    "lazy_humble": lazy_and_humble_allocation_algorithm,
+    "optimal": optimal_allocation_algorithm,
+}
 
 
 class Miner(BaseMinerNeuron):
@@ -45,27 +62,57 @@ class Miner(BaseMinerNeuron):
     def __init__(self, config=None):
         super(Miner, self).__init__(config=config)
 
-    async def extract_ip(
-        self, synapse: sturdy.protocol.AllocateAssets
-    ):
-        try:
-            # Define the path to the file
-            file_path = '/root/ip.txt'
+        if self.config.neuron.allocation_algorithm == "incremental":
+            # keeps state, so there's one per miner
+            allocation_algorithm = IncrementalAllocator(
+                max_states=self.config.neuron.allocator_states
+            )
+        else:
+            allocation_algorithm = ALLOCATION_ALGORITHMS[
+                self.config.neuron.allocation_algorithm
+            ]
+
+        # identical pools are sent over and over again - by retries, and by every validator querying
+        # the same synthetic pools - so allocation results are cached by pool fingerprint
+        self.allocation_algorithm = cached_allocation_algorithm(
+            allocation_algorithm,
+            maxsize=self.config.neuron.allocation_cache_size,
+            ttl=self.config.neuron.allocation_cache_ttl,
+        )
+
+        # allocations are computed on worker threads, so the event loop keeps serving other requests
+        self.allocation_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.config.neuron.allocation_workers,
+            thread_name_prefix="allocation",
+        )
+        # seconds requests waited for an allocation worker
+        self.queue_delays = deque(maxlen=1024)
 
-            with open(file_path) as f:
-                ip_addresses = f.read().strip().splitlines()
+        self.ip_log = IPLog(self.config.neuron.ip_log_path)
 
-            # Add the new IP address
-            new_ip = synapse.dendrite.ip
-            if (new_ip is not None) and (new_ip not in ip_addresses):
-                ip_addresses.append(new_ip)
+        # requests carrying several scenarios at once, see sturdy.protocol.AllocateAssetsBatch
+        self.axon.attach(
+            forward_fn=self.forward_batch,
+            blacklist_fn=self.blacklist_batch,
+            priority_fn=self.priority_batch,
+        )
 
-            # Save the updated list back to the text file
-            with open(file_path, 'w') as file:
-                for ip in ip_addresses:
-                    file.write(ip + '\n')
-        except Exception as e:
-            bt.logging.error(f"Error: {e}")
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        self.allocation_executor.shutdown(wait=False, cancel_futures=True)
+        self.ip_log.close()
+
+    def extract_ip(self, synapse: sturdy.protocol.AllocateAssets):
+        # in-memory only, the log is written to disk in the background
+        self.ip_log.add(synapse.dendrite.ip)
+
+    def allocate(
+        self, synapse: sturdy.protocol.AllocateAssets, queued: float
+    ) -> typing.Tuple[typing.Dict, float]:
+        """Runs the allocation algorithm on an allocation worker, returning the allocations and how long the request was queued."""
+        queue_delay = time.monotonic() - queued
+        self.queue_delays.append(queue_delay)
+        return self.allocation_algorithm(synapse), queue_delay
 
     async def forward(
         self, synapse: sturdy.protocol.AllocateAssets
@@ -86,21 +133,50 @@ class Miner(BaseMinerNeuron):
         start_time = datetime.now()
         # TODO: check to see that validators don't send unacceptable responses to miners???
 
-        await self.extract_ip(synapse)
+        self.extract_ip(synapse)
 
-        # use default greedy alloaction algorithm to generate allocations
         try:
-            # this is the base model
-            # synapse.allocations = greedy_allocation_algorithm(synapse)
+            synapse.unpack()
+        except ValueError as e:
+            bt.logging.error(f"Failed to unpack pools from {synapse.dendrite.hotkey}: {e}")
+            # so the validator falls back to sending the pools unpacked
+            synapse.accepted_packed_version = None
+            return synapse
+        # let the validator know it can send the pools packed from now on
+        synapse.accepted_packed_version = sturdy.protocol.PACKED_POOLS_VERSION
+
+        # use the configured allocation algorithm to generate allocations - requests are admitted
+        # by stake, and shed right away if they can't be answered before the validator's timeout
+        caller = self.hotkey_index.get(synapse.dendrite.hotkey)
+        try:
+            async with self.admission.admit(
+                synapse.dendrite.hotkey,
+                caller.stake if caller is not None else 0.0,
+                synapse.timeout,
+            ) as admission_delay:
+                allocations, queue_delay = await asyncio.get_running_loop().run_in_executor(
+                    self.allocation_executor, self.allocate, synapse, time.monotonic()
+                )
+            synapse.allocations = allocations
+            if synapse.packed_pools is not None:
+                # no need to send the pools back unpacked
+                synapse.assets_and_pools = {}
+            bt.logging.debug(
+                f"queued {admission_delay:.4f}s for admission, {queue_delay:.4f}s for an allocation worker"
+            )
 
-            # new lazy model
-            synapse.allocations = lazy_allocation_algorithm(synapse)
-            # synapse.allocations = lazy_and_humble_allocation_algorithm(synapse)
+        except RequestShed as e:
+            bt.logging.debug(
+                f"Shedding request from {synapse.dendrite.hotkey}: {e.reason} - {self.admission.stats()}"
+            )
+            self.rejections[e.reason] += 1
+            return synapse
 
         except Exception as e:
             bt.logging.error(f"Error: {e}")
 
         bt.logging.info(f"sending allocations: {synapse.allocations}")
+        bt.logging.debug(f"allocation cache: {self.allocation_algorithm.cache_info()}")
         end_time = datetime.now()
         elapsed_time = (end_time - start_time).total_seconds()
         bt.logging.info(
@@ -108,6 +184,63 @@ class Miner(BaseMinerNeuron):
         )
         return synapse
 
+    async def forward_batch(
+        self, synapse: sturdy.protocol.AllocateAssetsBatch
+    ) -> sturdy.protocol.AllocateAssetsBatch:
+        """
+        Batched counterpart of ``forward``: the request is admitted once, and its scenarios are
+        allocated over on as many allocation workers as there are free.
+        """
+        start_time = datetime.now()
+        self.extract_ip(synapse)
+
+        caller = self.hotkey_index.get(synapse.dendrite.hotkey)
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.admission.admit(
+                synapse.dendrite.hotkey,
+                caller.stake if caller is not None else 0.0,
+                synapse.timeout,
+                size=len(synapse.scenarios),
+            ) as admission_delay:
+                queued = time.monotonic()
+                results = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(
+                            self.allocation_executor,
+                            self.allocate,
+                            sturdy.protocol.AllocateAssets(
+                                assets_and_pools=assets_and_pools
+                            ),
+                            queued,
+                        )
+                        for assets_and_pools in synapse.scenarios
+                    )
+                )
+            synapse.allocations = [allocations for allocations, _ in results]
+            # no need to send the scenarios back
+            synapse.scenarios = []
+            bt.logging.debug(
+                f"queued {admission_delay:.4f}s for admission, up to "
+                f"{max((delay for _, delay in results), default=0.0):.4f}s for an allocation worker"
+            )
+
+        except RequestShed as e:
+            bt.logging.debug(
+                f"Shedding request from {synapse.dendrite.hotkey}: {e.reason} - {self.admission.stats()}"
+            )
+            self.rejections[e.reason] += 1
+            return synapse
+
+        except Exception as e:
+            bt.logging.error(f"Error: {e}")
+
+        elapsed_time = (datetime.now() - start_time).total_seconds()
+        bt.logging.info(
+            f"processed {len(synapse.allocations or [])} scenarios in {elapsed_time} seconds",
+        )
+        return synapse
+
     async def blacklist(
         self, synapse: sturdy.protocol.AllocateAssets
     ) -> typing.Tuple[bool, str]:
@@ -135,33 +268,36 @@ class Miner(BaseMinerNeuron):
         - Consider blacklisting entities that are not validators or have insufficient stake.
 
         In practice it would be wise to blacklist requests from entities that are not validators, or do not have
-        enough stake. This can be checked via metagraph.S and metagraph.validator_permit. You can always attain
-        the uid of the sender via a metagraph.hotkeys.index( synapse.dendrite.hotkey ) call.
+        enough stake. The uid, stake and validator permit of the sender can be looked up in constant time with
+        self.hotkey_index.get( synapse.dendrite.hotkey ), which is rebuilt on every metagraph resync.
 
         Otherwise, allow the request to be processed further.
         """
-        uid = self.metagraph.hotkeys.index(synapse.dendrite.hotkey)
-        if (
-            not self.config.blacklist.allow_non_registered
-            and synapse.dendrite.hotkey not in self.metagraph.hotkeys
-        ):
+        hotkey = synapse.dendrite.hotkey
+        caller = self.hotkey_index.get(hotkey)
+        if caller is None and not self.config.blacklist.allow_non_registered:
             # Ignore requests from un-registered entities.
-            bt.logging.trace(
-                f"Blacklisting un-registered hotkey {synapse.dendrite.hotkey}"
-            )
+            bt.logging.trace(f"Blacklisting un-registered hotkey {hotkey}")
+            self.rejections["unregistered"] += 1
             return True, "Unrecognized hotkey"
 
         if self.config.blacklist.force_validator_permit:
             # If the config is set to force validator permit, then we should only allow requests from validators.
-            if not self.metagraph.validator_permit[uid]:
+            if caller is None or not caller.validator_permit:
                 bt.logging.warning(
-                    f"Blacklisting a request from non-validator hotkey {synapse.dendrite.hotkey}"
+                    f"Blacklisting a request from non-validator hotkey {hotkey}"
                 )
+                self.rejections["non_validator"] += 1
                 return True, "Non-validator hotkey"
 
-        bt.logging.trace(
-            f"Not Blacklisting recognized hotkey {synapse.dendrite.hotkey}"
-        )
+        # validators are never rate limited, their queries are what the miner is scored on
+        is_validator = caller is not None and caller.validator_permit
+        if not is_validator and not self.rate_limiter.allow(hotkey):
+            bt.logging.trace(f"Blacklisting rate limited hotkey {hotkey}")
+            self.rejections["rate_limited"] += 1
+            return True, "Rate limited"
+
+        bt.logging.trace(f"Not Blacklisting recognized hotkey {hotkey}")
         return False, "Hotkey recognized!"
 
     async def priority(self, synapse: sturdy.protocol.AllocateAssets) -> float:
@@ -184,17 +320,26 @@ class Miner(BaseMinerNeuron):
         Example priority logic:
         - A higher stake results in a higher priority value.
         """
-        caller_uid = self.metagraph.hotkeys.index(
-            synapse.dendrite.hotkey
-        )  # Get the caller index.
-        prirority = float(
-            self.metagraph.S[caller_uid]
-        )  # Return the stake as the priority.
+        caller = self.hotkey_index.get(synapse.dendrite.hotkey)
+        # Return the stake as the priority, unregistered callers (if allowed) go last.
+        prirority = caller.stake if caller is not None else 0.0
         bt.logging.trace(
             f"Prioritizing {synapse.dendrite.hotkey} with value: ", prirority
         )
         return prirority
 
+    async def blacklist_batch(
+        self, synapse: sturdy.protocol.AllocateAssetsBatch
+    ) -> typing.Tuple[bool, str]:
+        """Same as ``blacklist``, for batched requests."""
+        return await self.blacklist(synapse)
+
+    async def priority_batch(
+        self, synapse: sturdy.protocol.AllocateAssetsBatch
+    ) -> float:
+        """Same as ``priority``, for batched requests."""
+        return await self.priority(synapse)
+
 
 # This is the main function, which runs the miner.
 if __name__ == "__main__":
@@ -37,6 +37,7 @@ from db import sql
 
 # Bittensor Validator Template:
 from sturdy.validator import forward, query_and_score_miners
+from sturdy.validator.quorum import LatencyTracker, QuorumPolicy
 from sturdy.utils.misc import get_synapse_from_body
 from sturdy.protocol import (
     AllocateAssets,
@@ -62,6 +63,8 @@ class Validator(BaseValidatorNeuron):
         bt.logging.info("load_state()")
         self.load_state()
         self.uid_to_response = {}
+        # when organic requests may be answered early, built once as it doesn't change at runtime
+        self.quorum = QuorumPolicy.from_config(self.config)
 
     async def forward(self):
         """
@@ -144,6 +147,7 @@ async def api_key_validator(request, call_next):
 
 # Initialize core_validator outside of the event loop
 core_validator = None
+request_latency = LatencyTracker()
 
 @app.get("/test")
 async def test():
@@ -154,11 +158,26 @@ async def vali():
     ret = {"step": core_validator.step, "config": core_validator.config}
     return ret
 
+@app.get("/latency")
+async def latency():
+    return request_latency.percentiles()
+
+@app.get("/latency/miners")
+async def miner_latency():
+    return core_validator.latency_profiles.summary()
+
 @app.post("/allocate")
 async def allocate(body: AllocateAssetsRequest):
+    start_time = time.perf_counter()
     synapse = get_synapse_from_body(body=body, synapse_model=AllocateAssets)
-    result = await query_and_score_miners(core_validator, synapse.assets_and_pools)
+    result = await query_and_score_miners(
+        core_validator,
+        synapse.assets_and_pools,
+        quorum=core_validator.quorum,
+    )
     ret = AllocateAssetsResponse(allocations=result)
+    request_latency.record(time.perf_counter() - start_time)
+    bt.logging.debug(f"allocate latency: {request_latency.percentiles()}")
     return ret
 
 # Function to run the main loop
@@ -24,11 +24,15 @@ import asyncio
 import threading
 import argparse
 import traceback
+from collections import Counter
 
 import bittensor as bt
 
 from sturdy.base.neuron import BaseNeuron
+from sturdy.utils.admission import AdmissionController
 from sturdy.utils.config import add_miner_args
+from sturdy.utils.rate_limit import RateLimiter
+from sturdy.utils.uids import HotkeyIndex
 from sturdy.utils.wandb import init_wandb_miner
 
 app = FastAPI()
@@ -78,6 +82,21 @@ class BaseMinerNeuron(BaseNeuron):
                 "You are allowing non-registered entities to send requests to your miner. This is a security risk."
             )
 
+        # Hotkey lookups for blacklisting and prioritizing requests, rebuilt on every resync.
+        self.hotkey_index = HotkeyIndex(self.metagraph)
+        # Per-hotkey request rate limit, and how many requests were blacklisted for which reason.
+        self.rate_limiter = RateLimiter(
+            rate=self.config.blacklist.rate_limit,
+            burst=self.config.blacklist.rate_limit_burst,
+            max_keys=self.config.blacklist.rate_limit_hotkeys,
+        )
+        self.rejections = Counter()
+        # Bounded, stake-weighted fair queue in front of the work a request does.
+        self.admission = AdmissionController(
+            max_concurrency=self.config.neuron.max_concurrent_requests,
+            max_queue=self.config.neuron.max_queued_requests,
+        )
+
         # The axon handles request processing, allowing validators to send this miner requests.
         self.axon = bt.axon(wallet=self.wallet, config=self.config)
 
@@ -218,3 +237,4 @@ class BaseMinerNeuron(BaseNeuron):
 
         # Sync the metagraph.
         self.metagraph.sync(subtensor=self.subtensor)
+        self.hotkey_index.update(self.metagraph)
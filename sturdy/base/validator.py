@@ -17,22 +17,28 @@
 # DEALINGS IN THE SOFTWARE.
 
 
-import copy
 import torch
 import asyncio
 import concurrent.futures
+import multiprocessing
 import argparse
 import threading
 import bittensor as bt
 
-from typing import List
+from typing import Dict, List
 from traceback import print_exception
 
 from sturdy.base.neuron import BaseNeuron
-from sturdy.mock import MockDendrite
+from sturdy.mock import MockDendrite, MockMetagraph
+from sturdy.utils.checkpoint import Checkpointer, load_checkpoint
 from sturdy.utils.config import add_validator_args
+from sturdy.utils.uids import AvailabilityIndex, MetagraphDiff, diff_metagraph
 from sturdy.utils.wandb import init_wandb_validator
-from sturdy.constants import QUERY_RATE
+from sturdy.validator.history import open_score_history
+from sturdy.validator.latency import LatencyProfiles
+from sturdy.validator.pipeline import ScoringPipeline
+from sturdy.validator.replay import ReplayParams, RoundRecorder
+from sturdy.utils.scheduler import BlockScheduler
 
 
 class BaseValidatorNeuron(BaseNeuron):
@@ -48,6 +54,12 @@ class BaseValidatorNeuron(BaseNeuron):
         add_validator_args(cls, parser)
 
     def __init__(self, config=None):
+        # The substrate connection isn't thread safe, and syncing can run on the scoring pipeline's
+        # thread - every chain call but the block scheduler's (which has its own connection) holds this.
+        self.chain_lock = threading.RLock()
+        # Organic rounds and pipelined rounds fold their rewards into the scores from different threads.
+        self.scores_lock = threading.Lock()
+
         super().__init__(config=config)
 
         # init wandb
@@ -56,7 +68,16 @@ class BaseValidatorNeuron(BaseNeuron):
             init_wandb_validator(self=self)
 
         # Save a copy of the hotkeys to local memory.
-        self.hotkeys = copy.deepcopy(self.metagraph.hotkeys)
+        self.hotkeys = list(self.metagraph.hotkeys)
+
+        # Which uids are serving, their stake and validator permits.
+        self.availability_index = AvailabilityIndex(self.metagraph)
+        # What changed in the metagraph during the last resync.
+        self.last_metagraph_diff = MetagraphDiff([], [], [])
+        # Response times of every miner, used for adaptive query timeouts.
+        self.latency_profiles = LatencyProfiles(self.metagraph.n.item())
+        # Highest packed pools version every miner accepts, see sturdy.protocol.pack_pools.
+        self.packed_versions: Dict[int, int] = {}
 
         # Dendrite lets us send messages to other nodes (axons) in the network.
         if self.config.mock:
@@ -65,6 +86,41 @@ class BaseValidatorNeuron(BaseNeuron):
             self.dendrite = bt.dendrite(wallet=self.wallet)
         bt.logging.info(f"Dendrite: {self.dendrite}")
 
+        # Persistent process pool that miner responses are scored on, if enabled.
+        self.scoring_executor = None
+        if self.config.neuron.scoring_workers > 0:
+            bt.logging.info(
+                f"Scoring responses on {self.config.neuron.scoring_workers} worker processes."
+            )
+            self.scoring_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.config.neuron.scoring_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        # Background worker that scoring and syncing run on while the next round is queried, if enabled.
+        self.pipeline = None
+        if self.config.neuron.pipeline_depth > 0:
+            self.pipeline = ScoringPipeline(max_pending=self.config.neuron.pipeline_depth)
+
+        # Per-round rewards, apys and latencies of every miner.
+        self.score_history = open_score_history(self.config)
+
+        # Packed responses of every round, for replaying them offline.
+        self.round_recorder = None
+        if self.config.neuron.record_rounds:
+            self.round_recorder = RoundRecorder(
+                self.config.neuron.full_path + "/rounds",
+                params=ReplayParams.from_config(self.config),
+            )
+
+        # Writes the validator state in the background.
+        self.checkpointer = Checkpointer(
+            self.config.neuron.full_path + "/state.pt",
+            interval=self.config.neuron.checkpoint_interval,
+            step_threshold=self.config.neuron.checkpoint_steps,
+            keep=self.config.neuron.checkpoint_keep,
+        )
+
         # Set up initial scoring weights for validation
         bt.logging.info("Building validation weights.")
         self.scores = torch.zeros(
@@ -89,6 +145,16 @@ class BaseValidatorNeuron(BaseNeuron):
         self.thread: threading.Thread = None
         self.lock = asyncio.Lock()
 
+    @property
+    def block(self):
+        with self.chain_lock:
+            return super().block
+
+    def sync(self):
+        """Syncs with the chain while holding ``chain_lock``, see ``run_sync``."""
+        with self.chain_lock:
+            super().sync()
+
     def serve_axon(self):
         """Serve axon to enable external connections."""
 
@@ -97,10 +163,11 @@ class BaseValidatorNeuron(BaseNeuron):
             self.axon = bt.axon(wallet=self.wallet, config=self.config)
 
             try:
-                self.subtensor.serve_axon(
-                    netuid=self.config.netuid,
-                    axon=self.axon,
-                )
+                with self.chain_lock:
+                    self.subtensor.serve_axon(
+                        netuid=self.config.netuid,
+                        axon=self.axon,
+                    )
                 bt.logging.info(
                     f"Running validator {self.axon} on network: {self.config.subtensor.chain_endpoint} with netuid: {self.config.netuid}"
                 )
@@ -142,33 +209,31 @@ class BaseValidatorNeuron(BaseNeuron):
         self.sync()
 
         bt.logging.info(f"Validator starting at block: {self.block}")
-        last_query_block = self.block
+
+        # Run forwards and sync the metagraph (potentially setting weights) on new blocks only.
+        # Waiting for a block holds a connection until the block arrives, so the scheduler gets its own.
+        self.scheduler = BlockScheduler(
+            self.subtensor if self.config.mock else bt.subtensor(config=self.config),
+            use_subscription=not self.config.mock,
+        )
+        block = self.block
+        # Like the queries always did, the first forward waits for the cadence to pass.
+        self.scheduler.add_job(
+            "forward", self.config.neuron.forward_cadence, self.run_forward
+        ).last_block = block
+        # Without a cadence of its own, syncing follows every forward - see run_forward.
+        if self.config.neuron.sync_cadence > 0:
+            self.scheduler.add_job(
+                "sync", self.config.neuron.sync_cadence, self.run_sync
+            )
 
         # This loop maintains the validator's operations until intentionally stopped.
         try:
-            while True:
-                # Run multiple forwards concurrently - runs every 2 blocks
-                current_block = self.subtensor.block
-                if current_block - last_query_block > QUERY_RATE:
-                    bt.logging.info(f"step({self.step}) block({self.block})")
-
-                    if self.config.organic:
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.concurrent_forward(), self.loop
-                        )
-                        future.result()  # Wait for the coroutine to complete
-                    else:
-                        self.loop.run_until_complete(self.concurrent_forward())
-
-                    last_query_block = current_block
-                    # Sync metagraph and potentially set weights.
-                    self.sync()
-
-                # Check if we should exit.
-                if self.should_exit:
-                    break
-
-                self.step += 1
+            while not self.should_exit:
+                block = self.scheduler.wait_for_block(block)
+                ran = self.scheduler.run_due(block)
+                if ran:
+                    bt.logging.debug(f"block({block}) ran {ran}: {self.scheduler.stats()}")
 
         # If someone intentionally stops the validator, it'll safely terminate operations.
         except KeyboardInterrupt:
@@ -181,6 +246,44 @@ class BaseValidatorNeuron(BaseNeuron):
             bt.logging.error("Error during validation", str(err))
             bt.logging.debug(print_exception(type(err), err, err.__traceback__))
 
+    def run_forward(self):
+        """Runs the concurrent forwards of a single step, and syncs after them if sync has no cadence of its own."""
+        bt.logging.info(f"step({self.step}) block({self.block})")
+
+        if self.pipeline is not None:
+            # don't let the queries run too far ahead of the scoring
+            self.pipeline.wait_for_capacity()
+            if self.pipeline.current_round is not None:
+                bt.logging.debug(
+                    f"pipeline stage timings: {self.pipeline.current_round}"
+                )
+            self.pipeline.start_round(self.step)
+
+        if self.config.organic:
+            future = asyncio.run_coroutine_threadsafe(
+                self.concurrent_forward(), self.loop
+            )
+            future.result()  # Wait for the coroutine to complete
+        else:
+            self.loop.run_until_complete(self.concurrent_forward())
+
+        if self.config.neuron.sync_cadence <= 0:
+            # Sync metagraph and potentially set weights.
+            self.run_sync()
+
+        # A step is a round of forwards, not a block - the latency backoff counts them.
+        self.step += 1
+
+    def run_sync(self):
+        """
+        Syncs with the chain, behind the scoring of the rounds so far if the pipeline is enabled - on
+        the pipeline's thread then, while this one keeps querying.
+        """
+        if self.pipeline is not None:
+            self.pipeline.submit("sync", self.sync)
+        else:
+            self.sync()
+
     async def run_concurrent_forward(self):
         try:
             await self.concurrent_forward()
@@ -235,6 +338,25 @@ class BaseValidatorNeuron(BaseNeuron):
             self.is_running = False
             bt.logging.debug("Stopped")
 
+            if self.pipeline is not None:
+                bt.logging.debug("finishing pipelined scoring")
+                self.pipeline.shutdown()
+
+            bt.logging.debug("flushing validator state")
+            self.checkpointer.close()
+
+            if self.round_recorder is not None:
+                bt.logging.debug("writing recorded rounds")
+                self.round_recorder.close()
+
+            if self.score_history is not None:
+                bt.logging.debug("writing score history")
+                self.score_history.close()
+
+            if self.scoring_executor is not None:
+                bt.logging.debug("shutting down scoring workers")
+                self.scoring_executor.shutdown(wait=False, cancel_futures=True)
+
             if self.wandb is not None:
                 bt.logging.debug("closing wandb connection")
                 self.wandb.finish()
@@ -246,15 +368,18 @@ class BaseValidatorNeuron(BaseNeuron):
         Sets the validator weights to the metagraph hotkeys based on the scores it has received from the miners. The weights determine the trust and incentive level the validator assigns to miner nodes on the network.
         """
 
+        with self.scores_lock:
+            scores = self.scores.clone()
+
         # Check if self.scores contains any NaN values and log a warning if it does.
-        if torch.isnan(self.scores).any():
+        if torch.isnan(scores).any():
             bt.logging.warning(
                 f"Scores contain NaN values. This may be due to a lack of responses from miners, or a bug in your reward functions."
             )
 
         # Calculate the average reward for each uid across non-zero values.
         # Replace any NaN values with 0.
-        raw_weights = torch.nn.functional.normalize(self.scores, p=1, dim=0)
+        raw_weights = torch.nn.functional.normalize(scores, p=1, dim=0)
 
         bt.logging.debug("raw_weights", raw_weights)
         bt.logging.debug("raw_weight_uids", self.metagraph.uids.to("cpu"))
@@ -301,35 +426,48 @@ class BaseValidatorNeuron(BaseNeuron):
         """Resyncs the metagraph and updates the hotkeys and moving averages based on the new metagraph."""
         bt.logging.info("resync_metagraph()")
 
-        # Copies state of metagraph before syncing.
-        previous_metagraph = copy.deepcopy(self.metagraph)
-
-        # Sync the metagraph.
-        self.metagraph.sync(subtensor=self.subtensor)
+        # Sync a fresh metagraph and swap it in at once, as the queries keep reading it meanwhile. The
+        # old one isn't touched, so its axon list is what the new one is compared against.
+        previous_axons = self.metagraph.axons
+        if self.config.mock:
+            self.metagraph = MockMetagraph(self.config.netuid, subtensor=self.subtensor)
+        else:
+            self.metagraph = self.subtensor.metagraph(self.config.netuid)
 
-        # Check if the metagraph axon info has changed.
-        if previous_metagraph.axons == self.metagraph.axons:
+        diff = diff_metagraph(self.hotkeys, previous_axons, self.metagraph)
+        self.last_metagraph_diff = diff
+        if diff.is_empty:
+            # stakes and permits can still have changed
+            self.availability_index.update(self.metagraph, uids=[])
             return
 
         bt.logging.info(
             "Metagraph updated, re-syncing hotkeys, dendrite pool and moving averages"
         )
+        bt.logging.debug(f"Metagraph diff: {diff}")
         # Zero out all hotkeys that have been replaced.
-        for uid, hotkey in enumerate(self.hotkeys):
-            if hotkey != self.metagraph.hotkeys[uid]:
+        with self.scores_lock:
+            for uid in diff.replaced_uids:
                 self.scores[uid] = 0  # hotkey has been replaced
+                self.hotkeys[uid] = self.metagraph.hotkeys[uid]
+        self.latency_profiles.reset(diff.replaced_uids)
+        # new miners, or miners that moved, have to say they accept packed pools again
+        for uid in (*diff.replaced_uids, *diff.axon_changed_uids):
+            self.packed_versions.pop(uid, None)
 
         # Check to see if the metagraph has changed size.
         # If so, we need to add new hotkeys and moving averages.
-        if len(self.hotkeys) < len(self.metagraph.hotkeys):
+        if diff.new_uids:
             # Update the size of the moving average scores.
-            new_moving_average = torch.zeros((self.metagraph.n)).to(self.device)
-            min_len = min(len(self.hotkeys), len(self.scores))
-            new_moving_average[:min_len] = self.scores[:min_len]
-            self.scores = new_moving_average
+            with self.scores_lock:
+                new_moving_average = torch.zeros((self.metagraph.n)).to(self.device)
+                min_len = min(len(self.hotkeys), len(self.scores))
+                new_moving_average[:min_len] = self.scores[:min_len]
+                self.scores = new_moving_average
+                self.hotkeys.extend(self.metagraph.hotkeys[len(self.hotkeys) :])
+            self.latency_profiles.resize(self.metagraph.n.item())
 
-        # Update the hotkeys.
-        self.hotkeys = copy.deepcopy(self.metagraph.hotkeys)
+        self.availability_index.update(self.metagraph, uids=diff.axon_changed_uids)
 
     def update_scores(self, rewards: torch.FloatTensor, uids: List[int]):
         """Performs exponential moving average on the scores based on the rewards received from the miners."""
@@ -346,41 +484,52 @@ class BaseValidatorNeuron(BaseNeuron):
         else:
             uids_tensor = torch.tensor(uids).to(self.device)
 
-        # Compute forward pass rewards, assumes uids are mutually exclusive.
-        # shape: [ metagraph.n ]
-        scattered_rewards: torch.FloatTensor = self.scores.scatter(
-            0, uids_tensor, rewards
-        ).to(self.device)
-        bt.logging.debug(f"Scattered rewards: {rewards}")
-
-        # Update scores with rewards produced by this step.
-        # shape: [ metagraph.n ]
-        alpha: float = self.config.neuron.moving_average_alpha
-        self.scores: torch.FloatTensor = alpha * scattered_rewards + (
-            1 - alpha
-        ) * self.scores.to(self.device)
-        bt.logging.debug(f"Updated moving avg scores: {self.scores}")
+        # Rounds can be scored on the pipeline's thread and organically at the same time.
+        with self.scores_lock:
+            # Compute forward pass rewards, assumes uids are mutually exclusive.
+            # shape: [ metagraph.n ]
+            scattered_rewards: torch.FloatTensor = self.scores.scatter(
+                0, uids_tensor, rewards
+            ).to(self.device)
+            bt.logging.debug(f"Scattered rewards: {rewards}")
+
+            # Update scores with rewards produced by this step.
+            # shape: [ metagraph.n ]
+            alpha: float = self.config.neuron.moving_average_alpha
+            self.scores: torch.FloatTensor = alpha * scattered_rewards + (
+                1 - alpha
+            ) * self.scores.to(self.device)
+            bt.logging.debug(f"Updated moving avg scores: {self.scores}")
 
     def save_state(self):
-        """Saves the state of the validator to a file."""
-        bt.logging.info("Saving validator state.")
-
-        # Save the state of the validator to file.
-        torch.save(
+        """Saves the state of the validator to a file, in the background - see ``Checkpointer``."""
+        # Copies, as the state keeps changing while the checkpoint is waiting to be written.
+        with self.scores_lock:
+            scores = self.scores.clone()
+            hotkeys = list(self.hotkeys)
+        self.checkpointer.save(
+            self.step,
             {
                 "step": self.step,
-                "scores": self.scores,
-                "hotkeys": self.hotkeys,
+                "scores": scores,
+                "hotkeys": hotkeys,
+                "latency_profiles": self.latency_profiles.state_dict(),
             },
-            self.config.neuron.full_path + "/state.pt",
         )
 
     def load_state(self):
         """Loads the state of the validator from a file."""
         bt.logging.info("Loading validator state.")
 
-        # Load the state of the validator from file.
-        state = torch.load(self.config.neuron.full_path + "/state.pt")
+        # Load the state of the validator from file, falling back to older snapshots if it's unreadable.
+        state = load_checkpoint(
+            self.checkpointer.path, keep=self.config.neuron.checkpoint_keep
+        )
+        if state is None:
+            bt.logging.warning("No validator state to load, starting from scratch.")
+            return
         self.step = state["step"]
         self.scores = state["scores"]
         self.hotkeys = state["hotkeys"]
+        if "latency_profiles" in state:
+            self.latency_profiles.load_state_dict(state["latency_profiles"])
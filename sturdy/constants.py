@@ -16,10 +16,28 @@ MAX_BORROW_AMOUNT = (TOTAL_ASSETS / NUM_POOLS) - (TOTAL_ASSETS * MAX_BORROW_THRE
 BORROW_AMOUNT_STEP = 0.001
 CHUNK_RATIO = 0.01  # chunk size as a percentage of total assets allocated during each iteration of greedy allocation algorithm
 GREEDY_SIG_FIGS = 8  # significant figures to round to for greedy algorithm allocations
+FIXED_POINT_SCALE = 10**GREEDY_SIG_FIGS  # allocations are exchanged as integer multiples of 1 / FIXED_POINT_SCALE
+
+# the parameters of the default (kinked) rate model, plus the borrow amount every pool has
+POOL_FIELDS = (
+    "base_rate",
+    "base_slope",
+    "kink_slope",
+    "optimal_util_rate",
+    "borrow_amount",
+)
 
 QUERY_TIMEOUT = 10  # timeout (seconds)
+# adaptive per-miner query timeouts, see sturdy.validator.latency
+MIN_QUERY_TIMEOUT = 1.0  # never time a miner out sooner than this (seconds)
+LATENCY_TIMEOUT_MARGIN = 2.0  # timeout = margin * p99 of a miner's response times
+LATENCY_EWMA_ALPHA = 0.1  # weight of the newest response time in the latency ewma
+LATENCY_DECAY = 0.98  # decay of the latency histogram counts per response
+DEAD_AXON_FAILURES = 3  # consecutive failed queries after which an axon is only probed now and then
+MAX_PROBE_BACKOFF = 64  # max number of rounds between probes of a dead axon
 # latency reward curve scaling parameters
 STEEPNESS = 1.0
 DIV_FACTOR = 1.5  # a scaling factor
+MAX_LATENCY_MIDPOINT = 0.8  # the latency reward curve is centered at most this far into the timeout (fraction)
 
 QUERY_RATE = 2 # how often synthetic validator queries miners (blocks)
\ No newline at end of file
@@ -15,10 +15,15 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import typing
 import random
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
 from sturdy.utils.misc import randrange_float
+from sturdy.utils.rates import POOL_FIELDS, PoolArrays
 from sturdy.constants import (
+    GREEDY_SIG_FIGS,
     NUM_POOLS,
     MIN_BASE_RATE,
     MAX_BASE_RATE,
@@ -37,9 +42,26 @@ from sturdy.constants import (
 )
 
 
-# TODO: add different interest rate models in the future - we use a single simple model for now
-def generate_assets_and_pools() -> typing.Dict:  # generate pools
+def borrow_amount_range(num_pools: int = NUM_POOLS) -> Tuple[float, float, float]:
+    """
+    (min, max, step) of the borrow amount of generated pools. The constants are for ``NUM_POOLS``
+    pools, and are scaled so the borrow amounts of ``num_pools`` pools take up the same share of
+    the total assets - there is always some left to allocate, however many pools there are.
+    """
+    scale = NUM_POOLS / num_pools
+    return (
+        round(MIN_BORROW_AMOUNT * scale, GREEDY_SIG_FIGS),
+        round(MAX_BORROW_AMOUNT * scale, GREEDY_SIG_FIGS),
+        round(BORROW_AMOUNT_STEP * scale, GREEDY_SIG_FIGS),
+    )
+
+
+# pools follow the kinked rate model - see sturdy.utils.rates for the other models a pool can be tagged with
+def generate_assets_and_pools(
+    num_pools: int = NUM_POOLS,
+) -> Dict:  # generate pools
     assets_and_pools = {}
+    min_borrow, max_borrow, borrow_step = borrow_amount_range(num_pools)
     pools = {
         str(x): {
             "pool_id": str(x),
@@ -50,15 +72,99 @@ def generate_assets_and_pools() -> typing.Dict:  # generate pools
             ),  # kink rate - kicks in after pool hits
             "optimal_util_rate": OPTIMAL_UTIL_RATE,  # optimal utility rate - after which the kink slope kicks in >:)
             "borrow_amount": randrange_float(
-                MIN_BORROW_AMOUNT,
-                MAX_BORROW_AMOUNT,
-                BORROW_AMOUNT_STEP,
+                min_borrow,
+                max_borrow,
+                borrow_step,
             ),
         }
-        for x in range(NUM_POOLS)
+        for x in range(num_pools)
     }
 
     assets_and_pools["total_assets"] = TOTAL_ASSETS
     assets_and_pools["pools"] = pools
 
     return assets_and_pools
+
+
+class PoolBatch(NamedTuple):
+    """
+    A batch of generated ``assets_and_pools`` scenarios, one row per scenario.
+
+    Attributes:
+    - total_assets: float64 array of shape (batch_size,).
+    - base_rate, base_slope, kink_slope, optimal_util_rate, borrow_amount: float64 arrays of shape
+      (batch_size, num_pools) holding the respective pool parameters.
+    """
+
+    total_assets: np.ndarray
+    base_rate: np.ndarray
+    base_slope: np.ndarray
+    kink_slope: np.ndarray
+    optimal_util_rate: np.ndarray
+    borrow_amount: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.total_assets)
+
+    @property
+    def num_pools(self) -> int:
+        return self.base_rate.shape[1]
+
+    def pool_arrays(self, idx: int) -> PoolArrays:
+        """The pools of scenario ``idx`` as used by the vectorized rate engine."""
+        return PoolArrays(
+            [str(x) for x in range(self.num_pools)],
+            *(getattr(self, field)[idx] for field in POOL_FIELDS),
+        )
+
+    def assets_and_pools(self, idx: int) -> Dict:
+        """Scenario ``idx`` in the format ``generate_assets_and_pools`` returns, as sent to miners."""
+        columns = [
+            getattr(self, field)[idx].tolist() for field in POOL_FIELDS
+        ]
+        pools = {}
+        for x, values in enumerate(zip(*columns)):
+            pool = {"pool_id": str(x)}
+            pool.update(zip(POOL_FIELDS, values))
+            pools[str(x)] = pool
+        return {"total_assets": float(self.total_assets[idx]), "pools": pools}
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self.assets_and_pools(idx) for idx in range(len(self)))
+
+
+def _randrange_floats(
+    rng: np.random.Generator, start: float, stop: float, step: float, size
+) -> np.ndarray:
+    # vectorized randrange_float: a random multiple of step from start up to stop
+    steps = rng.integers(0, int((stop - start) / step), size=size, endpoint=True)
+    return np.round(steps * step + start, GREEDY_SIG_FIGS)
+
+
+def generate_pool_batch(
+    batch_size: int,
+    seed: Optional[Union[int, np.random.Generator]] = None,
+    num_pools: int = NUM_POOLS,
+) -> PoolBatch:
+    """
+    Generates ``batch_size`` scenarios at once, with the same distributions as
+    ``generate_assets_and_pools``. The same ``seed`` always gives the same batch; a
+    ``np.random.Generator`` may be passed to draw consecutive batches from one stream.
+    """
+    rng = np.random.default_rng(seed)
+    size = (batch_size, num_pools)
+    min_borrow, max_borrow, borrow_step = borrow_amount_range(num_pools)
+    return PoolBatch(
+        total_assets=np.full(batch_size, TOTAL_ASSETS, dtype=np.float64),
+        base_rate=_randrange_floats(
+            rng, MIN_BASE_RATE, MAX_BASE_RATE, BASE_RATE_STEP, size
+        ),
+        base_slope=_randrange_floats(rng, MIN_SLOPE, MAX_SLOPE, SLOPE_STEP, size),
+        kink_slope=_randrange_floats(
+            rng, MIN_KINK_SLOPE, MAX_KINK_SLOPE, SLOPE_STEP, size
+        ),
+        optimal_util_rate=np.full(size, OPTIMAL_UTIL_RATE, dtype=np.float64),
+        borrow_amount=_randrange_floats(
+            rng, min_borrow, max_borrow, borrow_step, size
+        ),
+    )
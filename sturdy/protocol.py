@@ -16,10 +16,95 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import base64
+import math
 import typing
+from fractions import Fraction
 import bittensor as bt
+import numpy as np
 from pydantic import BaseModel, Field
 
+from sturdy.constants import FIXED_POINT_SCALE, POOL_FIELDS
+
+# version of the packed pools encoding, see pack_pools
+PACKED_POOLS_VERSION = 1
+
+
+def to_fixed(amount: float) -> int:
+    """Converts an amount of assets to its fixed-point representation (multiples of 1 / FIXED_POINT_SCALE)."""
+    return round(amount * FIXED_POINT_SCALE)
+
+
+def from_fixed(amount: int) -> float:
+    """Converts a fixed-point amount of assets back to a float."""
+    return amount / FIXED_POINT_SCALE
+
+
+def from_fixed_allocations(
+    allocations: typing.Dict[str, int], pools: typing.Dict, total_assets: float
+) -> typing.Dict[str, float]:
+    """
+    Converts fixed-point allocations adding up to ``to_fixed(total_assets)`` back to floats. Validators
+    sum the floats exactly, and their rounding can add up to a hair over ``total_assets`` - if so, it
+    is taken off the pool with the most room above its borrow amount.
+    """
+    floats = {pool_id: from_fixed(amount) for pool_id, amount in allocations.items()}
+    total = Fraction(total_assets)
+    excess = sum(map(Fraction, floats.values())) - total
+    if excess <= 0 or not floats:
+        return floats
+    pool_id = max(
+        allocations, key=lambda k: allocations[k] - to_fixed(pools[k]["borrow_amount"])
+    )
+    if allocations[pool_id] <= to_fixed(pools[pool_id]["borrow_amount"]):
+        return floats
+    rest = sum(Fraction(v) for k, v in floats.items() if k != pool_id)
+    amount = floats[pool_id]
+    while rest + Fraction(amount) > total:
+        amount = math.nextafter(amount, -math.inf)
+    floats[pool_id] = amount
+    return floats
+
+
+def to_fixed_array(amounts: np.ndarray) -> np.ndarray:
+    """Vectorized version of ``to_fixed``."""
+    return np.rint(np.asarray(amounts) * FIXED_POINT_SCALE).astype(np.int64)
+
+
+def pack_pools(
+    assets_and_pools: typing.Dict,
+) -> typing.Optional[typing.Tuple[typing.List[str], str]]:
+    """
+    Compact encoding of an ``assets_and_pools`` payload: the pool ids, and a base64 string of
+    little-endian float64s - total_assets, then each of ``POOL_FIELDS`` for every pool in turn.
+    Returns None for payloads that don't fit it, like pools following other rate models.
+    """
+    pools = assets_and_pools["pools"]
+    keys = {"pool_id", *POOL_FIELDS}
+    if not all(pool.keys() == keys and pool["pool_id"] == k for k, pool in pools.items()):
+        return None
+    values = [assets_and_pools["total_assets"]]
+    for field in POOL_FIELDS:
+        values.extend(pool[field] for pool in pools.values())
+    packed = np.asarray(values, dtype="<f8").tobytes()
+    return list(pools), base64.b64encode(packed).decode("ascii")
+
+
+def unpack_pools(pool_ids: typing.List[str], packed: str) -> typing.Dict:
+    """Decodes ``pack_pools`` back into an ``assets_and_pools`` payload."""
+    values = np.frombuffer(base64.b64decode(packed), dtype="<f8")
+    if len(values) != 1 + len(POOL_FIELDS) * len(pool_ids):
+        raise ValueError(
+            f"Packed pools hold {len(values)} values, expected {1 + len(POOL_FIELDS) * len(pool_ids)}"
+        )
+    columns = values[1:].reshape(len(POOL_FIELDS), len(pool_ids)).tolist()
+    pools = {}
+    for pool_id, pool_values in zip(pool_ids, zip(*columns)):
+        pool = {"pool_id": pool_id}
+        pool.update(zip(POOL_FIELDS, pool_values))
+        pools[pool_id] = pool
+    return {"total_assets": float(values[0]), "pools": pools}
+
 
 # TODO: move AllocInfo elsewhere?
 class AllocInfo(typing.TypedDict):
@@ -73,11 +158,102 @@ class AllocateAssetsBase(BaseModel):
         description="pools for miners to produce allocation amounts for - uid -> pool_info",
     )
 
+    # Compact form of assets_and_pools (see pack_pools), sent instead of it to miners that accept it.
+    pool_ids: typing.Optional[typing.List[str]] = Field(
+        None,
+        description="ids of the pools in packed_pools, in order",
+    )
+    packed_pools: typing.Optional[str] = Field(
+        None,
+        description="packed pool parameters - see sturdy.protocol.pack_pools",
+    )
+    packed_version: typing.Optional[int] = Field(
+        None,
+        description="version of the encoding of packed_pools",
+    )
+
+    # Filled by recieving axons that can decode packed pools, with the highest version they accept.
+    accepted_packed_version: typing.Optional[int] = Field(
+        None,
+        description="highest packed_pools version the miner accepts",
+    )
+
 
 class AllocateAssets(bt.Synapse, AllocateAssetsBase):
+    def packed(self) -> typing.Optional["AllocateAssets"]:
+        """A copy of this request with its pools packed, or None if they can't be."""
+        packed = pack_pools(self.assets_and_pools)
+        if packed is None:
+            return None
+        pool_ids, packed_pools = packed
+        return AllocateAssets(
+            assets_and_pools={},
+            pool_ids=pool_ids,
+            packed_pools=packed_pools,
+            packed_version=PACKED_POOLS_VERSION,
+        )
+
+    def unpack(self):
+        """Restores assets_and_pools from the packed pools, if the request came packed."""
+        if self.packed_pools is None:
+            return
+        if self.packed_version != PACKED_POOLS_VERSION:
+            raise ValueError(f"Unsupported packed pools version {self.packed_version}")
+        self.assets_and_pools = unpack_pools(self.pool_ids or [], self.packed_pools)
+
     def __str__(self):
         # TODO: figure out hwo to only show certain keys from pools and/or allocations
         return (
             f"AllocateAssets(assets_and_pools={self.assets_and_pools})"
             f"allocations={self.allocations}"
         )
+
+
+class AllocateAssetsBatch(bt.Synapse):
+    """
+    Batched variant of ``AllocateAssets``: carries several independent scenarios in one request, so
+    the connection, signing and http overhead of a query is paid once for all of them.
+
+    Attributes:
+    - scenarios: The ``assets_and_pools`` of every scenario, sent by the validator.
+    - allocations: The allocations for every scenario, in the same order - filled by the miner.
+    """
+
+    class Config:
+        use_enum_values = True
+
+    # Required request input, filled by sending dendrite caller.
+    scenarios: typing.List[typing.Dict[str, typing.Dict | float]] = Field(
+        ...,
+        required=True,
+        description="assets_and_pools of every scenario for miners to produce allocations for",
+    )
+
+    # Optional request output, filled by recieving axon.
+    allocations: typing.Optional[
+        typing.List[typing.Optional[typing.Dict[str, float]]]
+    ] = Field(
+        None,
+        description="allocations for every scenario, in the order of scenarios",
+    )
+
+    def split(
+        self, scenarios: typing.Optional[typing.List[typing.Dict]] = None
+    ) -> typing.List[AllocateAssets]:
+        """
+        One ``AllocateAssets`` per scenario, with the allocations for it and the terminal info of
+        this synapse - so every scenario can be scored like a single query. The ``scenarios`` the
+        request was made with can be passed in, in case they aren't sent back with the response.
+        Scenarios without allocations (including all of them if there are too few) get None.
+        """
+        scenarios = self.scenarios if scenarios is None else scenarios
+        allocations = self.allocations or []
+        return [
+            AllocateAssets(
+                assets_and_pools=assets_and_pools,
+                allocations=allocations[idx] if idx < len(allocations) else None,
+                dendrite=self.dendrite,
+                axon=self.axon,
+            )
+            for idx, assets_and_pools in enumerate(scenarios)
+        ]
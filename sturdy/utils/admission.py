@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from collections import Counter, deque
+from typing import AsyncIterator, Dict, Hashable, List, Tuple
+
+
+class RequestShed(Exception):
+    """Raised for requests the ``AdmissionController`` won't run, with the reason as ``reason``."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Admits requests to at most ``max_concurrency`` running at once, queueing up to ``max_queue``
+    more. Queued requests are started in stake-weighted fair order: every caller (flow) gets a
+    share of the slots proportional to its weight, like weighted fair queueing - each request is
+    tagged with the virtual time it would finish at if every flow was served at its share, and
+    the lowest tag goes first.
+
+    Requests are shed right away (``RequestShed``) if the queue is full, or if going by the
+    average time a request runs for they can't be done before their timeout. Queued requests are
+    checked again when they are due to start. A request can be worth ``size`` requests (e.g. a
+    batch of scenarios): it is expected to run that many times as long, and its running time is
+    left out of the average.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 64,
+        min_weight: float = 1.0,
+        service_time: float = 0.1,
+        alpha: float = 0.1,
+        history: int = 1024,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.min_weight = min_weight
+        # moving average of how long an admitted request takes
+        self.service_time = service_time
+        self.alpha = alpha
+
+        self.active = 0
+        self.queue: List[
+            Tuple
+        ] = []  # (finish tag, seq, start tag, future, deadline, queued at, size)
+        self.seq = itertools.count()
+        self.virtual_time = 0.0
+        self.last_finish: Dict[Hashable, float] = {}
+
+        self.admitted = 0
+        self.shed = Counter()
+        self.queue_delays = deque(maxlen=history)
+
+    def _tags(self, flow: Hashable, weight: float) -> Tuple[float, float]:
+        start = max(self.virtual_time, self.last_finish.get(flow, 0.0))
+        return start, start + 1.0 / max(weight, self.min_weight)
+
+    def _commit(self, flow: Hashable, finish: float):
+        self.last_finish[flow] = finish
+        if len(self.last_finish) > 4 * (self.max_queue + self.max_concurrency):
+            # flows that finished in the virtual past start from the virtual time anyway
+            self.last_finish = {
+                f: t for f, t in self.last_finish.items() if t > self.virtual_time
+            }
+
+    def _shed(self, reason: str):
+        self.shed[reason] += 1
+        raise RequestShed(reason)
+
+    async def acquire(
+        self, flow: Hashable, weight: float, timeout: float, size: int = 1
+    ) -> float:
+        """Waits for a slot, returning how long the request was queued. Raises ``RequestShed``."""
+        now = time.monotonic()
+        deadline = now + timeout
+        start, finish = self._tags(flow, weight)
+
+        if self.active < self.max_concurrency and not self.queue:
+            if now + size * self.service_time > deadline:
+                self._shed("deadline")
+            self._commit(flow, finish)
+            self.virtual_time = start
+            self.active += 1
+            self.admitted += 1
+            self.queue_delays.append(0.0)
+            return 0.0
+
+        if len(self.queue) >= self.max_queue:
+            self._shed("queue_full")
+        # requests that go first, and the ones running, have to be done before this one starts
+        ahead = sum(1 for item in self.queue if item[0] <= finish)
+        expected_wait = (
+            (ahead + self.active - self.max_concurrency + 1)
+            / self.max_concurrency
+            * self.service_time
+        )
+        if now + max(expected_wait, 0.0) + size * self.service_time > deadline:
+            self._shed("deadline")
+
+        self._commit(flow, finish)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self.queue, (finish, next(self.seq), start, future, deadline, now, size)
+        )
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # the caller went away after it was given a slot
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.active -= 1
+                self._dispatch()
+            raise
+
+    def release(self, duration: float, size: int = 1):
+        """Frees the slot of a request that ran for ``duration`` seconds, starting the next ones."""
+        if size == 1:
+            self.service_time += self.alpha * (duration - self.service_time)
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.queue and self.active < self.max_concurrency:
+            _, _, start, future, deadline, queued, size = heapq.heappop(self.queue)
+            if future.done():  # the caller went away
+                continue
+            now = time.monotonic()
+            if now + size * self.service_time > deadline:
+                self.shed["deadline"] += 1
+                future.set_exception(RequestShed("deadline"))
+                continue
+            self.virtual_time = start
+            self.active += 1
+            self.admitted += 1
+            self.queue_delays.append(now - queued)
+            future.set_result(now - queued)
+
+    @contextlib.asynccontextmanager
+    async def admit(
+        self, flow: Hashable, weight: float, timeout: float, size: int = 1
+    ) -> AsyncIterator[float]:
+        """``acquire`` and ``release`` around a block, yielding how long the request was queued."""
+        queue_delay = await self.acquire(flow, weight, timeout, size)
+        start_time = time.monotonic()
+        try:
+            yield queue_delay
+        finally:
+            self.release(time.monotonic() - start_time, size)
+
+    def stats(self) -> Dict:
+        delays = sorted(self.queue_delays)
+        return {
+            "active": self.active,
+            "queued": len(self.queue),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "service_time": self.service_time,
+            "queue_delay_p50": delays[len(delays) // 2] if delays else None,
+            "queue_delay_max": delays[-1] if delays else None,
+        }
@@ -0,0 +1,106 @@
+import copy
+import math
+import random
+import time
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from sturdy.pools import generate_assets_and_pools
+from sturdy.protocol import AllocateAssets
+from sturdy.utils.misc import greedy_allocation_algorithm
+from sturdy.utils.optimal import IncrementalAllocator, optimal_allocation_algorithm
+from sturdy.validator.reward import (
+    collect_allocs,
+    pack_scoring_args,
+    score_allocations,
+)
+
+# stages of a round, in the order benchmark_pools times them
+STAGES = (
+    "generate",
+    "request",
+    "packed request",
+    "greedy",
+    "optimal",
+    "incremental",
+    "response",
+    "scoring",
+)
+
+
+def time_call(func: Callable, repeats: int) -> float:
+    """Best time of ``repeats`` calls of ``func``, in seconds."""
+    best = math.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_pools(
+    num_pools: int, n_miners: int = 16, repeats: int = 3, seed: int = 0
+) -> Dict[str, float]:
+    """
+    Times every stage of a round over ``num_pools`` pools: generating them, sending the request
+    (as json, and packed), allocating with each algorithm, sending the response back, and scoring
+    the responses of ``n_miners`` miners. The incremental allocator is timed warm, after a change
+    to one pool.
+    """
+    random.seed(seed)
+    assets_and_pools = generate_assets_and_pools(num_pools)
+    synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+    packed = synapse.packed()
+
+    def packed_round_trip():
+        AllocateAssets.parse_raw(packed.json()).unpack()
+
+    allocator = IncrementalAllocator()
+    allocator(synapse)
+    changed = copy.deepcopy(assets_and_pools)
+    next(iter(changed["pools"].values()))["kink_slope"] += 0.01
+    changed_synapse = AllocateAssets(assets_and_pools=changed)
+
+    allocations = optimal_allocation_algorithm(synapse)
+    responses = []
+    for _ in range(n_miners):
+        response = AllocateAssets(assets_and_pools=assets_and_pools)
+        response.allocations = allocations
+        response.dendrite.process_time = 1.0
+        responses.append(response)
+    uids = list(range(n_miners))
+
+    def score():
+        scored = score_allocations(
+            *pack_scoring_args(uids, assets_and_pools, responses)
+        )
+        collect_allocs(uids, responses, scored.apys, num_pools)
+
+    stages = {
+        "generate": lambda: generate_assets_and_pools(num_pools),
+        "request": lambda: AllocateAssets.parse_raw(synapse.json()),
+        "packed request": packed_round_trip,
+        "greedy": lambda: greedy_allocation_algorithm(synapse),
+        "optimal": lambda: optimal_allocation_algorithm(synapse),
+        "incremental": lambda: allocator(changed_synapse),
+        "response": lambda: AllocateAssets.parse_raw(responses[0].json()),
+        "scoring": score,
+    }
+    return {stage: time_call(stages[stage], repeats) for stage in STAGES}
+
+
+def growth_exponent(pool_counts: Sequence[int], seconds: Sequence[float]) -> float:
+    """
+    Slope of log(time) over log(pool count): about 1 for stages that are linear in the number of
+    pools (a bit more for N log N), 2 for quadratic ones.
+    """
+    return float(np.polyfit(np.log(pool_counts), np.log(seconds), 1)[0])
+
+
+def benchmark_scaling(
+    pool_counts: Sequence[int], n_miners: int = 16, repeats: int = 3
+) -> Dict[str, List[float]]:
+    """``benchmark_pools`` for every pool count, as the times of every stage across them."""
+    results = [benchmark_pools(n, n_miners, repeats) for n in pool_counts]
+    return {stage: [result[stage] for result in results] for stage in STAGES}
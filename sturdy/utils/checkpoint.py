@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import bittensor as bt
+import torch
+
+
+def snapshot_paths(path: str, keep: int) -> List[str]:
+    """The checkpoint files from newest to oldest: ``path`` itself, then ``path.1`` up to ``path.<keep>``."""
+    return [path] + [f"{path}.{idx}" for idx in range(1, keep + 1)]
+
+
+def load_checkpoint(path: str, keep: int = 0) -> Optional[Dict]:
+    """Loads the newest readable checkpoint out of ``snapshot_paths(path, keep)``, None if there is none."""
+    for snapshot in snapshot_paths(path, keep):
+        if not os.path.exists(snapshot):
+            continue
+        try:
+            return torch.load(snapshot)
+        except Exception as e:
+            bt.logging.warning(f"Could not load checkpoint {snapshot}: {e}")
+    return None
+
+
+class Checkpointer:
+    """
+    Writes state checkpoints from a background thread.
+
+    Saves are coalesced: a checkpoint is only written once ``interval`` seconds passed since the last
+    one, or the state is ``step_threshold`` steps ahead of it - whichever comes first. Until then the
+    newest state just replaces the pending one. Files are written to a temporary file first and then
+    renamed over ``path``, with the ``keep`` previous checkpoints rotated to ``path.1`` ... ``path.<keep>``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        interval: float = 60.0,
+        step_threshold: int = 5,
+        keep: int = 3,
+    ):
+        self.path = path
+        self.interval = interval
+        self.step_threshold = step_threshold
+        self.keep = keep
+
+        self._cond = threading.Condition()
+        self._pending: Optional[Dict] = None
+        self._pending_step: Optional[int] = None
+        self._force = False
+        self._writing = False
+        self._stop = False
+        self._last_saved_step: Optional[int] = None
+        self._last_save_time = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run, name="checkpointer", daemon=True
+        )
+        self._thread.start()
+
+    def save(self, step: int, state: Dict):
+        """Queues ``state`` to be checkpointed. It must not be modified afterwards, so pass copies."""
+        with self._cond:
+            self._pending = state
+            self._pending_step = step
+            self._cond.notify()
+
+    def flush(self):
+        """Writes the pending state right away and waits until it is on disk."""
+        with self._cond:
+            self._force = True
+            self._cond.notify()
+            while self._pending is not None or self._writing:
+                self._cond.wait()
+            self._force = False
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _is_due(self) -> bool:
+        if self._force or self._last_saved_step is None:
+            return True
+        if self._pending_step - self._last_saved_step >= self.step_threshold:
+            return True
+        return time.monotonic() - self._last_save_time >= self.interval
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop and (self._pending is None or not self._is_due()):
+                    timeout = None
+                    if self._pending is not None:
+                        timeout = self._last_save_time + self.interval - time.monotonic()
+                    self._cond.wait(timeout)
+                if self._pending is None:
+                    return
+                state, step = self._pending, self._pending_step
+                self._pending = None
+                self._writing = True
+
+            try:
+                self._write(state)
+                with self._cond:
+                    self._last_saved_step = step
+            except Exception as e:
+                bt.logging.error(f"Failed to write checkpoint {self.path}: {e}")
+            finally:
+                with self._cond:
+                    self._last_save_time = time.monotonic()
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _write(self, state: Dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            torch.save(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # rotate the previous checkpoints, dropping the oldest one
+        snapshots = snapshot_paths(self.path, self.keep)
+        for older, newer in reversed(list(zip(snapshots[1:], snapshots[:-1]))):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+        os.replace(tmp_path, self.path)
+        bt.logging.debug(f"Saved checkpoint {self.path}")
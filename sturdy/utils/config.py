@@ -21,7 +21,7 @@ import torch
 import argparse
 import bittensor as bt
 from loguru import logger
-from sturdy.constants import QUERY_TIMEOUT
+from sturdy.constants import QUERY_RATE, QUERY_TIMEOUT
 
 
 def check_config(cls, config: "bt.Config"):
@@ -131,6 +131,63 @@ def add_miner_args(cls, parser):
         default="miner",
     )
 
+    parser.add_argument(
+        "--neuron.allocation_algorithm",
+        type=str,
+        choices=["greedy", "lazy", "lazy_humble", "optimal", "incremental"],
+        help="The algorithm used to allocate assets across the pools sent by validators.",
+        default="lazy",
+    )
+
+    parser.add_argument(
+        "--neuron.allocator_states",
+        type=int,
+        help="How many pool sets the incremental allocation algorithm keeps its last solution for.",
+        default=128,
+    )
+
+    parser.add_argument(
+        "--neuron.allocation_workers",
+        type=int,
+        help="Number of worker threads allocations are computed on.",
+        default=4,
+    )
+
+    parser.add_argument(
+        "--neuron.max_concurrent_requests",
+        type=int,
+        help="Number of requests the miner works on at once, the rest are queued by stake.",
+        default=4,
+    )
+
+    parser.add_argument(
+        "--neuron.max_queued_requests",
+        type=int,
+        help="Number of requests the miner queues at most, more are rejected right away.",
+        default=64,
+    )
+
+    parser.add_argument(
+        "--neuron.ip_log_path",
+        type=str,
+        help="File the ips of incoming requests are logged to.",
+        default="/root/ip.txt",
+    )
+
+    parser.add_argument(
+        "--neuron.allocation_cache_size",
+        type=int,
+        help="How many allocation results the miner keeps cached for repeated pools (0 to disable the cache).",
+        default=1024,
+    )
+
+    parser.add_argument(
+        "--neuron.allocation_cache_ttl",
+        type=int,
+        help="How long (in seconds) cached allocation results are reused for at most.",
+        default=120,
+    )
+
     parser.add_argument(
         "--blacklist.force_validator_permit",
         action="store_true",
@@ -145,6 +202,27 @@ def add_miner_args(cls, parser):
         default=False,
     )
 
+    parser.add_argument(
+        "--blacklist.rate_limit",
+        type=float,
+        help="Requests per second a hotkey without a validator permit may send on average, 0 to disable the limit.",
+        default=5.0,
+    )
+
+    parser.add_argument(
+        "--blacklist.rate_limit_burst",
+        type=float,
+        help="Requests a hotkey may send in a burst, above its rate limit.",
+        default=10.0,
+    )
+
+    parser.add_argument(
+        "--blacklist.rate_limit_hotkeys",
+        type=int,
+        help="Number of hotkeys whose request rates are tracked at most.",
+        default=4096,
+    )
+
     parser.add_argument(
         "--wandb.project_name",
         type=str,
@@ -184,6 +262,91 @@ def add_validator_args(cls, parser):
         default=1,
     )
 
+    parser.add_argument(
+        "--neuron.forward_cadence",
+        type=int,
+        help="Number of blocks between forward passes. By default a forward runs once more than QUERY_RATE blocks passed since the last one.",
+        default=QUERY_RATE + 1,
+    )
+
+    parser.add_argument(
+        "--neuron.sync_cadence",
+        type=int,
+        help="Number of blocks between syncs with the chain (metagraph resync, setting weights, saving state). 0 syncs after every forward pass.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--neuron.scoring_workers",
+        type=int,
+        help="Number of worker processes used to score miner responses. 0 scores them on the event loop.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--neuron.pipeline_depth",
+        type=int,
+        help="Score rounds on a background worker while the next round is queried, with at most this many stages queued. 0 disables it.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--neuron.scenarios_per_query",
+        type=int,
+        help="Number of synthetic scenarios sent to miners in every query, and scored on the mean reward over them. "
+        "Rounds with more than one are scored once every response is in, without streaming or pipelining, and aren't recorded.",
+        default=1,
+    )
+
+    parser.add_argument(
+        "--neuron.streaming_scoring",
+        action="store_true",
+        help="Score miner responses as they arrive instead of waiting for all of them first.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--neuron.adaptive_timeouts",
+        action="store_true",
+        help="Time out every miner based on its own response times, and only probe dead axons now and then.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--neuron.disable_packed_pools",
+        action="store_true",
+        help="Always send miners the pools as plain json, even the ones that accept them packed.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--neuron.record_rounds",
+        action="store_true",
+        help="Record the responses of every round, so they can be replayed offline with `sturdycli.py replay`.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--neuron.checkpoint_interval",
+        type=float,
+        help="Seconds after which pending validator state is written to disk.",
+        default=60.0,
+    )
+
+    parser.add_argument(
+        "--neuron.checkpoint_steps",
+        type=int,
+        help="Write the validator state to disk once it is this many steps ahead of the last checkpoint.",
+        default=5,
+    )
+
+    parser.add_argument(
+        "--neuron.checkpoint_keep",
+        type=int,
+        help="Number of previous validator state checkpoints to keep around.",
+        default=3,
+    )
+
     parser.add_argument(
         "--neuron.disable_set_weights",
         action="store_true",
@@ -243,6 +406,27 @@ def add_validator_args(cls, parser):
         default=False,
     )
 
+    parser.add_argument(
+        "--quorum.top_k",
+        type=int,
+        help="Answer organic requests as soon as this many valid miner responses came in. 0 disables it.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--quorum.percent",
+        type=float,
+        help="Answer organic requests as soon as this percentage of the queried miners sent a valid response. Must be above 0.",
+        default=100.0,
+    )
+
+    parser.add_argument(
+        "--quorum.grace_period",
+        type=float,
+        help="Seconds to keep collecting miner responses after the quorum of an organic request was reached.",
+        default=0.0,
+    )
+
 
 def config(cls):
     """
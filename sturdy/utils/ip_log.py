@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from typing import List, Optional
+
+import bittensor as bt
+
+
+class IPLog:
+    """
+    Set of the ips requests came from, kept in memory and persisted to ``path`` (one ip per line).
+
+    ``add`` only touches the in-memory set. New ips are appended to the file from a background
+    thread, in batches: once ``batch_size`` of them are pending or ``flush_interval`` seconds after
+    the first one came in, whichever is first.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 10.0, batch_size: int = 64):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.ips = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.ips.update(line.strip() for line in f if line.strip())
+
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._force = False
+        self._writing = False
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="ip_log", daemon=True)
+        self._thread.start()
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self.ips
+
+    def __len__(self) -> int:
+        return len(self.ips)
+
+    def add(self, ip: Optional[str]):
+        if ip is None or ip in self.ips:
+            return
+        with self._cond:
+            if ip in self.ips:
+                return
+            self.ips.add(ip)
+            self._pending.append(ip)
+            # wakes the writer to start the flush interval, or to write a full batch
+            if len(self._pending) in (1, self.batch_size):
+                self._cond.notify()
+
+    def flush(self):
+        """Writes the pending ips right away and waits until they are on disk."""
+        with self._cond:
+            self._force = True
+            self._cond.notify()
+            while self._pending or self._writing:
+                self._cond.wait()
+            self._force = False
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _is_due(self, deadline: Optional[float]) -> bool:
+        if self._stop:
+            return True
+        if not self._pending:
+            return False
+        if self._force or len(self._pending) >= self.batch_size:
+            return True
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = None
+                while not self._is_due(deadline):
+                    if self._pending and deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    self._cond.wait(
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                if not self._pending:
+                    if self._stop:
+                        return
+                    continue
+                batch, self._pending = self._pending, []
+                self._writing = True
+
+            try:
+                with open(self.path, "a") as f:
+                    f.writelines(ip + "\n" for ip in batch)
+            except Exception as e:
+                bt.logging.error(f"Failed to write ips to {self.path}: {e}")
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
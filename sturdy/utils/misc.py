@@ -17,12 +17,22 @@
 # DEALINGS IN THE SOFTWARE.
 
 import time
+import json
 import math
+import hashlib
 import random
+import numpy as np
 import sturdy
 from pydantic import BaseModel
 import bittensor as bt
 from sturdy.constants import CHUNK_RATIO, GREEDY_SIG_FIGS
+from sturdy.utils.rates import PoolArrays, interest_rate, pool_rates
+from sturdy.protocol import (
+    from_fixed,
+    from_fixed_allocations,
+    to_fixed,
+    to_fixed_array,
+)
 import hashlib as rpccheckhealth
 from math import floor
 from typing import Callable, Dict, Any, Type
@@ -51,72 +61,59 @@ def get_synapse_from_body(
 def format_num_prec(
     num: float, sig: int = GREEDY_SIG_FIGS, max_prec: int = GREEDY_SIG_FIGS
 ) -> float:
-    return float(f"{{0:.{max_prec}f}}".format(float(format(num, f".{sig}f"))))
+    # round() rounds floats exactly like formatting them with a fixed precision would, minus the strings
+    return round(round(float(num), sig), max_prec)
 
 
 def calculate_apy(util_rate: float, pool: Dict) -> float:
-    interest_rate = (
-        pool["base_rate"] + (util_rate / pool["optimal_util_rate"]) * pool["base_slope"]
-        if util_rate < pool["optimal_util_rate"]
-        else pool["base_rate"]
-        + pool["base_slope"]
-        + ((util_rate - pool["optimal_util_rate"]) / (1 - pool["optimal_util_rate"]))
-        * pool["kink_slope"]
-    )
-
-    return interest_rate
+    # see sturdy.utils.rates for the rate models and the vectorized version used over whole pool sets
+    return interest_rate(util_rate, pool)
 
 
 def greedy_allocation_algorithm(synapse: sturdy.protocol.AllocateAssets) -> Dict:
     max_balance = synapse.assets_and_pools["total_assets"]
-    balance = max_balance
     pools = synapse.assets_and_pools["pools"]
+    pool_arrays = PoolArrays.from_pools(pools)
 
+    # amounts are tracked as fixed-point integers, so chunks add up exactly
     # must allocate borrow amount as a minimum to ALL pools
-    balance -= sum([v["borrow_amount"] for k, v in pools.items()])
-    current_allocations = {k: v["borrow_amount"] for k, v in pools.items()}
+    current_allocations = to_fixed_array(pool_arrays.borrow_amount)
+    balance = to_fixed(max_balance) - int(current_allocations.sum())
 
     assert balance >= 0
 
+    default_chunk_size = to_fixed(CHUNK_RATIO * max_balance)
+
     # run greedy algorithm to allocate assets to pools
     while balance > 0:
-        # TODO: use np.float32 instead of format()??
-        current_apys = {
-            k: format_num_prec(
-                calculate_apy(
-                    util_rate=v["borrow_amount"] / current_allocations[k], pool=v
-                )
-            )
-            for k, v in pools.items()
-        }
-
-        default_chunk_size = format_num_prec(CHUNK_RATIO * max_balance)
-        to_allocate = 0
-
-        if balance < default_chunk_size:
-            to_allocate = balance
+        current_apys = np.round(
+            pool_rates(from_fixed(current_allocations), pool_arrays), GREEDY_SIG_FIGS
+        )
+
+        to_allocate = min(balance, default_chunk_size)
+        balance -= to_allocate
+        min_apy = current_apys.min()
+        apy_range = current_apys.max() - min_apy
+        if apy_range > 0:
+            shares = ((current_apys - min_apy) / apy_range).tolist()
         else:
-            to_allocate = default_chunk_size
-
-        balance = format_num_prec(balance - to_allocate)
-        assert balance >= 0
-        max_apy = max(current_apys.values())
-        min_apy = min(current_apys.values())
-        apy_range = format_num_prec(max_apy - min_apy)
-
-        alloc_it = current_allocations.items()
-        for pool_id, _ in alloc_it:
-            delta = format_num_prec(
-                to_allocate * ((current_apys[pool_id] - min_apy) / (apy_range)),
-            )
-            current_allocations[pool_id] = format_num_prec(
-                current_allocations[pool_id] + delta
-            )
-            to_allocate = format_num_prec(to_allocate - delta)
+            # every pool yields the same, so they split the chunk evenly
+            shares = [1 / (len(current_apys) - idx) for idx in range(len(current_apys))]
+
+        # every pool takes its share of what is left of the chunk in turn, so this can't be
+        # vectorized - but it is a plain python loop, not one over numpy scalars
+        deltas = []
+        for share in shares:
+            delta = int(to_allocate * share)
+            deltas.append(delta)
+            to_allocate -= delta
+        current_allocations += np.array(deltas, dtype=current_allocations.dtype)
 
         assert to_allocate == 0  # should allocate everything from current chunk
 
-    return current_allocations
+    return from_fixed_allocations(
+        dict(zip(pool_arrays.pool_ids, current_allocations.tolist())), pools, max_balance
+    )
 
 
 # LRU Cache with TTL
@@ -149,7 +146,7 @@ def ttl_cache(maxsize: int = 128, typed: bool = False, ttl: int = -1):
     """
     if ttl <= 0:
         ttl = 65536
-    hash_gen = _ttl_hash_gen(ttl)
+    start_time = time.monotonic()
 
     def wrapper(func: Callable) -> Callable:
         @lru_cache(maxsize, typed)
@@ -157,31 +154,86 @@ def ttl_cache(maxsize: int = 128, typed: bool = False, ttl: int = -1):
             return func(*args, **kwargs)
 
         def wrapped(*args, **kwargs) -> Any:
-            th = next(hash_gen)
+            # wrapped functions get called from several threads at once, so the hash is
+            # worked out from the time on every call rather than kept in shared state
+            th = _ttl_hash(start_time, ttl)
             return ttl_func(th, *args, **kwargs)
 
-        return update_wrapper(wrapped, func)
+        wrapped = update_wrapper(wrapped, func)
+        wrapped.cache_info = ttl_func.cache_info
+        wrapped.cache_clear = ttl_func.cache_clear
+        return wrapped
 
     return wrapper
 
 
-def _ttl_hash_gen(seconds: int):
+def _ttl_hash(start_time: float, seconds: int) -> int:
     """
-    Internal generator function used by the `ttl_cache` decorator to generate a new hash value at regular
+    Internal function used by the `ttl_cache` decorator to generate a new hash value at regular
     time intervals specified by `seconds`.
 
     Args:
+        start_time (float): The `time.monotonic()` the intervals are counted from.
         seconds (int): The number of seconds after which a new hash value will be generated.
 
-    Yields:
+    Returns:
         int: A hash value that represents the current time interval.
 
-    This generator is used to create time-based hash values that enable the `ttl_cache` to determine
-    whether cached entries are still valid or if they have expired and should be recalculated.
+    The time-based hash values enable the `ttl_cache` to determine whether cached entries are still valid
+    or if they have expired and should be recalculated.
+    """
+    return floor((time.monotonic() - start_time) / seconds)
+
+
+def pools_fingerprint(assets_and_pools: Dict) -> str:
+    """Canonical hash of an ``assets_and_pools`` payload - the same for payloads with equal values, whatever their key order."""
+    canonical = json.dumps(assets_and_pools, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+class AllocationKey:
+    """
+    Hashable handle on an allocation request, so it can be passed to cached functions. Keys compare
+    by the ``pools_fingerprint`` of the request's pools, the synapse just comes along for the computation.
+    """
+
+    __slots__ = ("fingerprint", "synapse")
+
+    def __init__(self, synapse: sturdy.protocol.AllocateAssets):
+        self.fingerprint = pools_fingerprint(synapse.assets_and_pools)
+        self.synapse = synapse
+
+    def __hash__(self) -> int:
+        return hash(self.fingerprint)
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, AllocationKey) and self.fingerprint == other.fingerprint
+        )
+
+
+def cached_allocation_algorithm(
+    allocation_algorithm: Callable, maxsize: int = 1024, ttl: int = 120
+) -> Callable:
+    """
+    Wraps an allocation algorithm with a ``ttl_cache``, so pools that were already allocated
+    (retries, other validators sending the same pools) are answered from memory. The cache holds at
+    most ``maxsize`` results, which expire after at most ``ttl`` seconds; ``cache_info()`` has the
+    hit and miss counts.
     """
-    start_time = time.time()
-    while True:
-        yield floor((time.time() - start_time) / seconds)
+
+    @ttl_cache(maxsize=maxsize, ttl=ttl)
+    def allocate(key: AllocationKey) -> Dict:
+        return allocation_algorithm(key.synapse)
+
+    def cached(synapse: sturdy.protocol.AllocateAssets) -> Dict:
+        # copy, so callers can't change the cached result
+        return dict(allocate(AllocationKey(synapse)))
+
+    cached.__wrapped__ = allocation_algorithm
+    cached.cache_info = allocate.cache_info
+    cached.cache_clear = allocate.cache_clear
+    return cached
 
 
 # 12 seconds updating block.
@@ -0,0 +1,328 @@
+import bisect
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Tuple
+
+import sturdy
+from sturdy.constants import FIXED_POINT_SCALE
+from sturdy.protocol import from_fixed, from_fixed_allocations, to_fixed
+from sturdy.utils.rates import KINKED, get_rate_model, interest_rate
+
+# (marginal yield, length) - a linear piece of a pool's yield curve, measured in assets
+# allocated on top of the pool's borrow amount
+Segment = Tuple[float, float]
+
+
+def kinked_yield_segments(pool: Dict, excess: float) -> List[Segment]:
+    """
+    Splits the yield of a pool that follows the two-slope kinked rate model into linear segments.
+
+    Allocating ``a >= borrow_amount`` to a pool yields ``a * calculate_apy(borrow_amount / a, pool)``.
+    While the utilization rate is above ``optimal_util_rate`` this is linear in ``a`` with slope
+    ``base_rate + base_slope - kink_slope * optimal_util_rate / (1 - optimal_util_rate)``, once it drops
+    below the kink the slope is just ``base_rate``. The returned segments cover ``[0, excess]``.
+    """
+    borrow_amount = pool["borrow_amount"]
+    optimal_util_rate = pool["optimal_util_rate"]
+    kink_end = min(borrow_amount / optimal_util_rate - borrow_amount, excess)
+    above_kink = (
+        pool["base_rate"]
+        + pool["base_slope"]
+        - pool["kink_slope"] * optimal_util_rate / (1 - optimal_util_rate)
+    )
+
+    segments = []
+    if kink_end > 0:
+        segments.append((above_kink, kink_end))
+    if excess - kink_end > 0:
+        segments.append((pool["base_rate"], excess - kink_end))
+    return segments
+
+
+def yield_segments(pool: Dict, excess: float) -> List[Segment]:
+    """
+    Splits the yield of a pool following any rate model into linear segments covering ``[0, excess]``.
+
+    For rates that are piecewise-linear in the utilization rate ``u = borrow_amount / a`` the yield
+    ``a * rate(u)`` is linear in ``a`` between the model's breakpoints, so the segments are exact.
+    Smooth models give a grid of breakpoints, and their curve is approximated by its chords.
+    """
+    model = pool.get("model", KINKED)
+    if model == KINKED:
+        return kinked_yield_segments(pool, excess)
+    if excess <= 0:
+        return []
+
+    borrow_amount = pool["borrow_amount"]
+    if borrow_amount <= 0:
+        return [(interest_rate(0.0, pool), excess)]
+
+    def total_yield(extra: float) -> float:
+        amount = borrow_amount + extra
+        return amount * interest_rate(borrow_amount / amount, pool)
+
+    # utilization drops as more is allocated, so the breakpoints come in decreasing order
+    points = [0.0]
+    for util_rate in sorted(get_rate_model(model).breakpoints(pool), reverse=True):
+        if 0 < util_rate < 1:
+            extra = borrow_amount / util_rate - borrow_amount
+            if points[-1] < extra < excess:
+                points.append(extra)
+    points.append(excess)
+
+    yields = [total_yield(extra) for extra in points]
+    segments = []
+    for idx in range(len(points) - 1):
+        length = points[idx + 1] - points[idx]
+        segments.append(((yields[idx + 1] - yields[idx]) / length, length))
+    return segments
+
+
+def truncate_segments(segments: List[Segment], excess: float) -> List[Segment]:
+    """Cuts segments covering a longer range down to ``[0, excess]``."""
+    truncated = []
+    for slope, length in segments:
+        if excess <= 0:
+            break
+        truncated.append((slope, min(length, excess)))
+        excess -= length
+    return truncated
+
+
+def segments_gain(segments: List[Segment], amount: float) -> float:
+    """Yield gained by putting ``amount`` on top of the borrow amount of a pool with the given segments."""
+    gain = 0.0
+    for slope, length in segments:
+        if amount <= 0:
+            break
+        gain += slope * min(amount, length)
+        amount -= length
+    return gain
+
+
+def concave_hull(segments: List[Segment]) -> List[Tuple[float, float, bool]]:
+    """
+    Returns the upper concave envelope of a piecewise-linear yield curve as (slope, length, merged)
+    triples with strictly decreasing slopes. Segments with increasing marginal yield are merged into a
+    single chord, flagged with ``merged`` since the real curve lies below it.
+    """
+    hull = []
+    for slope, length in segments:
+        merged = False
+        while hull and hull[-1][0] <= slope:
+            prev_slope, prev_length, _ = hull.pop()
+            slope = (prev_slope * prev_length + slope * length) / (prev_length + length)
+            length += prev_length
+            merged = True
+        hull.append((slope, length, merged))
+    return hull
+
+
+def water_fill(
+    candidates: List[Tuple[float, float, bool, str]], excess: float
+) -> Tuple[Dict[str, float], int]:
+    """
+    Fills the segments in ``candidates`` (sorted by decreasing marginal yield) until ``excess`` assets
+    have been placed. Returns the amounts placed per pool and the index of the last segment touched.
+    """
+    extra = {}
+    remaining = excess
+    idx = -1
+    for idx, (_, length, _, pool_id) in enumerate(candidates):
+        if remaining <= 0:
+            idx -= 1
+            break
+        amount = min(length, remaining)
+        extra[pool_id] = extra.get(pool_id, 0.0) + amount
+        remaining -= amount
+    return extra, idx
+
+
+def settle_allocations(
+    pools: Dict, extra: Dict[str, float], slack_pool_id: str, total_assets: float
+) -> Dict[str, float]:
+    """
+    Turns the borrow amounts plus the extra amounts placed by ``water_fill`` into fixed-point allocations
+    that add up to exactly ``total_assets``. Extra amounts are rounded down and whatever the rounding
+    left over goes to ``slack_pool_id``.
+    """
+    allocations = {
+        k: to_fixed(v["borrow_amount"])
+        + math.floor(extra.get(k, 0.0) * FIXED_POINT_SCALE)
+        for k, v in pools.items()
+    }
+    allocations[slack_pool_id] += to_fixed(total_assets) - sum(allocations.values())
+    return from_fixed_allocations(allocations, pools, total_assets)
+
+
+def optimal_allocation_algorithm(synapse: sturdy.protocol.AllocateAssets) -> Dict:
+    """
+    Allocates all assets so that the total yield is maximized, in O(N log N) for N pools.
+
+    Every pool's yield is piecewise-linear in the amount allocated to it, so instead of walking the
+    balance down in chunks like ``greedy_allocation_algorithm`` we equalize marginal yields directly:
+    the concave envelopes of all pools' yield curves are cut into segments, sorted by marginal yield
+    and filled in order (the discrete equivalent of bisecting on the Lagrange multiplier of the budget
+    constraint). If the budget runs out half way through a merged chord, where the envelope overstates
+    the real yield, we also try skipping that chord and keep whichever allocation yields more.
+    """
+    total_assets = synapse.assets_and_pools["total_assets"]
+    pools = synapse.assets_and_pools["pools"]
+    if not pools:
+        return {}
+
+    # must allocate borrow amount as a minimum to ALL pools
+    excess = from_fixed(
+        to_fixed(total_assets)
+        - sum([to_fixed(v["borrow_amount"]) for v in pools.values()])
+    )
+    assert excess >= 0
+
+    segments = {k: yield_segments(v, excess) for k, v in pools.items()}
+    # sorting is stable, so a pool's segments keep their (decreasing slope) order
+    candidates = sorted(
+        (
+            (slope, length, merged, pool_id)
+            for pool_id, pool_segments in segments.items()
+            for slope, length, merged in concave_hull(pool_segments)
+        ),
+        key=lambda candidate: -candidate[0],
+    )
+
+    return fill_candidates(pools, segments, candidates, excess, total_assets)
+
+
+def fill_candidates(
+    pools: Dict,
+    segments: Dict[str, List[Segment]],
+    candidates: List[Tuple[float, float, bool, str]],
+    excess: float,
+    total_assets: float,
+) -> Dict:
+    """The water filling step of ``optimal_allocation_algorithm``, over already sorted hull segments."""
+    extra, last_idx = water_fill(candidates, excess)
+
+    if last_idx >= 0:
+        _, length, merged, slack_pool_id = candidates[last_idx]
+        filled = extra[slack_pool_id] - sum(
+            c[1] for c in candidates[:last_idx] if c[3] == slack_pool_id
+        )
+        if merged and filled < length:
+            # the slack pool sits in the middle of a chord - see if skipping it does better
+            alt_candidates = [
+                c
+                for idx, c in enumerate(candidates)
+                if idx < last_idx or c[3] != slack_pool_id
+            ]
+            alt_extra, alt_last_idx = water_fill(alt_candidates, excess)
+
+            def total_gain(amounts: Dict[str, float]) -> float:
+                return sum(segments_gain(segments[k], v) for k, v in amounts.items())
+
+            if total_gain(alt_extra) > total_gain(extra):
+                extra = alt_extra
+                slack_pool_id = alt_candidates[alt_last_idx][3]
+    else:
+        slack_pool_id = next(iter(pools))
+
+    return settle_allocations(pools, extra, slack_pool_id, total_assets)
+
+
+# hull segments are ordered by decreasing marginal yield - ties are broken by pool id, so the order
+# doesn't depend on the order segments were inserted in
+def candidate_key(candidate: Tuple[float, float, bool, str]) -> Tuple[float, str]:
+    return -candidate[0], candidate[3]
+
+
+class AllocatorState:
+    """
+    What ``IncrementalAllocator`` keeps of its last solution for a set of pools: the yield segments
+    and hull segments of every pool, and all hull segments in sorted order. They cover all of
+    ``total_assets`` rather than just the excess over the borrow amounts, so they stay valid when a
+    borrow amount change moves the excess - the water filling stops at the excess either way.
+    """
+
+    def __init__(self, pools: Dict, total_assets: float):
+        self.total_assets = total_assets
+        self.pools = {k: dict(v) for k, v in pools.items()}
+        self.fixed_borrow = sum(to_fixed(v["borrow_amount"]) for v in pools.values())
+        self.segments = {k: yield_segments(v, total_assets) for k, v in pools.items()}
+        self.hulls = {pool_id: self.hull(pool_id) for pool_id in self.pools}
+        self.candidates = sorted(
+            (c for hull in self.hulls.values() for c in hull), key=candidate_key
+        )
+
+    def hull(self, pool_id: str) -> List[Tuple[float, float, bool, str]]:
+        return [
+            (slope, length, merged, pool_id)
+            for slope, length, merged in concave_hull(self.segments[pool_id])
+        ]
+
+    def update_pool(self, pool_id: str, pool: Dict):
+        """Re-evaluates a pool whose parameters changed, moving its hull segments in the sorted order."""
+        self.fixed_borrow += to_fixed(pool["borrow_amount"]) - to_fixed(
+            self.pools[pool_id]["borrow_amount"]
+        )
+        self.pools[pool_id] = dict(pool)
+        self.segments[pool_id] = yield_segments(pool, self.total_assets)
+
+        for candidate in self.hulls[pool_id]:
+            idx = bisect.bisect_left(
+                self.candidates, candidate_key(candidate), key=candidate_key
+            )
+            del self.candidates[idx]
+        self.hulls[pool_id] = self.hull(pool_id)
+        for candidate in self.hulls[pool_id]:
+            bisect.insort(self.candidates, candidate, key=candidate_key)
+
+
+class IncrementalAllocator:
+    """
+    ``optimal_allocation_algorithm``, warm started from the previous solution for the same set of pools.
+
+    The yield segments and sorted hull segments of every set of pool ids seen are kept (up to
+    ``max_states`` sets, least recently used ones are dropped). A request only re-evaluates the rate
+    curves of the pools whose parameters changed, and moves their hull segments in the sorted order
+    by bisection - whether or not the assets left over after the borrow amounts changed too. All
+    that is left is the water filling.
+    """
+
+    def __init__(self, max_states: int = 128):
+        self.max_states = max_states
+        self.states: "OrderedDict[FrozenSet[str], AllocatorState]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _state(self, pools: Dict, total_assets: float) -> Tuple[AllocatorState, bool]:
+        key = frozenset(pools)
+        state = self.states.get(key)
+        if state is not None and state.total_assets == total_assets:
+            self.states.move_to_end(key)
+            return state, True
+
+        state = AllocatorState(pools, total_assets)
+        self.states[key] = state
+        while len(self.states) > self.max_states:
+            self.states.popitem(last=False)
+        return state, False
+
+    def __call__(self, synapse: sturdy.protocol.AllocateAssets) -> Dict:
+        total_assets = synapse.assets_and_pools["total_assets"]
+        pools = synapse.assets_and_pools["pools"]
+        if not pools:
+            return {}
+
+        with self.lock:
+            state, warm = self._state(pools, total_assets)
+            if warm:
+                for pool_id, pool in pools.items():
+                    if state.pools[pool_id] != pool:
+                        state.update_pool(pool_id, pool)
+
+            # must allocate borrow amount as a minimum to ALL pools
+            excess = from_fixed(to_fixed(total_assets) - state.fixed_borrow)
+            assert excess >= 0
+
+            return fill_candidates(
+                pools, state.segments, state.candidates, excess, total_assets
+            )
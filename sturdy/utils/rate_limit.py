@@ -0,0 +1,54 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, in bursts of up to ``burst`` requests."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimiter:
+    """
+    One ``TokenBucket`` per key (e.g. per hotkey). At most ``max_keys`` buckets are kept - the
+    least recently used ones are dropped, which only ever lets a dropped key start over with a
+    full bucket. A ``rate`` of 0 or less disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 4096):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, key: Hashable, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            return bucket.take(now)
@@ -0,0 +1,358 @@
+import math
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from sturdy.constants import POOL_FIELDS
+
+# the rate model of pools without a "model" tag
+KINKED = "kinked"
+
+
+class ModelGroup(NamedTuple):
+    """
+    The pools of a set that follow the same (non-kinked) rate model.
+
+    Attributes:
+    - model: name of the rate model, see ``RATE_MODELS``.
+    - columns: indices of the pools in the arrays of the set.
+    - params: the pools' parameters as packed by the model.
+    - pools: the pool dicts themselves.
+    """
+
+    model: str
+    columns: np.ndarray
+    params: Any
+    pools: List[Dict]
+
+
+class PoolArrays(NamedTuple):
+    """
+    Structure-of-arrays view of a set of pools, as used by the vectorized rate engine.
+
+    Attributes:
+    - pool_ids: The ids of the pools, in the order of the arrays.
+    - base_rate, base_slope, kink_slope, optimal_util_rate, borrow_amount: float64 arrays of shape
+      (n_pools,) holding the respective pool parameters.
+    - models: the pools that don't follow the kinked rate model, grouped by model. Their kinked
+      parameters are ignored.
+    """
+
+    pool_ids: List[str]
+    base_rate: np.ndarray
+    base_slope: np.ndarray
+    kink_slope: np.ndarray
+    optimal_util_rate: np.ndarray
+    borrow_amount: np.ndarray
+    models: Tuple[ModelGroup, ...] = ()
+
+    @classmethod
+    def from_pools(cls, pools: Dict[str, Dict]) -> "PoolArrays":
+        """Packs the pools of an ``assets_and_pools`` payload (pool_id -> pool dict) into arrays."""
+        pool_ids = list(pools)
+        values = [pools[pool_id] for pool_id in pool_ids]
+        return cls(
+            pool_ids,
+            *(
+                np.array([pool.get(field, 0.0) for pool in values], dtype=np.float64)
+                for field in POOL_FIELDS
+            ),
+            models=model_groups(values),
+        )
+
+
+def kinked_interest_rate(
+    util_rate: float,
+    base_rate: float,
+    base_slope: float,
+    kink_slope: float,
+    optimal_util_rate: float,
+) -> float:
+    """Interest rate of a pool following the two-slope kinked rate model, for a single utilization rate."""
+    if util_rate < optimal_util_rate:
+        return base_rate + (util_rate / optimal_util_rate) * base_slope
+    return (
+        base_rate
+        + base_slope
+        + ((util_rate - optimal_util_rate) / (1 - optimal_util_rate)) * kink_slope
+    )
+
+
+def kinked_interest_rates(
+    util_rates: np.ndarray,
+    base_rate: np.ndarray,
+    base_slope: np.ndarray,
+    kink_slope: np.ndarray,
+    optimal_util_rate: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized version of ``kinked_interest_rate``. All arguments are broadcast against each other, so
+    ``util_rates`` may be a (n_miners, n_pools) matrix while the pool parameters are (n_pools,) arrays.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        below_kink = base_rate + (util_rates / optimal_util_rate) * base_slope
+        above_kink = (
+            base_rate
+            + base_slope
+            + ((util_rates - optimal_util_rate) / (1 - optimal_util_rate)) * kink_slope
+        )
+    return np.where(util_rates < optimal_util_rate, below_kink, above_kink)
+
+
+def multi_kink_interest_rate(util_rate: float, pool: Dict) -> float:
+    """
+    Piecewise-linear rate model with any number of kinks: ``kinks`` holds the (increasing)
+    utilization rates the slope changes at, ``slopes`` the rate increase per unit of utilization
+    before the first kink, between every two kinks and after the last one.
+    """
+    rate = pool["base_rate"]
+    start = 0.0
+    for end, slope in zip([*pool["kinks"], math.inf], pool["slopes"]):
+        rate += slope * min(max(util_rate - start, 0.0), end - start)
+        start = end
+    return rate
+
+
+def pack_multi_kink(pools: List[Dict]) -> Tuple[np.ndarray, ...]:
+    # pad every pool to the same number of pieces with zero slopes
+    n_pieces = max(len(pool["slopes"]) for pool in pools)
+    starts = np.zeros((len(pools), n_pieces))
+    lengths = np.zeros((len(pools), n_pieces))
+    slopes = np.zeros((len(pools), n_pieces))
+    for idx, pool in enumerate(pools):
+        bounds = np.array([0.0, *pool["kinks"], math.inf])
+        count = len(pool["slopes"])
+        starts[idx, :count] = bounds[:-1]
+        lengths[idx, :count] = np.diff(bounds)
+        slopes[idx, :count] = pool["slopes"]
+    base_rate = np.array([pool["base_rate"] for pool in pools], dtype=np.float64)
+    return base_rate, starts, lengths, slopes
+
+
+def multi_kink_interest_rates(
+    util_rates: np.ndarray, params: Tuple[np.ndarray, ...]
+) -> np.ndarray:
+    base_rate, starts, lengths, slopes = params
+    pieces = np.clip(util_rates[..., None] - starts, 0.0, lengths)
+    return base_rate + np.sum(slopes * pieces, axis=-1)
+
+
+def exponential_interest_rate(util_rate: float, pool: Dict) -> float:
+    """
+    Rate model growing exponentially with utilization, from ``base_rate`` when idle to
+    ``base_rate + base_slope`` when fully utilized. ``exponent`` (> 0) sets how steep it gets.
+    """
+    return pool["base_rate"] + pool["base_slope"] * math.expm1(
+        pool["exponent"] * util_rate
+    ) / math.expm1(pool["exponent"])
+
+
+def pack_exponential(pools: List[Dict]) -> Tuple[np.ndarray, ...]:
+    return tuple(
+        np.array([pool[field] for pool in pools], dtype=np.float64)
+        for field in ("base_rate", "base_slope", "exponent")
+    )
+
+
+def exponential_interest_rates(
+    util_rates: np.ndarray, params: Tuple[np.ndarray, ...]
+) -> np.ndarray:
+    base_rate, base_slope, exponent = params
+    return base_rate + base_slope * np.expm1(exponent * util_rates) / np.expm1(exponent)
+
+
+def table_interest_rate(util_rate: float, pool: Dict) -> float:
+    """
+    Rate model interpolating linearly between the points of a table: ``utils`` holds increasing
+    utilization rates, ``rates`` the rate at each of them. Rates are flat outside of the table.
+    """
+    return float(np.interp(util_rate, pool["utils"], pool["rates"]))
+
+
+def pack_table(pools: List[Dict]) -> Tuple[np.ndarray, ...]:
+    # pad every table to the same length by repeating its last point
+    n_points = max(len(pool["utils"]) for pool in pools)
+    utils = np.empty((len(pools), n_points))
+    rates = np.empty((len(pools), n_points))
+    for idx, pool in enumerate(pools):
+        count = len(pool["utils"])
+        utils[idx, :count], utils[idx, count:] = pool["utils"], pool["utils"][-1]
+        rates[idx, :count], rates[idx, count:] = pool["rates"], pool["rates"][-1]
+    return utils, rates
+
+
+def table_interest_rates(
+    util_rates: np.ndarray, params: Tuple[np.ndarray, ...]
+) -> np.ndarray:
+    utils, rates = params
+    n_pools, n_points = utils.shape
+    if n_points == 1:
+        return np.broadcast_to(rates[:, 0], util_rates.shape).copy()
+    util_rates = np.clip(util_rates, utils[:, 0], utils[:, -1])
+    # the table segment every utilization rate falls in
+    segment = np.clip(
+        np.sum(util_rates[..., None] >= utils, axis=-1) - 1, 0, n_points - 2
+    )
+    columns = np.arange(n_pools)
+    x0, x1 = utils[columns, segment], utils[columns, segment + 1]
+    y0, y1 = rates[columns, segment], rates[columns, segment + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(x1 > x0, (util_rates - x0) / (x1 - x0), 0.0)
+    return y0 + t * (y1 - y0)
+
+
+class RateModel(NamedTuple):
+    """
+    An interest rate model pools can follow, selected by the "model" tag of a pool dict.
+
+    Attributes:
+    - rate: ``rate(util_rate, pool)`` - the rate of a single pool dict.
+    - pack: packs the parameters of a list of pool dicts into arrays, once per pool set.
+    - rates: ``rates(util_rates, params)`` - the rates of (..., n_pools) utilization rates, for
+      ``params`` packed from the n_pools pools.
+    - breakpoints: utilization rates where the rate curve of a pool dict bends. The curve is
+      taken to be linear in between, so smooth models return a grid to approximate it with.
+    """
+
+    rate: Callable[[float, Dict], float]
+    pack: Callable[[List[Dict]], Any]
+    rates: Callable[[np.ndarray, Any], np.ndarray]
+    breakpoints: Callable[[Dict], List[float]]
+
+
+RATE_MODELS: Dict[str, RateModel] = {}
+
+
+def register_rate_model(name: str, model: RateModel):
+    RATE_MODELS[name] = model
+
+
+def get_rate_model(name: str) -> RateModel:
+    try:
+        return RATE_MODELS[name]
+    except KeyError:
+        raise ValueError(f"Unknown interest rate model: {name}") from None
+
+
+def interest_rate(util_rate: float, pool: Dict) -> float:
+    """Interest rate of a single pool dict, following the rate model it is tagged with."""
+    model = pool.get("model", KINKED)
+    if model == KINKED:
+        return kinked_interest_rate(
+            util_rate,
+            pool["base_rate"],
+            pool["base_slope"],
+            pool["kink_slope"],
+            pool["optimal_util_rate"],
+        )
+    return get_rate_model(model).rate(util_rate, pool)
+
+
+def model_groups(pools: List[Dict]) -> Tuple[ModelGroup, ...]:
+    """Groups the pools that aren't kinked by rate model, packing the parameters of each group."""
+    columns = {}
+    for column, pool in enumerate(pools):
+        model = pool.get("model", KINKED)
+        if model != KINKED:
+            columns.setdefault(model, []).append(column)
+
+    groups = []
+    for model, model_columns in columns.items():
+        model_pools = [pools[column] for column in model_columns]
+        groups.append(
+            ModelGroup(
+                model,
+                np.array(model_columns, dtype=np.int64),
+                get_rate_model(model).pack(model_pools),
+                model_pools,
+            )
+        )
+    return tuple(groups)
+
+
+register_rate_model(
+    KINKED,
+    RateModel(
+        rate=interest_rate,
+        pack=lambda pools: tuple(
+            np.array([pool[field] for pool in pools], dtype=np.float64)
+            for field in POOL_FIELDS[:-1]
+        ),
+        rates=lambda util_rates, params: kinked_interest_rates(util_rates, *params),
+        breakpoints=lambda pool: [pool["optimal_util_rate"]],
+    ),
+)
+register_rate_model(
+    "multi_kink",
+    RateModel(
+        rate=multi_kink_interest_rate,
+        pack=pack_multi_kink,
+        rates=multi_kink_interest_rates,
+        breakpoints=lambda pool: list(pool["kinks"]),
+    ),
+)
+register_rate_model(
+    "exponential",
+    RateModel(
+        rate=exponential_interest_rate,
+        pack=pack_exponential,
+        rates=exponential_interest_rates,
+        breakpoints=lambda pool: np.linspace(0, 1, 65)[1:-1].tolist(),
+    ),
+)
+register_rate_model(
+    "table",
+    RateModel(
+        rate=table_interest_rate,
+        pack=pack_table,
+        rates=table_interest_rates,
+        breakpoints=lambda pool: list(pool["utils"]),
+    ),
+)
+
+
+def pool_rates(allocations: np.ndarray, pools: PoolArrays) -> np.ndarray:
+    """
+    Returns the interest rate every pool would have for the given allocations.
+
+    Args:
+    - allocations: array of shape (..., n_pools), e.g. one row of allocations per miner.
+    - pools: the pools the allocations are made to.
+
+    Returns:
+    - np.ndarray: interest rates, with the same shape as ``allocations``.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        util_rates = pools.borrow_amount / allocations
+    rates = kinked_interest_rates(
+        util_rates,
+        pools.base_rate,
+        pools.base_slope,
+        pools.kink_slope,
+        pools.optimal_util_rate,
+    )
+    # pools following other rate models are evaluated one model at a time
+    for group in pools.models:
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            rates[..., group.columns] = get_rate_model(group.model).rates(
+                util_rates[..., group.columns], group.params
+            )
+    return rates
+
+
+def allocation_yields(
+    allocations: np.ndarray, pools: PoolArrays
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluates a whole matrix of allocations in one go.
+
+    Args:
+    - allocations: array of shape (..., n_pools), e.g. one row of allocations per miner.
+    - pools: the pools the allocations are made to.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: the per-pool interest rates, with the same shape as
+      ``allocations``, and the total yield of every row of allocations, of shape (...,).
+    """
+    rates = pool_rates(allocations, pools)
+    return rates, np.sum(allocations * rates, axis=-1)
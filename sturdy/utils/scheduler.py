@@ -0,0 +1,143 @@
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import bittensor as bt
+
+BLOCK_TIME = 12.0  # expected seconds between blocks
+
+
+class BlockJob:
+    """
+    A job the scheduler runs every ``cadence`` blocks, along with how long its recent runs took.
+    Its budget is the wall-clock time of ``cadence`` blocks - a job taking longer than that makes
+    the scheduler fall behind the chain.
+    """
+
+    def __init__(
+        self, name: str, cadence: int, func: Callable[[], None], history: int = 128
+    ):
+        self.name = name
+        self.cadence = cadence
+        self.func = func
+        self.last_block: Optional[int] = None
+        self.durations = deque(maxlen=history)
+        self.over_budget = 0
+
+    def is_due(self, block: int) -> bool:
+        return self.last_block is None or block - self.last_block >= self.cadence
+
+    def stats(self, block_time: float) -> Dict:
+        durations = list(self.durations)
+        return {
+            "runs": len(durations),
+            "last": durations[-1] if durations else None,
+            "mean": sum(durations) / len(durations) if durations else None,
+            "max": max(durations) if durations else None,
+            "budget": self.cadence * block_time,
+            "over_budget": self.over_budget,
+        }
+
+
+class BlockScheduler:
+    """
+    Runs jobs at block cadences. New blocks are waited for by subscribing to the chain's block
+    headers; if the subscription isn't available it falls back to sleeping until the next block is
+    expected, based on the observed block time.
+    """
+
+    def __init__(
+        self,
+        subtensor: "bt.subtensor",
+        block_time: float = BLOCK_TIME,
+        use_subscription: bool = True,
+    ):
+        self.subtensor = subtensor
+        self.block_time = block_time
+        self.use_subscription = use_subscription
+        self.jobs: List[BlockJob] = []
+        self.last_block: Optional[int] = None
+        self.last_block_time: Optional[float] = None
+
+    def add_job(self, name: str, cadence: int, func: Callable[[], None]) -> BlockJob:
+        job = BlockJob(name, max(1, cadence), func)
+        self.jobs.append(job)
+        return job
+
+    def _observe_block(self, block: int):
+        now = time.monotonic()
+        if (
+            self.last_block is not None
+            and self.last_block_time is not None
+            and block > self.last_block
+        ):
+            # calibrate the block time on what the chain actually does
+            observed = (now - self.last_block_time) / (block - self.last_block)
+            self.block_time = 0.9 * self.block_time + 0.1 * observed
+        self.last_block = block
+        self.last_block_time = now
+
+    def _subscribe_next_block(self, after_block: int) -> int:
+        def handler(header, update_nr, subscription_id):
+            block = header["header"]["number"]
+            if block > after_block:
+                return block
+
+        return self.subtensor.substrate.subscribe_block_headers(handler)
+
+    def _sleep_next_block(self, after_block: int) -> int:
+        block = self.subtensor.get_current_block()
+        while block <= after_block:
+            if self.last_block_time is None:
+                time.sleep(1)
+            else:
+                expected = self.last_block_time + self.block_time - time.monotonic()
+                # poll at least every second once the block is overdue
+                time.sleep(max(expected, 1.0))
+            block = self.subtensor.get_current_block()
+        return block
+
+    def wait_for_block(self, after_block: Optional[int] = None) -> int:
+        """Blocks until the chain is past ``after_block`` (the last block seen if None) and returns the new block."""
+        if after_block is None:
+            after_block = self.last_block if self.last_block is not None else -1
+
+        block = None
+        if self.use_subscription:
+            try:
+                block = self._subscribe_next_block(after_block)
+            except Exception as e:
+                bt.logging.warning(
+                    f"Block header subscription failed, falling back to sleeping: {e}"
+                )
+                self.use_subscription = False
+        if block is None:
+            block = self._sleep_next_block(after_block)
+
+        self._observe_block(block)
+        return block
+
+    def run_due(self, block: int) -> List[str]:
+        """Runs the jobs that are due at ``block``, in the order they were added. Returns their names."""
+        ran = []
+        for job in self.jobs:
+            if not job.is_due(block):
+                continue
+            start_time = time.monotonic()
+            try:
+                job.func()
+            finally:
+                duration = time.monotonic() - start_time
+                job.last_block = block
+                job.durations.append(duration)
+                budget = job.cadence * self.block_time
+                if duration > budget:
+                    job.over_budget += 1
+                    bt.logging.warning(
+                        f"{job.name} took {duration:.2f}s, over its budget of {budget:.2f}s ({job.cadence} blocks)"
+                    )
+            ran.append(job.name)
+        return ran
+
+    def stats(self) -> Dict[str, Dict]:
+        return {job.name: job.stats(self.block_time) for job in self.jobs}
@@ -1,7 +1,6 @@
 import torch
-import random
 import bittensor as bt
-from typing import List
+from typing import Iterable, List, NamedTuple, Optional
 
 
 def check_uid_availability(
@@ -22,6 +21,120 @@ def check_uid_availability(
     return True
 
 
+class AvailabilityIndex:
+    """
+    Masks over the uids of the metagraph, kept up to date on resync so forward passes and uid sampling
+    don't have to scan every axon.
+
+    Attributes:
+    - serving: bool tensor of shape (n,), whether the axon of a uid is serving.
+    - stake: float tensor of shape (n,), the stake of every uid.
+    - validator_permit: bool tensor of shape (n,), whether a uid has a validator permit.
+    - serving_uids: long tensor holding the uids that are serving, in ascending order.
+    """
+
+    def __init__(self, metagraph: "bt.metagraph.Metagraph"):
+        self.serving = torch.zeros(0, dtype=torch.bool)
+        self.update(metagraph)
+
+    def update(
+        self, metagraph: "bt.metagraph.Metagraph", uids: Optional[Iterable[int]] = None
+    ):
+        """
+        Refreshes the stakes and validator permits, and whether the axons of ``uids`` are serving.
+        If ``uids`` is None, or the metagraph changed size, every axon is checked again.
+        """
+        self.stake = torch.as_tensor(metagraph.S, dtype=torch.float32).detach().clone()
+        self.validator_permit = (
+            torch.as_tensor(metagraph.validator_permit).detach().clone().bool()
+        )
+
+        n = metagraph.n.item()
+        if uids is None or len(self.serving) != n:
+            self.serving = torch.tensor(
+                [axon.is_serving for axon in metagraph.axons[:n]], dtype=torch.bool
+            )
+        else:
+            for uid in uids:
+                self.serving[uid] = metagraph.axons[uid].is_serving
+        self.serving_uids = torch.nonzero(self.serving).flatten()
+
+
+class HotkeyInfo(NamedTuple):
+    uid: int
+    stake: float
+    validator_permit: bool
+
+
+class HotkeyIndex:
+    """
+    Hotkey -> ``HotkeyInfo`` lookup over the metagraph, rebuilt on resync, so handling a request
+    doesn't have to scan ``metagraph.hotkeys``.
+    """
+
+    def __init__(self, metagraph: "bt.metagraph.Metagraph"):
+        self.update(metagraph)
+
+    def update(self, metagraph: "bt.metagraph.Metagraph"):
+        stakes = torch.as_tensor(metagraph.S, dtype=torch.float32).tolist()
+        permits = torch.as_tensor(metagraph.validator_permit).bool().tolist()
+        self.hotkeys = {
+            hotkey: HotkeyInfo(uid, stakes[uid], permits[uid])
+            for uid, hotkey in enumerate(metagraph.hotkeys)
+        }
+
+    def get(self, hotkey: Optional[str]) -> Optional[HotkeyInfo]:
+        return self.hotkeys.get(hotkey)
+
+    def __contains__(self, hotkey: Optional[str]) -> bool:
+        return hotkey in self.hotkeys
+
+    def __len__(self) -> int:
+        return len(self.hotkeys)
+
+
+class MetagraphDiff(NamedTuple):
+    """
+    What changed in the metagraph over a resync.
+
+    Attributes:
+    - replaced_uids: uids which are now registered to a different hotkey.
+    - new_uids: uids which didn't exist before.
+    - axon_changed_uids: existing uids whose axon info (endpoint, hotkey, ...) changed.
+    """
+
+    replaced_uids: List[int]
+    new_uids: List[int]
+    axon_changed_uids: List[int]
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.replaced_uids or self.new_uids or self.axon_changed_uids)
+
+
+def diff_metagraph(
+    previous_hotkeys: List[str],
+    previous_axons: List["bt.AxonInfo"],
+    metagraph: "bt.metagraph.Metagraph",
+) -> MetagraphDiff:
+    """Compares the hotkeys and axons from before a resync with those of the synced ``metagraph``."""
+    hotkeys = metagraph.hotkeys
+    axons = metagraph.axons
+    return MetagraphDiff(
+        replaced_uids=[
+            uid
+            for uid, (previous, hotkey) in enumerate(zip(previous_hotkeys, hotkeys))
+            if previous != hotkey
+        ],
+        new_uids=list(range(len(previous_hotkeys), len(hotkeys))),
+        axon_changed_uids=[
+            uid
+            for uid, (previous, axon) in enumerate(zip(previous_axons, axons))
+            if previous != axon
+        ],
+    )
+
+
 def get_random_uids(self, k: int, exclude: List[int] = None) -> torch.LongTensor:
     """Returns k available random uids from the metagraph.
     Args:
@@ -32,26 +145,23 @@ def get_random_uids(self, k: int, exclude: List[int] = None) -> torch.LongTensor
     Notes:
         If `k` is larger than the number of available `uids`, set `k` to the number of available `uids`.
     """
-    candidate_uids = []
-    avail_uids = []
-
-    for uid in range(self.metagraph.n.item()):
-        uid_is_available = check_uid_availability(
-            self.metagraph, uid, self.config.neuron.vpermit_tao_limit
-        )
-        uid_is_not_excluded = exclude is None or uid not in exclude
-
-        if uid_is_available:
-            avail_uids.append(uid)
-            if uid_is_not_excluded:
-                candidate_uids.append(uid)
+    available_uids = self.availability_index.serving_uids
+    if exclude:
+        is_candidate = ~torch.isin(available_uids, torch.as_tensor(exclude))
+    else:
+        is_candidate = torch.ones_like(available_uids, dtype=torch.bool)
+    candidate_uids = available_uids[is_candidate]
 
     # Check if candidate_uids contain enough for querying, if not grab all avaliable uids
-    available_uids = candidate_uids
     if len(candidate_uids) < k:
-        available_uids += random.sample(
-            [uid for uid in avail_uids if uid not in candidate_uids],
-            k - len(candidate_uids),
+        excluded_uids = available_uids[~is_candidate]
+        candidate_uids = torch.cat(
+            [
+                candidate_uids,
+                excluded_uids[torch.randperm(len(excluded_uids))][
+                    : k - len(candidate_uids)
+                ],
+            ]
         )
-    uids = torch.tensor(random.sample(available_uids, k))
+    uids = candidate_uids[torch.randperm(len(candidate_uids))][:k]
     return uids
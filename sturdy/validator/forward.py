@@ -17,18 +17,32 @@
 # DEALINGS IN THE SOFTWARE.
 
 import bittensor as bt
+import functools
+import time
 import typing
 import asyncio
+import numpy as np
 
-from sturdy.protocol import AllocateAssets
-from sturdy.validator.reward import get_rewards
+from sturdy.protocol import AllocateAssets, AllocateAssetsBatch
+from sturdy.validator.history import make_records
+from sturdy.validator.reward import (
+    ScoredResponses,
+    StreamingScorer,
+    get_rewards_async,
+    get_rewards_batched,
+    get_rewards_scenarios,
+)
+from sturdy.validator.quorum import QuorumPolicy
 from sturdy.utils.uids import get_random_uids
-from sturdy.pools import generate_assets_and_pools
+from sturdy.pools import generate_assets_and_pools, generate_pool_batch
 from sturdy.protocol import AllocInfo
 from sturdy.constants import QUERY_TIMEOUT
 
 bt.metagraph
 
+# scoring of organic requests which were answered before every miner responded
+background_scoring = set()
+
 
 async def forward(self):
     """
@@ -40,9 +54,119 @@ async def forward(self):
         self (:obj:`bittensor.neuron.Neuron`): The neuron object which contains all the necessary state for the validator.
 
     """
+    scenarios_per_query = self.config.neuron.scenarios_per_query
+    if scenarios_per_query > 1:
+        # several synthetic scenarios per query, see sturdy.protocol.AllocateAssetsBatch
+        await query_and_score_scenarios(
+            self, list(generate_pool_batch(scenarios_per_query))
+        )
+        return
+
     # generates synthetic pools
     assets_and_pools = generate_assets_and_pools()
-    await query_and_score_miners(self, assets_and_pools)
+    if self.pipeline is not None:
+        await query_and_pipeline_scoring(self, assets_and_pools)
+    else:
+        await query_and_score_miners(self, assets_and_pools)
+
+
+def miner_timeout(self, uid: int, num_scenarios: int = 1) -> float:
+    if not self.config.neuron.adaptive_timeouts:
+        return QUERY_TIMEOUT
+    timeout = self.latency_profiles.timeout(uid)
+    if num_scenarios == 1:
+        return timeout
+    # the profiles are of single scenarios - a batch gets as long as its scenarios would take one
+    # after the other, and never less than a request gets without adaptive timeouts
+    return max(timeout * num_scenarios, QUERY_TIMEOUT)
+
+
+def split_dead_uids(
+    self, uids: typing.List[int]
+) -> typing.Tuple[typing.List[int], typing.List[int]]:
+    """Splits ``uids`` into the ones to query this round, and dead axons which aren't due for a probe yet."""
+    if not self.config.neuron.adaptive_timeouts or not uids:
+        return uids, []
+    due = self.latency_profiles.should_query(uids, self.step)
+    return (
+        [uid for uid, is_due in zip(uids, due) if is_due],
+        [uid for uid, is_due in zip(uids, due) if not is_due],
+    )
+
+
+def record_latencies(self, uids: typing.List[int], responses: typing.List[bt.Synapse]):
+    self.latency_profiles.record(
+        uids,
+        [
+            response.dendrite.process_time
+            if response.is_success and response.allocations is not None
+            else None
+            for response in responses
+        ],
+        self.step,
+    )
+
+
+def record_score_history(
+    self,
+    step: int,
+    uids: typing.List[int],
+    axon_times: np.ndarray,
+    scored: ScoredResponses,
+):
+    if self.score_history is None:
+        return
+    self.score_history.append(
+        make_records(
+            step,
+            self.block,
+            uids,
+            scored.rewards,
+            scored.apys,
+            axon_times,
+            scored.cheating,
+        )
+    )
+
+
+def record_round(
+    self,
+    step: int,
+    uids: typing.List[int],
+    scoring_args: typing.Tuple,
+):
+    """
+    Records the round (its ``pack_scoring_args``) for replaying it later, if enabled - see
+    ``sturdy.validator.replay``. It is written in the background.
+    """
+    if self.round_recorder is None:
+        return
+    self.round_recorder.record(step, uids, scoring_args)
+
+
+def packed_synapse(self, synapse: bt.Synapse) -> typing.Optional[AllocateAssets]:
+    """The packed variant of ``synapse`` to send to miners that accept it, if there is one."""
+    if self.config.neuron.disable_packed_pools or not isinstance(
+        synapse, AllocateAssets
+    ):
+        return None
+    return synapse.packed()
+
+
+def record_packed_version(
+    self, uid: int, sent_packed: bool, response: bt.Synapse
+):
+    """Keeps track of which miners accept packed pools, going by what they responded with."""
+    if not response.is_success:
+        if sent_packed:
+            # maybe it can't decode them after all - back to plain pools until it says otherwise
+            self.packed_versions.pop(uid, None)
+        return
+    version = getattr(response, "accepted_packed_version", None)
+    if version is None:
+        self.packed_versions.pop(uid, None)
+    else:
+        self.packed_versions[uid] = version
 
 
 async def query_miner(
@@ -50,14 +174,24 @@ async def query_miner(
     synapse: bt.Synapse,
     uid: typing.List[int],
     deserialize: bool = False,
+    packed: typing.Optional[AllocateAssets] = None,
 ):
+    # the pools are only sent packed to miners that said they accept the version
+    sent_packed = packed is not None and self.packed_versions.get(
+        uid, -1
+    ) >= packed.packed_version
+    num_scenarios = (
+        len(synapse.scenarios) if isinstance(synapse, AllocateAssetsBatch) else 1
+    )
     response = await self.dendrite.forward(
         axons=self.metagraph.axons[uid],
-        synapse=synapse,
-        timeout=QUERY_TIMEOUT,
+        synapse=packed if sent_packed else synapse,
+        timeout=miner_timeout(self, uid, num_scenarios),
         deserialize=deserialize,
         streaming=False,
     )
+    if isinstance(synapse, AllocateAssets):
+        record_packed_version(self, uid, sent_packed, response)
 
     return response
 
@@ -68,29 +202,138 @@ async def query_multiple_miners(
     uids: typing.List[int],
     deserialize: bool = False,
 ):
+    packed = packed_synapse(self, synapse)
     uid_to_query_task = {
-        uid: asyncio.create_task(query_miner(self, synapse, uid, deserialize))
+        uid: asyncio.create_task(query_miner(self, synapse, uid, deserialize, packed))
         for uid in uids
     }
     responses = await asyncio.gather(*uid_to_query_task.values())
     return responses
 
 
-async def query_and_score_miners(
-    self, assets_and_pools: typing.Dict
+async def stream_multiple_miners(
+    self,
+    synapse: bt.Synapse,
+    uids: typing.List[int],
+    deserialize: bool = False,
+    deadline: float = QUERY_TIMEOUT,
+) -> typing.AsyncIterator[typing.Tuple[int, bt.Synapse]]:
+    """
+    Queries the miners like ``query_multiple_miners`` does, but yields (uid, response) pairs in the
+    order the responses come in. Miners that haven't responded once the deadline passes are skipped.
+    """
+
+    packed = packed_synapse(self, synapse)
+
+    async def query_uid(uid: int):
+        return uid, await query_miner(self, synapse, uid, deserialize, packed)
+
+    query_tasks = [asyncio.create_task(query_uid(uid)) for uid in uids]
+    try:
+        for next_response in asyncio.as_completed(query_tasks, timeout=deadline):
+            yield await next_response
+    except asyncio.TimeoutError:
+        bt.logging.debug(f"Stopped waiting for responses after {deadline}s")
+    finally:
+        for task in query_tasks:
+            task.cancel()
+
+
+def get_active_uids(self) -> typing.List[int]:
+    # kept up to date by resync_metagraph, see sturdy.utils.uids.AvailabilityIndex
+    return self.availability_index.serving_uids.tolist()
+
+
+async def stream_and_score_miners(
+    self,
+    assets_and_pools: typing.Dict,
+    deadline: float = QUERY_TIMEOUT,
+    quorum: typing.Optional[QuorumPolicy] = None,
 ) -> typing.Dict[int, AllocInfo]:
-    # The dendrite client queries the network.
-    # TODO: write custom availability function later down the road
-    active_uids = [
-        uid
-        for uid in range(self.metagraph.n.item())
-        if self.metagraph.axons[uid].is_serving
-    ]
+    """
+    Streaming counterpart of ``query_and_score_miners``: every response is validated and scored as
+    soon as it arrives, so all that is left once the last one is in is renormalizing the rewards.
 
+    With a quorum policy the allocations are returned as soon as the quorum (plus its grace period)
+    is reached. The stragglers are still scored in the background, and the scores are only updated
+    once they are in.
+    """
+    active_uids = get_active_uids(self)
     bt.logging.debug(f"active_uids: {active_uids}")
+    queried_uids, skipped_uids = split_dead_uids(self, active_uids)
+
+    synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+    scorer = StreamingScorer(assets_and_pools)
+    quorum_reached = asyncio.Event()
+
+    async def score_responses():
+        async for uid, response in stream_multiple_miners(
+            self, synapse, queried_uids, deadline=deadline
+        ):
+            scorer.add(uid, response)
+            record_latencies(self, [uid], [response])
+            if quorum is not None and quorum.reached(scorer.num_valid, len(queried_uids)):
+                quorum_reached.set()
+
+        # miners which didn't make the deadline (or weren't queried because their axon seems dead)
+        # are scored as if they didn't respond at all
+        responded = set(scorer.uids)
+        missed_uids = [uid for uid in queried_uids if uid not in responded]
+        record_latencies(self, missed_uids, [synapse] * len(missed_uids))
+        for uid in missed_uids + skipped_uids:
+            scorer.add(uid, synapse)
+
+        bt.logging.debug(f"Pools: {assets_and_pools['pools']}")
+        bt.logging.debug(
+            "Received allocations (uid -> allocations): "
+            f"{ {uid: response.allocations for uid, response in zip(scorer.uids, scorer.responses)} }"
+        )
+
+        record_round(self, self.step, scorer.uids, scorer.scoring_args())
+        rewards, allocs = scorer.get_rewards(
+            self, on_scored=functools.partial(record_score_history, self, self.step)
+        )
+
+        bt.logging.info(f"Scored responses: {rewards}")
+
+        self.update_scores(rewards, scorer.uids)
+        bt.logging.debug(f"allocs:\n{allocs}")
+        return allocs
+
+    scoring = asyncio.create_task(score_responses())
+    if quorum is None:
+        return await scoring
+
+    waiting_for_quorum = asyncio.create_task(quorum_reached.wait())
+    await asyncio.wait(
+        [scoring, waiting_for_quorum], return_when=asyncio.FIRST_COMPLETED
+    )
+    waiting_for_quorum.cancel()
+    if not scoring.done():
+        await asyncio.wait([scoring], timeout=quorum.grace_period)
+    if scoring.done():
+        return scoring.result()
 
-    responses = await query_multiple_miners(
-        self, AllocateAssets(assets_and_pools=assets_and_pools), active_uids
+    bt.logging.debug(
+        f"Quorum reached with {len(scorer.uids)}/{len(active_uids)} responses, scoring the rest in the background"
+    )
+    # hold on to the task so it doesn't get garbage collected before it's done
+    background_scoring.add(scoring)
+    scoring.add_done_callback(background_scoring.discard)
+    return scorer.allocs()
+
+
+async def query_and_score_miners(
+    self,
+    assets_and_pools: typing.Dict,
+    quorum: typing.Optional[QuorumPolicy] = None,
+) -> typing.Dict[int, AllocInfo]:
+    if quorum is not None or self.config.neuron.streaming_scoring:
+        return await stream_and_score_miners(self, assets_and_pools, quorum=quorum)
+
+    # The dendrite client queries the network.
+    active_uids, responses = await query_active_miners(
+        self, AllocateAssets(assets_and_pools=assets_and_pools)
     )
     allocations = {
         uid: responses[idx].allocations for idx, uid in enumerate(active_uids)
@@ -101,16 +344,120 @@ async def query_and_score_miners(
     bt.logging.debug(f"Received allocations (uid -> allocations): {allocations}")
 
     # Adjust the scores based on responses from miners.
-    rewards, allocs = get_rewards(
+    rewards, allocs = await get_rewards_async(
         self,
         query=self.step,
         uids=active_uids,
         assets_and_pools=assets_and_pools,
         responses=responses,
+        on_scored=functools.partial(record_score_history, self, self.step),
+        on_packed=functools.partial(record_round, self, self.step, active_uids),
+    )
+
+    bt.logging.info(f"Scored responses: {rewards}")
+
+    self.update_scores(rewards, active_uids)
+    bt.logging.debug(f"allocs:\n{allocs}")
+    return allocs
+
+
+async def query_and_score_scenarios(
+    self, scenarios: typing.List[typing.Dict]
+) -> typing.List[typing.Dict[int, AllocInfo]]:
+    """
+    Batched counterpart of ``query_and_score_miners``: every miner gets all ``scenarios`` in one
+    request, and is rewarded by its mean reward over them. Returns the allocs of every scenario.
+    """
+    active_uids, responses = await query_active_miners(
+        self, AllocateAssetsBatch(scenarios=scenarios)
+    )
+
+    bt.logging.debug(f"Scenarios: {scenarios}")
+    bt.logging.debug(
+        "Received allocations (uid -> allocations): "
+        f"{ {uid: response.allocations for uid, response in zip(active_uids, responses)} }"
+    )
+
+    rewards, allocs = await get_rewards_scenarios(
+        self,
+        query=self.step,
+        uids=active_uids,
+        scenarios=scenarios,
+        responses=responses,
+        on_scored=functools.partial(record_score_history, self, self.step),
     )
 
     bt.logging.info(f"Scored responses: {rewards}")
 
     self.update_scores(rewards, active_uids)
+    return allocs
+
+
+async def query_active_miners(
+    self, synapse: bt.Synapse
+) -> typing.Tuple[typing.List[int], typing.List[bt.Synapse]]:
+    """Queries every serving miner, returns their uids and responses."""
+    active_uids = get_active_uids(self)
+
+    bt.logging.debug(f"active_uids: {active_uids}")
+    queried_uids, skipped_uids = split_dead_uids(self, active_uids)
+
+    responses = await query_multiple_miners(self, synapse, queried_uids)
+    # the latency profiles are of single scenarios, batches would skew them
+    if not isinstance(synapse, AllocateAssetsBatch):
+        record_latencies(self, queried_uids, responses)
+
+    # dead axons which aren't due for a probe are scored as if they didn't respond at all
+    return (
+        queried_uids + skipped_uids,
+        list(responses) + [synapse] * len(skipped_uids),
+    )
+
+
+def score_responses(
+    self,
+    step: int,
+    uids: typing.List[int],
+    assets_and_pools: typing.Dict,
+    responses: typing.List[bt.Synapse],
+) -> typing.Dict[int, AllocInfo]:
+    rewards, allocs = get_rewards_batched(
+        self,
+        query=step,
+        uids=uids,
+        assets_and_pools=assets_and_pools,
+        responses=responses,
+        on_scored=functools.partial(record_score_history, self, step),
+        on_packed=functools.partial(record_round, self, step, uids),
+    )
+
+    bt.logging.info(f"Scored responses: {rewards}")
+
+    self.update_scores(rewards, uids)
     bt.logging.debug(f"allocs:\n{allocs}")
     return allocs
+
+
+async def query_and_pipeline_scoring(self, assets_and_pools: typing.Dict):
+    """
+    Pipelined counterpart of ``query_and_score_miners`` for synthetic rounds: only the queries are
+    sent out here, scoring the responses and updating the scores is queued on ``self.pipeline``.
+    """
+    round_timings = self.pipeline.current_round or self.pipeline.start_round(self.step)
+    start_time = time.monotonic()
+    active_uids, responses = await query_active_miners(
+        self, AllocateAssets(assets_and_pools=assets_and_pools)
+    )
+    round_timings["query"] = time.monotonic() - start_time
+
+    bt.logging.debug(f"Pools: {assets_and_pools['pools']}")
+    self.pipeline.submit(
+        "score",
+        score_responses,
+        self,
+        self.step,
+        active_uids,
+        assets_and_pools,
+        responses,
+        round_timings=round_timings,
+    )
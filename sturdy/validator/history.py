@@ -0,0 +1,250 @@
+import json
+import os
+import queue
+import re
+import threading
+from typing import Iterator, List, Optional, Sequence
+
+import bittensor as bt
+import numpy as np
+
+# one row per miner per scored round - 37 bytes, so a million rows take up ~37 MB
+RECORD_DTYPE = np.dtype(
+    [
+        ("round", "<i8"),
+        ("block", "<i8"),
+        ("uid", "<i4"),
+        ("reward", "<f4"),
+        ("apy", "<f8"),
+        ("latency", "<f4"),
+        ("cheating", "?"),
+    ]
+)
+
+SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "KB": 1000,
+    "MB": 1000**2,
+    "GB": 1000**3,
+    "TB": 1000**4,
+    "KIB": 1024,
+    "MIB": 1024**2,
+    "GIB": 1024**3,
+    "TIB": 1024**4,
+}
+
+
+def parse_size(size: str) -> Optional[int]:
+    """Parses sizes like "2 GB" or "500 MiB" (as used by ``--neuron.events_retention_size``) into bytes."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?I?B)?\s*", str(size), re.IGNORECASE)
+    if match is None:
+        return None
+    return int(float(match.group(1)) * SIZE_UNITS[(match.group(2) or "").upper()])
+
+
+def make_records(
+    round: int,
+    block: int,
+    uids: Sequence[int],
+    rewards: Sequence[float],
+    apys: Sequence[float],
+    latencies: Sequence[float],
+    cheating: Sequence[bool],
+) -> np.ndarray:
+    records = np.empty(len(uids), dtype=RECORD_DTYPE)
+    records["round"] = round
+    records["block"] = block
+    records["uid"] = uids
+    records["reward"] = rewards
+    records["apy"] = apys
+    records["latency"] = latencies
+    records["cheating"] = cheating
+    return records
+
+
+class ScoreHistoryStore:
+    """
+    Append-only history of the per-round scores of every miner.
+
+    Rows are fixed-width ``RECORD_DTYPE`` records stored in preallocated, memory-mapped segment files
+    of ``segment_rows`` rows each. ``index.json`` keeps track of the segments and how many of their
+    rows are filled. Once the segments take up more than ``retention_bytes`` the oldest ones are
+    deleted.
+
+    Records are written on a background thread, so appending them doesn't block the validator's event
+    loop. Whatever piled up while the last write ran goes to disk in a single flush.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(
+        self,
+        directory: str,
+        segment_rows: int = 2**20,
+        retention_bytes: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.retention_bytes = retention_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = []  # [{"file": str, "rows": int}], oldest first
+        self.next_segment = 0
+        index_path = os.path.join(directory, self.INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            self.segments = index["segments"]
+            self.next_segment = index["next_segment"]
+
+        self.current = None
+        if self.segments and self.segments[-1]["rows"] < self._segment_capacity(
+            self.segments[-1]
+        ):
+            self.current = self._open(self.segments[-1], mode="r+")
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="score-history", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def segment_bytes(self) -> int:
+        return self.segment_rows * RECORD_DTYPE.itemsize
+
+    def _segment_capacity(self, segment) -> int:
+        return os.path.getsize(os.path.join(self.directory, segment["file"])) // (
+            RECORD_DTYPE.itemsize
+        )
+
+    def _open(self, segment, mode: str) -> np.memmap:
+        return np.memmap(
+            os.path.join(self.directory, segment["file"]), dtype=RECORD_DTYPE, mode=mode
+        )
+
+    def _rotate(self):
+        if self.current is not None:
+            self.current.flush()
+        segment = {"file": f"segment_{self.next_segment:06d}.bin", "rows": 0}
+        self.next_segment += 1
+        self.segments.append(segment)
+        self.current = np.memmap(
+            os.path.join(self.directory, segment["file"]),
+            dtype=RECORD_DTYPE,
+            mode="w+",
+            shape=(self.segment_rows,),
+        )
+
+        # drop the oldest segments once over the retention size
+        if self.retention_bytes is not None:
+            while (
+                len(self.segments) > 1
+                and len(self.segments) * self.segment_bytes > self.retention_bytes
+            ):
+                oldest = self.segments.pop(0)
+                os.remove(os.path.join(self.directory, oldest["file"]))
+
+    def _write_index(self):
+        index_path = os.path.join(self.directory, self.INDEX_FILE)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segments": self.segments, "next_segment": self.next_segment}, f)
+        os.replace(tmp_path, index_path)
+
+    def append(self, records: np.ndarray):
+        """
+        Queues ``RECORD_DTYPE`` records to be appended, see ``make_records``. They must not be modified
+        afterwards.
+        """
+        self._queue.put(records)
+
+    def flush(self):
+        """Waits until every record appended so far is on disk."""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in batch if item is not None]
+            try:
+                if records:
+                    self.write(np.concatenate(records))
+            except Exception as e:
+                bt.logging.error(f"Failed to write the score history: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def write(self, records: np.ndarray):
+        """Appends ``RECORD_DTYPE`` records right away."""
+        with self.lock:
+            offset = 0
+            while offset < len(records):
+                if self.current is None or self.segments[-1]["rows"] >= len(
+                    self.current
+                ):
+                    self._rotate()
+                segment = self.segments[-1]
+                count = min(len(records) - offset, len(self.current) - segment["rows"])
+                self.current[segment["rows"] : segment["rows"] + count] = records[
+                    offset : offset + count
+                ]
+                segment["rows"] += count
+                offset += count
+            self.current.flush()
+            self._write_index()
+
+    def scan(self) -> Iterator[np.ndarray]:
+        """Yields read-only memory-mapped views of the filled rows of every segment, oldest first."""
+        self.flush()
+        with self.lock:
+            segments = [dict(segment) for segment in self.segments]
+        for segment in segments:
+            if segment["rows"] > 0:
+                yield self._open(segment, mode="r")[: segment["rows"]]
+
+    def read(self, uids: Optional[List[int]] = None) -> np.ndarray:
+        """All records (of ``uids`` only, if given) as a single array."""
+        chunks = []
+        for chunk in self.scan():
+            if uids is not None:
+                chunk = chunk[np.isin(chunk["uid"], uids)]
+            chunks.append(np.asarray(chunk))
+        if not chunks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(chunks)
+
+    def __len__(self) -> int:
+        self.flush()
+        with self.lock:
+            return sum(segment["rows"] for segment in self.segments)
+
+
+def open_score_history(config: "bt.Config") -> Optional[ScoreHistoryStore]:
+    """The score history of a validator, kept next to its event log unless events aren't saved."""
+    if config.neuron.dont_save_events:
+        return None
+    retention_bytes = parse_size(config.neuron.events_retention_size)
+    if retention_bytes is None:
+        bt.logging.warning(
+            f"Can't apply events retention size {config.neuron.events_retention_size} to the score history, keeping all of it."
+        )
+    return ScoreHistoryStore(
+        os.path.join(config.neuron.full_path, "score_history"),
+        retention_bytes=retention_bytes,
+    )
@@ -0,0 +1,153 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from sturdy.constants import (
+    DEAD_AXON_FAILURES,
+    LATENCY_DECAY,
+    LATENCY_EWMA_ALPHA,
+    LATENCY_TIMEOUT_MARGIN,
+    MAX_PROBE_BACKOFF,
+    MIN_QUERY_TIMEOUT,
+    QUERY_TIMEOUT,
+)
+
+# upper edges of the latency histogram buckets (seconds), log-spaced up to the query timeout
+LATENCY_BUCKETS = np.geomspace(0.01, QUERY_TIMEOUT, 48)
+
+
+class LatencyProfiles:
+    """
+    Rolling latency profile of every uid, used to give each miner its own query timeout.
+
+    Every uid has an EWMA of its response times and a decaying histogram over ``LATENCY_BUCKETS``
+    that quantiles are read from. Miners that failed to respond ``DEAD_AXON_FAILURES`` times in a
+    row are only probed every so often, with an exponential backoff of up to ``MAX_PROBE_BACKOFF``
+    rounds.
+    """
+
+    def __init__(self, n: int):
+        self.ewma = np.full(n, np.nan)
+        self.histogram = np.zeros((n, len(LATENCY_BUCKETS)))
+        self.failures = np.zeros(n, dtype=np.int64)
+        self.next_probe = np.zeros(n, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ewma)
+
+    def resize(self, n: int):
+        """Makes room for new uids, their profiles start out empty."""
+        extra = n - len(self)
+        if extra <= 0:
+            return
+        self.ewma = np.concatenate([self.ewma, np.full(extra, np.nan)])
+        self.histogram = np.concatenate(
+            [self.histogram, np.zeros((extra, len(LATENCY_BUCKETS)))]
+        )
+        self.failures = np.concatenate([self.failures, np.zeros(extra, dtype=np.int64)])
+        self.next_probe = np.concatenate(
+            [self.next_probe, np.zeros(extra, dtype=np.int64)]
+        )
+
+    def reset(self, uids: Iterable[int]):
+        """Forgets the profiles of ``uids``, e.g. because they were registered to a new hotkey."""
+        uids = list(uids)
+        self.ewma[uids] = np.nan
+        self.histogram[uids] = 0
+        self.failures[uids] = 0
+        self.next_probe[uids] = 0
+
+    def record(self, uids: Sequence[int], latencies: Sequence[Optional[float]], step: int):
+        """
+        Records the outcome of querying ``uids`` during round ``step``. A latency of None means the
+        miner didn't (successfully) respond.
+        """
+        uids = np.asarray(uids, dtype=np.int64)
+        latencies = np.array(
+            [np.nan if latency is None else latency for latency in latencies],
+            dtype=np.float64,
+        )
+        responded = ~np.isnan(latencies)
+
+        ok_uids, ok_latencies = uids[responded], latencies[responded]
+        self.ewma[ok_uids] = np.where(
+            np.isnan(self.ewma[ok_uids]),
+            ok_latencies,
+            (1 - LATENCY_EWMA_ALPHA) * self.ewma[ok_uids]
+            + LATENCY_EWMA_ALPHA * ok_latencies,
+        )
+        self.histogram[ok_uids] *= LATENCY_DECAY
+        buckets = np.minimum(
+            np.searchsorted(LATENCY_BUCKETS, ok_latencies), len(LATENCY_BUCKETS) - 1
+        )
+        self.histogram[ok_uids, buckets] += 1
+        self.failures[ok_uids] = 0
+        self.next_probe[ok_uids] = 0
+
+        failed_uids = uids[~responded]
+        self.failures[failed_uids] += 1
+        backoff = np.minimum(
+            2.0 ** (self.failures[failed_uids] - DEAD_AXON_FAILURES), MAX_PROBE_BACKOFF
+        ).astype(np.int64)
+        self.next_probe[failed_uids] = np.where(
+            self.failures[failed_uids] >= DEAD_AXON_FAILURES, step + backoff, 0
+        )
+
+    def quantile(self, uid: int, q: float) -> float:
+        """Estimated ``q`` quantile of the response time of ``uid``, nan if it never responded."""
+        cumulative = np.cumsum(self.histogram[uid])
+        if cumulative[-1] == 0:
+            return np.nan
+        bucket = np.searchsorted(cumulative, q * cumulative[-1])
+        return float(LATENCY_BUCKETS[min(bucket, len(LATENCY_BUCKETS) - 1)])
+
+    def timeout(self, uid: int) -> float:
+        """Query timeout for ``uid``: a margin above its p99 response time, within the global bounds."""
+        p99 = self.quantile(uid, 0.99)
+        if np.isnan(p99):
+            return QUERY_TIMEOUT
+        return float(
+            np.clip(p99 * LATENCY_TIMEOUT_MARGIN, MIN_QUERY_TIMEOUT, QUERY_TIMEOUT)
+        )
+
+    def should_query(self, uids: Sequence[int], step: int) -> np.ndarray:
+        """Which of ``uids`` are due to be queried in round ``step`` - dead axons are only probed now and then."""
+        return self.next_probe[np.asarray(uids, dtype=np.int64)] <= step
+
+    def summary(self, uids: Optional[List[int]] = None) -> Dict[int, Dict]:
+        """Per-uid view of the profiles for inspection."""
+        if uids is None:
+            uids = range(len(self))
+
+        def optional(value: float) -> Optional[float]:
+            return None if np.isnan(value) else float(value)
+
+        return {
+            int(uid): {
+                "ewma": optional(self.ewma[uid]),
+                "p50": optional(self.quantile(uid, 0.5)),
+                "p99": optional(self.quantile(uid, 0.99)),
+                "timeout": self.timeout(uid),
+                "failures": int(self.failures[uid]),
+                "next_probe": int(self.next_probe[uid]),
+            }
+            for uid in uids
+        }
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        """The profiles as tensors, to be saved alongside the rest of the validator state."""
+        return {
+            "ewma": torch.from_numpy(self.ewma.copy()),
+            "histogram": torch.from_numpy(self.histogram.copy()),
+            "failures": torch.from_numpy(self.failures.copy()),
+            "next_probe": torch.from_numpy(self.next_probe.copy()),
+        }
+
+    def load_state_dict(self, state: Dict[str, torch.Tensor]):
+        n = len(self)
+        self.ewma = state["ewma"].numpy().astype(np.float64)
+        self.histogram = state["histogram"].numpy().astype(np.float64)
+        self.failures = state["failures"].numpy().astype(np.int64)
+        self.next_probe = state["next_probe"].numpy().astype(np.int64)
+        self.resize(n)
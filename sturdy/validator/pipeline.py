@@ -0,0 +1,76 @@
+import time
+import concurrent.futures
+from collections import deque
+from traceback import print_exception
+from typing import Callable, Dict, Optional
+
+import bittensor as bt
+
+
+class ScoringPipeline:
+    """
+    Runs the scoring and chain sync stages of forward rounds on a single background worker, so the
+    next round's queries can go out while the previous round is still being scored, its weights set
+    and its state saved. Stages run one at a time in the order they were submitted, which keeps the
+    updates to the scores in order.
+
+    Every round gets a dict of stage timings (seconds), see ``self.timings``: ``query`` for the
+    queries, and ``<stage>`` / ``<stage>_wait`` for how long a background stage ran and how long it
+    sat in the queue.
+    """
+
+    def __init__(self, max_pending: int = 2, history: int = 128):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="scoring_pipeline"
+        )
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.timings = deque(maxlen=history)
+
+    @property
+    def current_round(self) -> Optional[Dict]:
+        return self.timings[-1] if self.timings else None
+
+    def start_round(self, step: int) -> Dict:
+        round_timings = {"step": step}
+        self.timings.append(round_timings)
+        return round_timings
+
+    def submit(
+        self, stage: str, func: Callable, *args, round_timings: Optional[Dict] = None
+    ) -> concurrent.futures.Future:
+        """Queues ``func(*args)`` behind the stages submitted so far, timing it in ``round_timings``."""
+        if round_timings is None:
+            round_timings = self.current_round or self.start_round(-1)
+        queued = time.monotonic()
+
+        def run_stage():
+            start_time = time.monotonic()
+            round_timings[f"{stage}_wait"] = start_time - queued
+            try:
+                return func(*args)
+            except Exception as err:
+                bt.logging.error(f"Error in pipeline stage {stage}: {err}")
+                bt.logging.debug(print_exception(type(err), err, err.__traceback__))
+            finally:
+                round_timings[stage] = time.monotonic() - start_time
+
+        future = self.executor.submit(run_stage)
+        self.pending.append(future)
+        return future
+
+    def wait_for_capacity(self):
+        """Blocks until at most ``max_pending`` stages are waiting on the worker (backpressure)."""
+        while self.pending and self.pending[0].done():
+            self.pending.popleft()
+        while len(self.pending) > self.max_pending:
+            self.pending.popleft().result()
+
+    def drain(self):
+        """Waits for every stage submitted so far."""
+        while self.pending:
+            self.pending.popleft().result()
+
+    def shutdown(self):
+        self.drain()
+        self.executor.shutdown(wait=True)
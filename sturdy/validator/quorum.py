@@ -0,0 +1,55 @@
+import math
+from collections import deque
+from typing import Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+class QuorumPolicy(NamedTuple):
+    """
+    When an organic request may be answered without waiting for every miner.
+
+    Attributes:
+    - top_k: answer as soon as this many valid responses came in (0 disables it).
+    - percent: answer as soon as this percentage of the queried miners sent a valid response - errors,
+      timeouts and invalid allocations don't count. Must be above 0.
+    - grace_period: how many seconds to keep collecting responses after the quorum was reached.
+    """
+
+    top_k: int = 0
+    percent: float = 100.0
+    grace_period: float = 0.0
+
+    @classmethod
+    def from_config(cls, config) -> Optional["QuorumPolicy"]:
+        """Returns the policy configured through ``--quorum.*``, or None if it never cuts a request short."""
+        policy = cls(
+            config.quorum.top_k, config.quorum.percent, config.quorum.grace_period
+        )
+        if policy.percent <= 0:
+            raise ValueError(f"--quorum.percent must be above 0, got {policy.percent}")
+        if policy.top_k <= 0 and policy.percent >= 100:
+            return None
+        return policy
+
+    def reached(self, num_valid: int, num_queried: int) -> bool:
+        if self.top_k > 0 and num_valid >= min(self.top_k, num_queried):
+            return True
+        return num_valid >= math.ceil(num_queried * self.percent / 100)
+
+
+class LatencyTracker:
+    """Keeps the latencies of the most recent requests around to report percentiles over."""
+
+    def __init__(self, window: int = 1024):
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def percentiles(self, qs: Sequence[float] = (50, 99)) -> Dict[str, float]:
+        summary = {"count": len(self.latencies)}
+        if not self.latencies:
+            return {**summary, **{f"p{q}": None for q in qs}}
+        values = np.percentile(np.fromiter(self.latencies, dtype=np.float64), qs)
+        return {**summary, **{f"p{q}": float(v) for q, v in zip(qs, values)}}
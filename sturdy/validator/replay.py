@@ -0,0 +1,294 @@
+import os
+import re
+import glob
+import json
+import queue
+import functools
+import itertools
+import threading
+import multiprocessing
+import concurrent.futures
+from typing import List, NamedTuple, Optional, Tuple
+
+import bittensor as bt
+import numpy as np
+
+from sturdy.constants import DIV_FACTOR, STEEPNESS
+from sturdy.utils.rates import KINKED, POOL_FIELDS, PoolArrays, model_groups
+from sturdy.validator.reward import score_allocations
+
+
+class ReplayParams(NamedTuple):
+    """The reward and scoring parameters rounds are replayed with - the defaults are the live ones."""
+
+    steepness: float = STEEPNESS
+    div_factor: float = DIV_FACTOR
+    latency_weight: float = 0.2
+    apy_weight: float = 0.8
+    alpha: float = 0.1  # see --neuron.moving_average_alpha
+
+    @classmethod
+    def from_config(cls, config: "bt.config") -> "ReplayParams":
+        """The parameters a validator with ``config`` scores with."""
+        return cls(alpha=config.neuron.moving_average_alpha)
+
+
+class ReplayResult(NamedTuple):
+    """
+    Attributes:
+    - steps: the step of every replayed round, shape (n_rounds,).
+    - scores: moving average scores after the last round, shape (n_uids,).
+    - weights: the (l1 normalized) weight vector after every round, shape (n_rounds, n_uids).
+    """
+
+    steps: np.ndarray
+    scores: np.ndarray
+    weights: np.ndarray
+
+
+# fields at the start of a recorded round, followed by the per-miner and per-pool arrays
+ROUND_HEADER = ("step", "n_miners", "n_pools", "total_assets", "num_pools")
+
+# the live parameters of the validator that recorded the rounds, next to them
+PARAMS_FILE = "params.json"
+
+
+def next_sequence(directory: str) -> int:
+    """The sequence number after the last round recorded to ``directory``."""
+    sequences = [
+        int(match.group(1))
+        for match in map(
+            re.compile(r"round_(\d+)\.bin$").search, round_paths(directory)
+        )
+        if match is not None
+    ]
+    return max(sequences, default=-1) + 1
+
+
+def load_params(directory: str) -> ReplayParams:
+    """The live parameters the rounds in ``directory`` were recorded with, the defaults if unknown."""
+    path = os.path.join(directory, PARAMS_FILE)
+    if not os.path.exists(path):
+        return ReplayParams()
+    with open(path) as f:
+        return ReplayParams(**json.load(f))
+
+
+class RoundRecorder:
+    """
+    Records the packed responses of every scored round (see ``pack_scoring_args``) to
+    ``<directory>/round_<sequence>.bin``, so they can be replayed with other parameters later. The
+    step is stored in the round itself: the sequence number only goes up, while concurrent forwards
+    and organic queries score rounds of the same step. Rounds are written on a background thread,
+    in the order they were recorded, along with the live ``params`` (see ``load_params``).
+
+    A round is stored as two consecutive ``.npy`` arrays, which are a lot quicker to load than an
+    ``.npz`` archive: all the numbers in a single float64 array (``ROUND_HEADER``, then the uids,
+    axon times, answered and invalid flags, the allocation matrix and the pool parameters) and the
+    pool ids. Rounds with pools following other rate models than the kinked one get a third array,
+    the JSON of those pools' dicts.
+    """
+
+    def __init__(self, directory: str, params: ReplayParams = ReplayParams()):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, PARAMS_FILE), "w") as f:
+            json.dump(params._asdict(), f)
+
+        self._sequence = itertools.count(next_sequence(directory))
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="round-recorder", daemon=True
+        )
+        self._thread.start()
+
+    def record(self, step: int, uids: List[int], scoring_args: Tuple):
+        """Queues a round to be written. The arrays must not be modified afterwards."""
+        self._queue.put((next(self._sequence), step, list(uids), scoring_args))
+
+    def flush(self):
+        """Waits until every round recorded so far is on disk."""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self.write(*item)
+            except Exception as e:
+                bt.logging.error(f"Failed to record round {item[1]}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def write(self, sequence: int, step: int, uids: List[int], scoring_args: Tuple):
+        (
+            allocations,
+            pools,
+            total_assets,
+            axon_times,
+            answered,
+            invalid,
+            num_pools,
+        ) = scoring_args
+        n_miners, n_pools = allocations.shape
+        data = np.concatenate(
+            [
+                [step, n_miners, n_pools, total_assets, num_pools],
+                np.asarray(uids, dtype=np.float64),
+                axon_times,
+                answered,
+                invalid,
+                allocations.ravel(),
+                *(getattr(pools, field) for field in POOL_FIELDS),
+            ]
+        ).astype(np.float64)
+
+        path = os.path.join(self.directory, f"round_{sequence:010d}.bin")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, data)
+            np.save(f, np.asarray(pools.pool_ids, dtype=str))
+            if pools.models:
+                model_pools = {
+                    pools.pool_ids[column]: pool
+                    for group in pools.models
+                    for column, pool in zip(group.columns, group.pools)
+                }
+                np.save(f, np.asarray(json.dumps(model_pools)))
+        os.replace(tmp_path, path)
+
+
+def round_paths(directory: str) -> List[str]:
+    """The recorded rounds in ``directory``, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, "round_*.bin")))
+
+
+def load_round(path: str) -> Tuple[int, np.ndarray, Tuple]:
+    """Loads a round written by ``RoundRecorder``: its step, uids and ``score_allocations`` args."""
+    with open(path, "rb") as f:
+        data = np.load(f)
+        pool_ids = np.load(f).tolist()
+        model_pools = json.loads(str(np.load(f))) if f.peek(1) else {}
+
+    step, n_miners, n_pools, total_assets, num_pools = data[: len(ROUND_HEADER)]
+    n_miners, n_pools = int(n_miners), int(n_pools)
+    offset = len(ROUND_HEADER)
+
+    def take(size: int) -> np.ndarray:
+        nonlocal offset
+        offset += size
+        return data[offset - size : offset]
+
+    uids = take(n_miners).astype(np.int64)
+    axon_times = take(n_miners)
+    answered = take(n_miners).astype(bool)
+    invalid = take(n_miners).astype(bool)
+    allocations = take(n_miners * n_pools).reshape(n_miners, n_pools)
+    pools = PoolArrays(
+        pool_ids,
+        *(take(n_pools) for _ in POOL_FIELDS),
+        models=model_groups(
+            [model_pools.get(pool_id, {"model": KINKED}) for pool_id in pool_ids]
+        ),
+    )
+    scoring_args = (
+        allocations,
+        pools,
+        float(total_assets),
+        axon_times,
+        answered,
+        invalid,
+        int(num_pools),
+    )
+    return int(step), uids, scoring_args
+
+
+def score_round(path: str, params: ReplayParams) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Re-scores a recorded round, returning its step, uids and rewards."""
+    step, uids, scoring_args = load_round(path)
+    scored = score_allocations(
+        *scoring_args,
+        steepness=params.steepness,
+        div_factor=params.div_factor,
+        latency_weight=params.latency_weight,
+        apy_weight=params.apy_weight,
+    )
+    return step, uids, scored.rewards
+
+
+def replay(
+    paths: List[str],
+    params: ReplayParams = ReplayParams(),
+    n_uids: Optional[int] = None,
+    initial_scores: Optional[np.ndarray] = None,
+    workers: int = 0,
+    chunksize: int = 64,
+) -> ReplayResult:
+    """
+    Replays recorded rounds: every round is re-scored (on ``workers`` processes, if > 0) and the
+    moving average scores are then updated round by round, like ``update_scores`` does live.
+    """
+    score = functools.partial(score_round, params=params)
+    if workers > 0:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            rounds = list(executor.map(score, paths, chunksize=chunksize))
+    else:
+        rounds = list(map(score, paths))
+
+    if n_uids is None:
+        n_uids = max(
+            (int(uids.max(initial=-1)) + 1 for _, uids, _ in rounds), default=0
+        )
+        if initial_scores is not None:
+            n_uids = max(n_uids, len(initial_scores))
+    scores = np.zeros(n_uids)
+    if initial_scores is not None:
+        scores[: len(initial_scores)] = initial_scores
+
+    steps = np.empty(len(rounds), dtype=np.int64)
+    weights = np.empty((len(rounds), n_uids))
+    for idx, (step, uids, rewards) in enumerate(rounds):
+        scattered = scores.copy()
+        scattered[uids] = np.nan_to_num(rewards, nan=0.0)
+        scores = params.alpha * scattered + (1 - params.alpha) * scores
+        steps[idx] = step
+        # same as torch.nn.functional.normalize(scores, p=1, dim=0) in set_weights
+        weights[idx] = scores / max(np.abs(scores).sum(), 1e-12)
+
+    return ReplayResult(steps, scores, weights)
+
+
+def ranks(weights: np.ndarray) -> np.ndarray:
+    """Rank of every uid by weight, 0 being the highest weight."""
+    order = np.argsort(-weights, kind="stable")
+    ranking = np.empty(len(weights), dtype=np.int64)
+    ranking[order] = np.arange(len(weights))
+    return ranking
+
+
+def compare(
+    paths: List[str],
+    params: ReplayParams,
+    baseline: ReplayParams = ReplayParams(),
+    **kwargs,
+) -> Tuple[ReplayResult, ReplayResult, np.ndarray]:
+    """
+    Replays ``paths`` with both the ``baseline`` and the given parameters. Returns both results
+    along with how many places every uid moved up (positive) or down in the final ranking.
+    """
+    baseline_result = replay(paths, baseline, **kwargs)
+    kwargs["n_uids"] = len(baseline_result.scores)
+    result = replay(paths, params, **kwargs)
+    if len(paths) == 0:
+        return baseline_result, result, np.zeros(0, dtype=np.int64)
+    rank_changes = ranks(baseline_result.weights[-1]) - ranks(result.weights[-1])
+    return baseline_result, result, rank_changes
@@ -18,14 +18,23 @@
 
 import sys
 import math
+import asyncio
+import logging
 
 import bittensor as bt
+import numpy as np
 import torch
-from typing import List, Dict, Tuple, TypedDict
-from decimal import Decimal
-
-from sturdy.constants import QUERY_TIMEOUT, STEEPNESS, DIV_FACTOR, NUM_POOLS
+from typing import Callable, List, Dict, NamedTuple, Optional, Tuple, TypedDict
+from fractions import Fraction
+
+from sturdy.constants import (
+    QUERY_TIMEOUT,
+    STEEPNESS,
+    DIV_FACTOR,
+    NUM_POOLS,
+)
 from sturdy.utils.misc import calculate_apy
+from sturdy.utils.rates import PoolArrays, pool_rates
 from sturdy.protocol import AllocInfo
 
 
@@ -59,14 +68,34 @@ def get_response_times(uids: List[int], responses, timeout: float):
     return axon_times
 
 
+def sigmoid_offset(
+    num_pools: int = NUM_POOLS,
+    steepness: float = STEEPNESS,
+    div_factor: float = DIV_FACTOR,
+    timeout: float = QUERY_TIMEOUT,
+    max_midpoint: Optional[float] = None,
+) -> float:
+    """
+    Offset of the latency reward curve, which is centered later the more pools there are to
+    allocate over. With ``max_midpoint`` (e.g. ``MAX_LATENCY_MIDPOINT``) the center is kept within
+    that fraction of the timeout - past it, every response in time would get close to the full
+    latency reward. Live rounds don't cap it, so they score the same on every validator version.
+    """
+    offset = float(num_pools) / div_factor
+    if max_midpoint is not None:
+        offset = min(offset, steepness * max_midpoint * timeout)
+    return -offset
+
+
 def sigmoid_scale(
     axon_time: float,
     num_pools: int = NUM_POOLS,
     steepness: float = STEEPNESS,
     div_factor: float = DIV_FACTOR,
     timeout: float = QUERY_TIMEOUT,
+    max_midpoint: Optional[float] = None,
 ) -> float:
-    offset = -float(num_pools) / div_factor
+    offset = sigmoid_offset(num_pools, steepness, div_factor, timeout, max_midpoint)
     return (
         (1 / (1 + math.exp(steepness * axon_time + offset)))
         if axon_time < timeout
@@ -74,6 +103,21 @@ def sigmoid_scale(
     )
 
 
+def sigmoid_scale_batch(
+    axon_times: np.ndarray,
+    num_pools: int = NUM_POOLS,
+    steepness: float = STEEPNESS,
+    div_factor: float = DIV_FACTOR,
+    timeout: float = QUERY_TIMEOUT,
+    max_midpoint: Optional[float] = None,
+) -> np.ndarray:
+    """Vectorized version of ``sigmoid_scale`` over an array of axon times."""
+    offset = sigmoid_offset(num_pools, steepness, div_factor, timeout, max_midpoint)
+    with np.errstate(over="ignore"):
+        scaled = 1 / (1 + np.exp(steepness * axon_times + offset))
+    return np.where(axon_times < timeout, scaled, 0.0)
+
+
 def reward(
     query: int,
     max_apy: float,
@@ -126,14 +170,13 @@ def get_rewards(
             continue
 
         initial_balance = assets_and_pools["total_assets"]
-        total_allocated = Decimal(0)
+        total_allocated = Fraction(0)
         cheating = False
 
         for pool_id, allocation in allocations.items():
             pool = assets_and_pools["pools"][pool_id]
-            total_allocated += Decimal(
-                str(allocation)
-            )  # This should fix precision issues with python floats
+            # summed exactly, floats convert to fractions without rounding
+            total_allocated += Fraction(allocation)
 
             # score response very low if miner is cheating somehow
             if total_allocated > initial_balance or allocation < pool["borrow_amount"]:
@@ -204,3 +247,479 @@ def get_rewards(
         ).to(self.device),
         allocs,
     )
+
+
+class ScoredResponses(NamedTuple):
+    """
+    Per-miner results of ``score_allocations``, all arrays of shape (n_miners,).
+
+    Attributes:
+    - rewards: The reward of each miner.
+    - apys: The apy of each miner's allocations - ``sys.float_info.min`` if it didn't answer or cheated.
+    - cheating: Whether the miner's allocations were caught cheating.
+    """
+
+    rewards: np.ndarray
+    apys: np.ndarray
+    cheating: np.ndarray
+
+
+def pack_responses(
+    pool_ids: List[str], responses: List
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Packs the allocations of miner responses into an (n_miners x n_pools) matrix.
+
+    Args:
+    - pool_ids (List[str]): The ids of the pools, in the column order of the matrix.
+    - responses (List): The responses of the miners.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray, np.ndarray]: The allocation matrix (nan where a miner didn't
+      allocate to a pool), whether each miner answered with allocations, and whether each miner
+      sent invalid allocations (to pools that don't exist, or amounts that aren't finite).
+    """
+    pool_index = {pool_id: idx for idx, pool_id in enumerate(pool_ids)}
+    missing = [np.nan] * len(pool_ids)
+    rows = []
+    answered = np.zeros(len(responses), dtype=bool)
+    invalid = np.zeros(len(responses), dtype=bool)
+
+    for response_idx, response in enumerate(responses):
+        allocations = response.allocations
+        if allocations is None:
+            rows.append(missing)
+            continue
+        answered[response_idx] = True
+        # miners usually answer with the pools in the order they were sent
+        if list(allocations) == pool_ids:
+            rows.append(list(allocations.values()))
+            continue
+        row = list(missing)
+        for pool_id, allocation in allocations.items():
+            pool_idx = pool_index.get(pool_id)
+            if pool_idx is None:
+                invalid[response_idx] = True
+                continue
+            row[pool_idx] = allocation
+        rows.append(row)
+
+    allocations = np.array(rows, dtype=np.float64).reshape(
+        len(responses), len(pool_ids)
+    )
+    invalid |= np.any(np.isinf(allocations), axis=1)
+
+    return allocations, answered, invalid
+
+
+def pack_response_times(responses: List, timeout: float) -> np.ndarray:
+    """Array version of ``get_response_times``, in the order of ``responses``."""
+    return np.array(
+        [
+            (
+                response.dendrite.process_time
+                if response.dendrite.process_time is not None
+                else timeout
+            )
+            for response in responses
+        ],
+        dtype=np.float64,
+    )
+
+
+def over_allocated(
+    allocations: np.ndarray, present: np.ndarray, total_assets: float
+) -> np.ndarray:
+    """
+    Whether each row of a packed allocation matrix adds up to more than ``total_assets``, summing
+    the allocations exactly like ``get_rewards`` does. Rows whose float sum is clearly on one side
+    of ``total_assets`` are decided by it, only the ones too close to call are summed exactly.
+    """
+    amounts = np.where(present, allocations, 0.0)
+    sums = np.sum(amounts, axis=1)
+    # bounds the float summation error
+    tolerance = (
+        4
+        * (amounts.shape[1] + 1)
+        * np.finfo(np.float64).eps
+        * np.maximum(np.sum(np.abs(amounts), axis=1), abs(total_assets))
+    )
+    over = sums > total_assets + tolerance
+    for idx in np.flatnonzero(np.abs(sums - total_assets) <= tolerance):
+        exact = sum(map(Fraction, amounts[idx][present[idx]].tolist()))
+        over[idx] = exact > Fraction(total_assets)
+    return over
+
+
+def allocation_apys(
+    allocations: np.ndarray,
+    pools: PoolArrays,
+    total_assets: float,
+    answered: np.ndarray,
+    invalid: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Validates a packed (n_miners x n_pools) allocation matrix - see ``pack_responses`` - and returns
+    the apy of every miner (``sys.float_info.min`` if it didn't answer or cheated) along with whether
+    it was caught cheating.
+    """
+    present = ~np.isnan(allocations)
+
+    # score response very low if miner is cheating somehow
+    cheating = answered & (
+        invalid
+        | np.any(present & (allocations < pools.borrow_amount), axis=1)
+        | over_allocated(allocations, present, total_assets)
+    )
+
+    # calculate yield for given pool allocations
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yields = np.sum(
+            np.where(present, allocations * pool_rates(allocations, pools), 0.0),
+            axis=1,
+        )
+
+    valid = answered & ~cheating
+    return np.where(valid, yields / total_assets, sys.float_info.min), cheating
+
+
+def combine_rewards(
+    apys: np.ndarray,
+    max_apy: float,
+    axon_times: np.ndarray,
+    num_pools: int,
+    steepness: float = STEEPNESS,
+    div_factor: float = DIV_FACTOR,
+    latency_weight: float = 0.2,
+    apy_weight: float = 0.8,
+) -> np.ndarray:
+    """Vectorized version of ``reward`` over all miners."""
+    latency_scores = sigmoid_scale_batch(
+        axon_times, num_pools=num_pools, steepness=steepness, div_factor=div_factor
+    )
+    return (latency_weight * latency_scores) + (apy_weight * apys / max_apy)
+
+
+def score_allocations(
+    allocations: np.ndarray,
+    pools: PoolArrays,
+    total_assets: float,
+    axon_times: np.ndarray,
+    answered: np.ndarray,
+    invalid: np.ndarray,
+    num_pools: int = NUM_POOLS,
+    steepness: float = STEEPNESS,
+    div_factor: float = DIV_FACTOR,
+    latency_weight: float = 0.2,
+    apy_weight: float = 0.8,
+) -> ScoredResponses:
+    """
+    Scores a packed (n_miners x n_pools) allocation matrix - see ``pack_responses``. This is the
+    vectorized counterpart of the per-response loop in ``get_rewards``, and only deals with numpy
+    arrays so it can run anywhere. The reward parameters can be changed for replaying rounds, see
+    ``sturdy.validator.replay``.
+    """
+    apys, cheating = allocation_apys(
+        allocations, pools, total_assets, answered, invalid
+    )
+    # maximum yield to scale all rewards by
+    max_apy = max(sys.float_info.min, float(np.max(apys, initial=0.0)))
+
+    rewards = combine_rewards(
+        apys,
+        max_apy,
+        axon_times,
+        num_pools,
+        steepness,
+        div_factor,
+        latency_weight,
+        apy_weight,
+    )
+    return ScoredResponses(rewards, apys, cheating)
+
+
+def pack_scoring_args(
+    uids: List, assets_and_pools: Dict[int, Dict], responses: List
+) -> Tuple:
+    """Packs everything ``score_allocations`` needs to score ``responses`` into numpy arrays."""
+    pools = PoolArrays.from_pools(assets_and_pools["pools"])
+    allocations, answered, invalid = pack_responses(pools.pool_ids, responses)
+    axon_times = pack_response_times(responses, timeout=QUERY_TIMEOUT)
+    return (
+        allocations,
+        pools,
+        assets_and_pools["total_assets"],
+        axon_times,
+        answered,
+        invalid,
+        len(uids),
+    )
+
+
+def collect_allocs(
+    uids: List, responses: List, apys: np.ndarray, num_pools: int
+) -> Dict[int, AllocInfo]:
+    """Allocations and apys of the miners whose response covers every pool."""
+    allocs = {}
+    for idx, response in enumerate(responses):
+        if response.allocations is None:
+            continue
+        if len(response.allocations) == num_pools:
+            allocs[uids[idx]] = {
+                "apy": float(apys[idx]),
+                "allocations": response.allocations,
+            }
+    return allocs
+
+
+def collect_rewards(
+    self,
+    uids: List,
+    responses: List,
+    pools: PoolArrays,
+    axon_times: np.ndarray,
+    scored: ScoredResponses,
+    on_scored: Optional[Callable[[List, np.ndarray, ScoredResponses], None]] = None,
+) -> Tuple[torch.FloatTensor, Dict[int, AllocInfo]]:
+    """
+    Turns scored responses back into the rewards tensor and allocs dict ``get_rewards`` returns.
+    ``on_scored(uids, axon_times, scored)`` gets called with the raw scores first, if given.
+    """
+    if on_scored is not None:
+        on_scored(uids, axon_times, scored)
+
+    # punish if miner they're cheating
+    for miner_uid in np.asarray(uids)[scored.cheating]:
+        bt.logging.warning(
+            f"CHEATER DETECTED  - MINER WITH UID {miner_uid} - PUNISHING 👊😠"
+        )
+
+    allocs = collect_allocs(uids, responses, scored.apys, len(pools.pool_ids))
+
+    # only sort things for the logs if someone is going to read them
+    if bt.logging.get_level() <= logging.DEBUG:
+        apy_order = np.argsort(-scored.apys, kind="stable")
+        time_order = np.argsort(axon_times, kind="stable")
+        bt.logging.debug(
+            f"sorted apys: {dict(zip(np.asarray(uids)[apy_order].tolist(), scored.apys[apy_order].tolist()))}"
+        )
+        bt.logging.debug(
+            f"sorted axon times: {dict(zip(np.asarray(uids)[time_order].tolist(), axon_times[time_order].tolist()))}"
+        )
+
+    return (
+        torch.tensor(scored.rewards, dtype=torch.float32).to(self.device),
+        allocs,
+    )
+
+
+def get_rewards_batched(
+    self,
+    query: int,
+    uids: List,
+    assets_and_pools: Dict[int, Dict],
+    responses: List,
+    on_scored: Optional[Callable[[List, np.ndarray, ScoredResponses], None]] = None,
+    on_packed: Optional[Callable[[Tuple], None]] = None,
+) -> Tuple[torch.FloatTensor, Dict[int, AllocInfo]]:
+    """
+    Batched version of ``get_rewards``: packs all responses into an (n_miners x n_pools) array and
+    scores them with a handful of vectorized operations instead of looping over every response and
+    every pool.
+
+    Args:
+    - query (int): The query sent to the miner.
+    - responses (List[float]): A list of responses from the miner.
+
+    Returns:
+    - torch.FloatTensor: A tensor of rewards for the given query and responses.
+
+    ``on_packed(scoring_args)`` gets called with the packed arrays before they are scored, if given.
+    """
+    scoring_args = pack_scoring_args(uids, assets_and_pools, responses)
+    if on_packed is not None:
+        on_packed(scoring_args)
+    scored = score_allocations(*scoring_args)
+    return collect_rewards(
+        self, uids, responses, scoring_args[1], scoring_args[3], scored, on_scored
+    )
+
+
+async def get_rewards_async(
+    self,
+    query: int,
+    uids: List,
+    assets_and_pools: Dict[int, Dict],
+    responses: List,
+    on_scored: Optional[Callable[[List, np.ndarray, ScoredResponses], None]] = None,
+    on_packed: Optional[Callable[[Tuple], None]] = None,
+) -> Tuple[torch.FloatTensor, Dict[int, AllocInfo]]:
+    """
+    Same as ``get_rewards_batched``, but if the validator has a scoring executor (see
+    ``--neuron.scoring_workers``) the packed arrays are shipped to it, so the event loop keeps
+    serving queries while the scoring runs.
+    """
+    scoring_args = pack_scoring_args(uids, assets_and_pools, responses)
+    if on_packed is not None:
+        on_packed(scoring_args)
+    executor = getattr(self, "scoring_executor", None)
+    if executor is None:
+        scored = score_allocations(*scoring_args)
+    else:
+        scored = await asyncio.get_running_loop().run_in_executor(
+            executor, score_allocations, *scoring_args
+        )
+    return collect_rewards(
+        self, uids, responses, scoring_args[1], scoring_args[3], scored, on_scored
+    )
+
+
+def score_scenarios(scenario_args: List[Tuple]) -> List[ScoredResponses]:
+    """``score_allocations`` for every scenario of a batched query, given their ``pack_scoring_args``."""
+    return [score_allocations(*args) for args in scenario_args]
+
+
+def aggregate_scores(scored: List[ScoredResponses]) -> ScoredResponses:
+    """
+    Per-miner results over all scenarios of a batched query: the mean reward and apy, and whether
+    the miner was caught cheating in any of them.
+    """
+    return ScoredResponses(
+        np.mean([s.rewards for s in scored], axis=0),
+        np.mean([s.apys for s in scored], axis=0),
+        np.any([s.cheating for s in scored], axis=0),
+    )
+
+
+async def get_rewards_scenarios(
+    self,
+    query: int,
+    uids: List,
+    scenarios: List[Dict],
+    responses: List,
+    on_scored: Optional[Callable[[List, np.ndarray, ScoredResponses], None]] = None,
+) -> Tuple[torch.FloatTensor, List[Dict[int, AllocInfo]]]:
+    """
+    Scores the responses to a batched query (see ``sturdy.protocol.AllocateAssetsBatch``): every
+    scenario is scored on its own, like ``get_rewards_async`` would, and every miner is rewarded by
+    its mean reward over them.
+
+    Returns:
+    - torch.FloatTensor: The aggregated rewards of the miners.
+    - List[Dict[int, AllocInfo]]: The allocs of every scenario.
+    """
+    split_responses = [response.split(scenarios) for response in responses]
+    scenario_responses = [
+        [split[idx] for split in split_responses] for idx in range(len(scenarios))
+    ]
+    scenario_args = [
+        pack_scoring_args(uids, assets_and_pools, responses)
+        for assets_and_pools, responses in zip(scenarios, scenario_responses)
+    ]
+    executor = getattr(self, "scoring_executor", None)
+    if executor is None:
+        scored = score_scenarios(scenario_args)
+    else:
+        scored = await asyncio.get_running_loop().run_in_executor(
+            executor, score_scenarios, scenario_args
+        )
+
+    # the response times are the same in every scenario, the allocs are collected for each below
+    rewards, _ = collect_rewards(
+        self,
+        uids,
+        [],
+        scenario_args[0][1],
+        scenario_args[0][3],
+        aggregate_scores(scored),
+        on_scored,
+    )
+    allocs = [
+        collect_allocs(uids, responses, scenario.apys, len(args[1].pool_ids))
+        for responses, scenario, args in zip(scenario_responses, scored, scenario_args)
+    ]
+    return rewards, allocs
+
+
+class StreamingScorer:
+    """
+    Validates and scores miner responses one at a time as they come in, keeping track of the best
+    apy seen so far. Once the responses are in (or the deadline passes) ``get_rewards`` only has to
+    renormalize the apys by the final maximum.
+    """
+
+    def __init__(self, assets_and_pools: Dict, timeout: float = QUERY_TIMEOUT):
+        self.pools = PoolArrays.from_pools(assets_and_pools["pools"])
+        self.total_assets = assets_and_pools["total_assets"]
+        self.timeout = timeout
+        self.uids = []
+        self.responses = []
+        self.apys = []
+        self.cheating = []
+        self.axon_times = []
+        # packed rows of every response, see ``scoring_args``
+        self.packed = []
+        self.max_apy = sys.float_info.min
+        self.num_valid = 0
+
+    def add(self, uid: int, response) -> float:
+        """Scores the response of a single miner and returns its apy."""
+        allocations, answered, invalid = pack_responses(self.pools.pool_ids, [response])
+        apys, cheating = allocation_apys(
+            allocations, self.pools, self.total_assets, answered, invalid
+        )
+        apy = float(apys[0])
+        self.max_apy = max(self.max_apy, apy)
+
+        self.uids.append(uid)
+        self.responses.append(response)
+        self.apys.append(apy)
+        self.cheating.append(bool(cheating[0]))
+        self.packed.append((allocations, answered, invalid))
+        self.num_valid += bool(answered[0] and not cheating[0])
+        self.axon_times.append(
+            response.dendrite.process_time
+            if response.dendrite.process_time is not None
+            else self.timeout
+        )
+        return apy
+
+    def scoring_args(self) -> Tuple:
+        """``pack_scoring_args`` of the responses added so far, out of the rows packed as they came in."""
+        if self.packed:
+            allocations, answered, invalid = map(np.concatenate, zip(*self.packed))
+        else:
+            allocations = np.zeros((0, len(self.pools.pool_ids)))
+            answered = invalid = np.zeros(0, dtype=bool)
+        return (
+            allocations,
+            self.pools,
+            self.total_assets,
+            np.array(self.axon_times, dtype=np.float64),
+            answered,
+            invalid,
+            len(self.uids),
+        )
+
+    def allocs(self) -> Dict[int, AllocInfo]:
+        """Allocations of the responses added so far, without waiting for the final pass."""
+        return collect_allocs(
+            self.uids, self.responses, self.apys, len(self.pools.pool_ids)
+        )
+
+    def get_rewards(
+        self,
+        neuron,
+        on_scored: Optional[Callable[[List, np.ndarray, ScoredResponses], None]] = None,
+    ) -> Tuple[torch.FloatTensor, Dict[int, AllocInfo]]:
+        """Final pass over all responses added so far, in the order they were added (see ``self.uids``)."""
+        apys = np.array(self.apys, dtype=np.float64)
+        axon_times = np.array(self.axon_times, dtype=np.float64)
+        scored = ScoredResponses(
+            combine_rewards(apys, self.max_apy, axon_times, len(self.uids)),
+            apys,
+            np.array(self.cheating, dtype=bool),
+        )
+        return collect_rewards(
+            neuron, self.uids, self.responses, self.pools, axon_times, scored, on_scored
+        )
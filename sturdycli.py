@@ -1,7 +1,7 @@
 import uuid
 
 import typer
-from typing import Optional
+from typing import List, Optional
 from rich.console import Console
 from rich.table import Table
 from db import sql
@@ -212,5 +212,116 @@ def logs_summary():
     console.print(breakdown_table)
 
 
+@cli.command()
+def replay(
+    rounds_dir: str,
+    steepness: Optional[float] = None,
+    div_factor: Optional[float] = None,
+    latency_weight: Optional[float] = None,
+    apy_weight: Optional[float] = None,
+    alpha: Optional[float] = None,
+    workers: int = 0,
+    top: int = 20,
+):
+    """
+    Replay recorded rounds with different scoring parameters.
+
+    This command re-scores the rounds a validator recorded with --neuron.record_rounds, and shows how
+    the resulting weights and ranks of the miners compare to those of the live parameters.
+
+    Arguments:
+    rounds_dir: The directory the rounds were recorded to (<neuron full path>/rounds).
+    steepness, div_factor: The latency reward curve parameters.
+    latency_weight, apy_weight: How much latency and apy count towards the reward.
+    alpha: The moving average alpha.
+    Parameters that aren't given are the live ones the rounds were recorded with.
+    workers: Number of processes to score the rounds on.
+    top: Number of miners to show.
+    """
+    from sturdy.validator.replay import compare, load_params, ranks, round_paths
+
+    # the parameters the validator recorded the rounds with
+    baseline = load_params(rounds_dir)
+    params = baseline._replace(
+        **{
+            name: value
+            for name, value in (
+                ("steepness", steepness),
+                ("div_factor", div_factor),
+                ("latency_weight", latency_weight),
+                ("apy_weight", apy_weight),
+                ("alpha", alpha),
+            )
+            if value is not None
+        }
+    )
+    paths = round_paths(rounds_dir)
+    console = Console()
+    if not paths:
+        console.print(f"No recorded rounds found in {rounds_dir}")
+        return
+
+    baseline_result, result, rank_changes = compare(
+        paths, params, baseline, workers=workers
+    )
+    console.print(f"Replayed {len(paths)} rounds with {params}")
+
+    table = Table(show_header=True, header_style="bold magenta")
+    for column in ("uid", "weight", "baseline weight", "rank", "rank change"):
+        table.add_column(column)
+
+    weights = result.weights[-1]
+    ranking = ranks(weights)
+    for uid in ranking.argsort()[:top]:
+        table.add_row(
+            str(uid),
+            f"{weights[uid]:.6f}",
+            f"{baseline_result.weights[-1][uid]:.6f}",
+            str(ranking[uid]),
+            f"{rank_changes[uid]:+d}",
+        )
+
+    console.print(table)
+
+
+@cli.command()
+def benchmark(
+    pool_counts: List[int] = typer.Option([10, 100, 1000, 10000]),
+    miners: int = 16,
+    repeats: int = 3,
+):
+    """
+    Benchmark every stage of a round against the number of pools.
+
+    This command times generating the pools, sending the request, allocating, sending the response and
+    scoring it for every pool count, and shows how fast each stage grows with the number of pools.
+
+    Arguments:
+    pool_counts: The numbers of pools to benchmark with.
+    miners: Number of miner responses to score.
+    repeats: Number of runs of every stage, the best one is shown.
+    """
+    from sturdy.utils.benchmark import benchmark_scaling, growth_exponent
+
+    pool_counts = sorted(pool_counts)
+    timings = benchmark_scaling(pool_counts, n_miners=miners, repeats=repeats)
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("stage")
+    for num_pools in pool_counts:
+        table.add_column(f"{num_pools} pools")
+    table.add_column("growth exponent")
+
+    for stage, seconds in timings.items():
+        exponent = (
+            f"{growth_exponent(pool_counts, seconds):.2f}"
+            if len(pool_counts) > 1
+            else "-"
+        )
+        table.add_row(stage, *(f"{s * 1000:.2f}ms" for s in seconds), exponent)
+
+    Console().print(table)
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from sturdy.utils.admission import AdmissionController, RequestShed
+
+
+class TestAdmissionController(IsolatedAsyncioTestCase):
+    async def test_stake_weighted_order(self):
+        admission = AdmissionController(max_concurrency=1, max_queue=64)
+        order = []
+        hold = asyncio.Event()
+
+        async def request(flow, weight, wait=False):
+            async with admission.admit(flow, weight, timeout=60):
+                order.append(flow)
+                if wait:
+                    await hold.wait()
+
+        # keeps the only slot busy while the rest queues up
+        first = asyncio.create_task(request("first", 1.0, wait=True))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(request(flow, weight))
+            for _ in range(6)
+            for flow, weight in (("low", 1.0), ("high", 2.0))
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(len(admission.queue), 12)
+
+        hold.set()
+        await asyncio.gather(first, *tasks)
+        # the flow with twice the weight gets twice the share until it runs out
+        self.assertEqual(
+            order[1:10],
+            ["high", "low", "high", "high", "low", "high", "high", "low", "high"],
+        )
+        self.assertEqual(order.count("low"), 6)
+        self.assertEqual(admission.admitted, 13)
+        self.assertEqual(admission.active, 0)
+
+    async def test_shedding(self):
+        admission = AdmissionController(max_concurrency=1, max_queue=1)
+        hold = asyncio.Event()
+
+        async def request(timeout=60):
+            async with admission.admit("validator", 1.0, timeout=timeout):
+                await hold.wait()
+
+        running = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(request())
+        await asyncio.sleep(0)
+
+        with self.assertRaises(RequestShed) as shed:
+            await request()
+        self.assertEqual(shed.exception.reason, "queue_full")
+
+        # can't be done in time going by how long requests take
+        admission.max_queue = 2
+        admission.service_time = 1.0
+        with self.assertRaises(RequestShed) as shed:
+            await request(timeout=1.5)
+        self.assertEqual(shed.exception.reason, "deadline")
+
+        # a batch takes as long as the requests in it
+        admission.max_queue = 3
+        with self.assertRaises(RequestShed) as shed:
+            await admission.acquire("validator", 1.0, timeout=4.5, size=4)
+        self.assertEqual(shed.exception.reason, "deadline")
+
+        hold.set()
+        await asyncio.gather(running, queued)
+        self.assertEqual(admission.shed, {"queue_full": 1, "deadline": 2})
+
+    async def test_cancelled_request_frees_its_place(self):
+        admission = AdmissionController(max_concurrency=1)
+        hold = asyncio.Event()
+
+        async def request():
+            async with admission.admit("validator", 1.0, timeout=60):
+                await hold.wait()
+
+        running = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        queued.cancel()
+        hold.set()
+        await running
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+        self.assertEqual(admission.active, 0)
+        self.assertEqual(admission.admitted, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
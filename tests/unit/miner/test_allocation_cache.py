@@ -0,0 +1,108 @@
+import concurrent.futures
+import copy
+import random
+import sys
+import time
+import unittest
+from unittest import TestCase
+
+from sturdy.pools import generate_assets_and_pools
+from sturdy.protocol import AllocateAssets
+from sturdy.utils.misc import cached_allocation_algorithm, pools_fingerprint
+from sturdy.utils.optimal import optimal_allocation_algorithm
+
+
+class TestAllocationCache(TestCase):
+    def test_pools_fingerprint(self):
+        random.seed(69)
+        assets_and_pools = generate_assets_and_pools()
+        reordered = {
+            "pools": {
+                pool_id: dict(reversed(list(pool.items())))
+                for pool_id, pool in reversed(list(assets_and_pools["pools"].items()))
+            },
+            "total_assets": assets_and_pools["total_assets"],
+        }
+        self.assertEqual(
+            pools_fingerprint(assets_and_pools), pools_fingerprint(reordered)
+        )
+
+        changed = copy.deepcopy(assets_and_pools)
+        changed["pools"]["0"]["borrow_amount"] += 0.001
+        self.assertNotEqual(
+            pools_fingerprint(assets_and_pools), pools_fingerprint(changed)
+        )
+
+    def test_cached_allocation_algorithm(self):
+        random.seed(420)
+        calls = []
+
+        def algorithm(synapse):
+            calls.append(synapse)
+            return optimal_allocation_algorithm(synapse)
+
+        cached = cached_allocation_algorithm(algorithm, maxsize=2)
+        payloads = [generate_assets_and_pools() for _ in range(3)]
+
+        first = cached(AllocateAssets(assets_and_pools=payloads[0]))
+        self.assertEqual(
+            first,
+            optimal_allocation_algorithm(AllocateAssets(assets_and_pools=payloads[0])),
+        )
+        first["0"] = 0.0  # results handed out are copies
+        again = cached(AllocateAssets(assets_and_pools=copy.deepcopy(payloads[0])))
+        self.assertNotEqual(again["0"], 0.0)
+        self.assertEqual(len(calls), 1)
+
+        # the least recently used result is evicted once the cache is full
+        cached(AllocateAssets(assets_and_pools=payloads[1]))
+        cached(AllocateAssets(assets_and_pools=payloads[2]))
+        cached(AllocateAssets(assets_and_pools=payloads[0]))
+        self.assertEqual(len(calls), 4)
+
+        info = cached.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 4))
+        self.assertEqual((info.currsize, info.maxsize), (2, 2))
+
+    def test_ttl(self):
+        random.seed(1)
+        calls = []
+
+        def algorithm(synapse):
+            calls.append(synapse)
+            return optimal_allocation_algorithm(synapse)
+
+        cached = cached_allocation_algorithm(algorithm, ttl=1)
+        synapse = AllocateAssets(assets_and_pools=generate_assets_and_pools())
+        cached(synapse)
+        time.sleep(1.1)
+        cached(synapse)
+        self.assertEqual(len(calls), 2)
+
+    def test_concurrent_calls(self):
+        # the miner allocates on a thread pool, every thread goes through the same cache
+        random.seed(2)
+        cached = cached_allocation_algorithm(optimal_allocation_algorithm)
+        synapses = [
+            AllocateAssets(assets_and_pools=generate_assets_and_pools())
+            for _ in range(4)
+        ]
+        expected = [optimal_allocation_algorithm(synapse) for synapse in synapses]
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(
+                    executor.map(
+                        lambda idx: cached(synapses[idx % 4]) == expected[idx % 4],
+                        range(4000),
+                    )
+                )
+        finally:
+            sys.setswitchinterval(switch_interval)
+        self.assertTrue(all(results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from collections import Counter
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+
+import torch
+
+from neurons.miner import Miner
+from sturdy.protocol import AllocateAssets
+from sturdy.utils.rate_limit import RateLimiter, TokenBucket
+from sturdy.utils.uids import HotkeyIndex
+
+
+def request_from(hotkey):
+    synapse = AllocateAssets(assets_and_pools={})
+    synapse.dendrite.hotkey = hotkey
+    return synapse
+
+
+class TestBlacklist(IsolatedAsyncioTestCase):
+    def setUp(self):
+        metagraph = SimpleNamespace(
+            hotkeys=["validator", "miner", "other_validator"],
+            S=torch.tensor([100.0, 1.0, 50.0]),
+            validator_permit=torch.tensor([True, False, True]),
+        )
+        self.miner = SimpleNamespace(
+            config=SimpleNamespace(
+                blacklist=SimpleNamespace(
+                    allow_non_registered=False, force_validator_permit=True
+                )
+            ),
+            hotkey_index=HotkeyIndex(metagraph),
+            rate_limiter=RateLimiter(rate=1.0, burst=2),
+            rejections=Counter(),
+        )
+
+    async def test_blacklist(self):
+        blacklist = lambda hotkey: Miner.blacklist(self.miner, request_from(hotkey))
+        self.assertEqual(await blacklist("unknown"), (True, "Unrecognized hotkey"))
+        self.assertEqual(await blacklist("miner"), (True, "Non-validator hotkey"))
+        # validators aren't rate limited
+        for _ in range(5):
+            self.assertFalse((await blacklist("validator"))[0])
+        self.assertFalse((await blacklist("other_validator"))[0])
+        self.assertEqual(
+            self.miner.rejections, Counter(unregistered=1, non_validator=1)
+        )
+
+    async def test_rate_limit(self):
+        self.miner.config.blacklist.force_validator_permit = False
+        blacklist = lambda hotkey: Miner.blacklist(self.miner, request_from(hotkey))
+        self.assertFalse((await blacklist("miner"))[0])
+        self.assertFalse((await blacklist("miner"))[0])
+        # the burst is used up
+        self.assertEqual(await blacklist("miner"), (True, "Rate limited"))
+        self.assertFalse((await blacklist("validator"))[0])
+        self.assertEqual(self.miner.rejections, Counter(rate_limited=1))
+
+    async def test_priority(self):
+        priority = lambda hotkey: Miner.priority(self.miner, request_from(hotkey))
+        self.assertEqual(await priority("validator"), 100.0)
+        self.assertEqual(await priority("other_validator"), 50.0)
+        self.assertEqual(await priority("unknown"), 0.0)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=2.0, burst=3, now=0.0)
+        self.assertEqual([bucket.take(0.0) for _ in range(4)], [True] * 3 + [False])
+        self.assertTrue(bucket.take(0.5))
+        self.assertFalse(bucket.take(0.5))
+
+    def test_bounded_keys(self):
+        limiter = RateLimiter(rate=1.0, burst=1, max_keys=2)
+        self.assertTrue(limiter.allow("a", now=0.0))
+        self.assertFalse(limiter.allow("a", now=0.0))
+        limiter.allow("b", now=0.0)
+        limiter.allow("c", now=0.0)
+        self.assertEqual(list(limiter.buckets), ["b", "c"])
+
+        disabled = RateLimiter(rate=0, burst=1)
+        self.assertTrue(all(disabled.allow("a") for _ in range(100)))
+
+
+if __name__ == "__main__":
+    unittest.main()
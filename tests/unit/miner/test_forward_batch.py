@@ -0,0 +1,56 @@
+import concurrent.futures
+import unittest
+from collections import Counter
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+
+from neurons.miner import Miner
+from sturdy.pools import generate_pool_batch
+from sturdy.protocol import AllocateAssets, AllocateAssetsBatch
+from sturdy.utils.admission import AdmissionController
+from sturdy.utils.optimal import optimal_allocation_algorithm
+
+
+class TestForwardBatch(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.miner = SimpleNamespace(
+            extract_ip=lambda synapse: None,
+            hotkey_index=SimpleNamespace(get=lambda hotkey: None),
+            admission=AdmissionController(max_concurrency=1),
+            allocation_executor=self.executor,
+            allocate=lambda synapse, queued: (
+                optimal_allocation_algorithm(synapse),
+                0.0,
+            ),
+            rejections=Counter(),
+        )
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_allocates_every_scenario(self):
+        scenarios = list(generate_pool_batch(5, seed=0))
+        synapse = AllocateAssetsBatch(scenarios=scenarios)
+        synapse.timeout = 10.0
+
+        service_time = self.miner.admission.service_time
+        response = await Miner.forward_batch(self.miner, synapse)
+        self.assertEqual(response.scenarios, [])
+        self.assertEqual(
+            response.allocations,
+            [
+                optimal_allocation_algorithm(
+                    AllocateAssets(assets_and_pools=assets_and_pools)
+                )
+                for assets_and_pools in scenarios
+            ],
+        )
+        # the whole batch is admitted as one request, and doesn't count towards the time a
+        # single one takes
+        self.assertEqual(self.miner.admission.admitted, 1)
+        self.assertEqual(self.miner.admission.service_time, service_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
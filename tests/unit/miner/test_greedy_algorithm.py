@@ -39,6 +39,19 @@ class TestGreedyAlgorithm(TestCase):
         # Assert that the total allocated amount equals the total assets given to the miner
         self.assertAlmostEqual(sum(allocations.values()), TOTAL_ASSETS, places=6)
 
+    def test_identical_pools(self):
+        # every pool yields the same at every step, so the assets are split evenly
+        assets_and_pools = generate_assets_and_pools()
+        pool = next(iter(assets_and_pools["pools"].values()))
+        assets_and_pools["pools"] = {
+            pool_id: dict(pool, pool_id=pool_id) for pool_id in ("0", "1", "2", "3")
+        }
+        synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+        allocations = greedy_allocation_algorithm(synapse=synapse)
+        self.assertAlmostEqual(sum(allocations.values()), TOTAL_ASSETS, places=6)
+        for amount in allocations.values():
+            self.assertAlmostEqual(amount, TOTAL_ASSETS / 4, places=6)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,124 @@
+import copy
+import random
+import unittest
+from unittest import TestCase, mock
+
+import numpy as np
+
+from sturdy.constants import TOTAL_ASSETS
+from sturdy.pools import generate_assets_and_pools
+from sturdy.protocol import AllocateAssets
+from sturdy.utils import optimal
+from sturdy.utils.optimal import IncrementalAllocator, optimal_allocation_algorithm
+from sturdy.utils.rates import PoolArrays, allocation_yields
+
+
+def total_yield(assets_and_pools, allocations):
+    pools = PoolArrays.from_pools(assets_and_pools["pools"])
+    amounts = np.array([allocations[pool_id] for pool_id in pools.pool_ids])
+    return allocation_yields(amounts, pools)[1]
+
+
+def perturb(assets_and_pools, num_changes):
+    """Changes the rates or borrow amounts of a few random pools."""
+    assets_and_pools = copy.deepcopy(assets_and_pools)
+    pools = assets_and_pools["pools"]
+    for pool_id in random.sample(list(pools), num_changes):
+        pool = pools[pool_id]
+        if random.random() < 0.5:
+            pool["kink_slope"] = round(pool["kink_slope"] * random.uniform(0.8, 1.2), 8)
+            pool["base_slope"] = round(pool["base_slope"] * random.uniform(0.8, 1.2), 8)
+        else:
+            pool["borrow_amount"] = round(
+                pool["borrow_amount"] * random.uniform(0.8, 1.1), 8
+            )
+    return assets_and_pools
+
+
+class TestIncrementalAllocator(TestCase):
+    def test_matches_optimal(self):
+        random.seed(69)
+        allocator = IncrementalAllocator()
+        assets_and_pools = generate_assets_and_pools()
+        for step in range(50):
+            if step % 10 == 0:
+                assets_and_pools = generate_assets_and_pools()
+            else:
+                assets_and_pools = perturb(assets_and_pools, random.randint(0, 3))
+            synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+            allocations = allocator(synapse)
+            expected = optimal_allocation_algorithm(synapse)
+
+            self.assertAlmostEqual(sum(allocations.values()), TOTAL_ASSETS, places=6)
+            for pool_id, pool in assets_and_pools["pools"].items():
+                self.assertGreaterEqual(allocations[pool_id], pool["borrow_amount"])
+            self.assertAlmostEqual(
+                total_yield(assets_and_pools, allocations),
+                total_yield(assets_and_pools, expected),
+                places=8,
+            )
+
+    def test_only_changed_pools_are_evaluated(self):
+        random.seed(420)
+        allocator = IncrementalAllocator()
+        assets_and_pools = generate_assets_and_pools()
+        allocator(AllocateAssets(assets_and_pools=assets_and_pools))
+
+        # rates change, the borrow amounts (and so the excess) stay the same
+        changed = copy.deepcopy(assets_and_pools)
+        changed["pools"]["3"]["kink_slope"] += 0.1
+        with mock.patch.object(
+            optimal, "yield_segments", wraps=optimal.yield_segments
+        ) as yield_segments:
+            allocations = allocator(AllocateAssets(assets_and_pools=changed))
+        self.assertEqual(yield_segments.call_count, 1)
+        self.assertAlmostEqual(
+            total_yield(changed, allocations),
+            total_yield(
+                changed,
+                optimal_allocation_algorithm(AllocateAssets(assets_and_pools=changed)),
+            ),
+            places=8,
+        )
+
+    def test_borrow_change_keeps_other_pools(self):
+        random.seed(7)
+        allocator = IncrementalAllocator()
+        assets_and_pools = generate_assets_and_pools()
+        allocator(AllocateAssets(assets_and_pools=assets_and_pools))
+
+        # a borrow amount change moves the excess, the other pools' hulls stay as they are
+        changed = copy.deepcopy(assets_and_pools)
+        changed["pools"]["5"]["borrow_amount"] *= 0.9
+        with mock.patch.object(
+            optimal, "yield_segments", wraps=optimal.yield_segments
+        ) as yield_segments, mock.patch.object(
+            optimal, "concave_hull", wraps=optimal.concave_hull
+        ) as concave_hull:
+            allocations = allocator(AllocateAssets(assets_and_pools=changed))
+        self.assertEqual(yield_segments.call_count, 1)
+        self.assertEqual(concave_hull.call_count, 1)
+        self.assertAlmostEqual(
+            total_yield(changed, allocations),
+            total_yield(
+                changed,
+                optimal_allocation_algorithm(AllocateAssets(assets_and_pools=changed)),
+            ),
+            places=8,
+        )
+
+    def test_bounded_states(self):
+        random.seed(1)
+        allocator = IncrementalAllocator(max_states=2)
+        for num_pools in (3, 4, 5, 3):
+            assets_and_pools = generate_assets_and_pools()
+            assets_and_pools["pools"] = {
+                k: v for k, v in list(assets_and_pools["pools"].items())[:num_pools]
+            }
+            allocator(AllocateAssets(assets_and_pools=assets_and_pools))
+        self.assertEqual(len(allocator.states), 2)
+        self.assertEqual([len(key) for key in allocator.states], [5, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import TestCase
+
+from sturdy.utils.ip_log import IPLog
+
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+class TestIPLog(TestCase):
+    def test_batches(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "ip.txt")
+            ip_log = IPLog(path, flush_interval=60, batch_size=3)
+            for ip in ("1.1.1.1", "2.2.2.2", "1.1.1.1", None):
+                ip_log.add(ip)
+            self.assertEqual(len(ip_log), 2)
+            self.assertIn("2.2.2.2", ip_log)
+            # nothing is written before the batch is full
+            time.sleep(0.1)
+            self.assertEqual(read_lines(path), [])
+
+            ip_log.add("3.3.3.3")
+            deadline = time.monotonic() + 5
+            while len(read_lines(path)) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(read_lines(path), ["1.1.1.1", "2.2.2.2", "3.3.3.3"])
+
+            ip_log.add("4.4.4.4")
+            ip_log.close()
+            self.assertEqual(len(read_lines(path)), 4)
+
+            # ips already logged are loaded back and not written again
+            ip_log = IPLog(path, flush_interval=60, batch_size=3)
+            ip_log.add("4.4.4.4")
+            ip_log.add("5.5.5.5")
+            ip_log.close()
+            self.assertEqual(
+                read_lines(path),
+                ["1.1.1.1", "2.2.2.2", "3.3.3.3", "4.4.4.4", "5.5.5.5"],
+            )
+
+    def test_flush_interval(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "ip.txt")
+            ip_log = IPLog(path, flush_interval=0.2, batch_size=100)
+            ip_log.add("1.1.1.1")
+            deadline = time.monotonic() + 5
+            while not read_lines(path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(read_lines(path), ["1.1.1.1"])
+            ip_log.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
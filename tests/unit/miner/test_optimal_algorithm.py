@@ -0,0 +1,122 @@
+import random
+import unittest
+from fractions import Fraction
+from types import SimpleNamespace
+from unittest import TestCase
+
+from sturdy.protocol import AllocateAssets
+from sturdy.pools import generate_assets_and_pools
+from sturdy.utils.misc import greedy_allocation_algorithm
+from sturdy.utils.optimal import optimal_allocation_algorithm
+from sturdy.validator.reward import get_rewards
+from sturdy.constants import TOTAL_ASSETS
+
+
+class TestOptimalAlgorithm(TestCase):
+    def test_optimal_allocation_algorithm(self):
+        random.seed(69)
+        for _ in range(20):
+            assets_and_pools = generate_assets_and_pools()
+            synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+            allocations = optimal_allocation_algorithm(synapse=synapse)
+            # Assert that all allocated amounts are more than equal to the minimum borrow amounts
+            self.assertTrue(
+                all(
+                    amount >= assets_and_pools["pools"][pool_id]["borrow_amount"]
+                    for pool_id, amount in allocations.items()
+                )
+            )
+            # Assert that the total allocated amount equals the total assets given to the miner
+            self.assertAlmostEqual(sum(allocations.values()), TOTAL_ASSETS, places=6)
+
+    def test_optimal_scores_at_least_greedy(self):
+        random.seed(420)
+        validator = SimpleNamespace(device="cpu")
+        for step in range(20):
+            assets_and_pools = generate_assets_and_pools()
+            synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+            responses = [
+                AllocateAssets(
+                    assets_and_pools=assets_and_pools,
+                    allocations=algorithm(synapse=synapse),
+                )
+                for algorithm in (
+                    greedy_allocation_algorithm,
+                    optimal_allocation_algorithm,
+                )
+            ]
+            rewards, allocs = get_rewards(
+                validator,
+                step,
+                [0, 1],
+                assets_and_pools=assets_and_pools,
+                responses=responses,
+            )
+            self.assertGreaterEqual(allocs[1]["apy"], allocs[0]["apy"])
+            self.assertGreaterEqual(rewards[1], rewards[0])
+
+    def test_allocations_never_over_allocate(self):
+        # validators sum the submitted floats exactly, so their rounding must not add up to more
+        random.seed(11)
+        for _ in range(50):
+            assets_and_pools = generate_assets_and_pools()
+            synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+            for algorithm in (greedy_allocation_algorithm, optimal_allocation_algorithm):
+                allocations = algorithm(synapse=synapse)
+                self.assertLessEqual(
+                    sum(map(Fraction, allocations.values())),
+                    Fraction(assets_and_pools["total_assets"]),
+                )
+
+    def test_optimal_allocation_rate_models(self):
+        assets_and_pools = {
+            "total_assets": TOTAL_ASSETS,
+            "pools": {
+                "0": {
+                    "pool_id": "0",
+                    "model": "multi_kink",
+                    "base_rate": 0.01,
+                    "kinks": [0.5, 0.9],
+                    "slopes": [0.04, 0.2, 2.0],
+                    "borrow_amount": 0.04,
+                },
+                "1": {
+                    "pool_id": "1",
+                    "model": "exponential",
+                    "base_rate": 0.0,
+                    "base_slope": 0.5,
+                    "exponent": 4.0,
+                    "borrow_amount": 0.06,
+                },
+                "2": {
+                    "pool_id": "2",
+                    "model": "table",
+                    "utils": [0.0, 0.6, 0.85, 1.0],
+                    "rates": [0.0, 0.03, 0.08, 1.0],
+                    "borrow_amount": 0.03,
+                },
+            },
+        }
+        synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+        validator = SimpleNamespace(device="cpu")
+        responses = [
+            AllocateAssets(
+                assets_and_pools=assets_and_pools,
+                allocations=algorithm(synapse=synapse),
+            )
+            for algorithm in (greedy_allocation_algorithm, optimal_allocation_algorithm)
+        ]
+        allocations = responses[1].allocations
+        self.assertAlmostEqual(sum(allocations.values()), TOTAL_ASSETS, places=6)
+        _, allocs = get_rewards(
+            validator,
+            0,
+            [0, 1],
+            assets_and_pools=assets_and_pools,
+            responses=responses,
+        )
+        self.assertGreaterEqual(allocs[1]["apy"], allocs[0]["apy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
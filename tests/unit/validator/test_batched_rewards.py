@@ -0,0 +1,209 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import random
+import sys
+import unittest
+from types import SimpleNamespace
+from decimal import Decimal
+from unittest import TestCase
+
+import numpy as np
+import torch
+
+from sturdy.protocol import AllocateAssets
+from sturdy.pools import generate_assets_and_pools
+from sturdy.utils.misc import greedy_allocation_algorithm
+from sturdy.utils.optimal import optimal_allocation_algorithm
+from sturdy.utils.lazy import lazy_allocation_algorithm
+from sturdy.utils.rates import PoolArrays
+from sturdy.validator.reward import (
+    StreamingScorer,
+    get_rewards,
+    get_rewards_async,
+    get_rewards_batched,
+    pack_scoring_args,
+)
+
+
+def make_response(assets_and_pools, allocations, process_time):
+    response = AllocateAssets(
+        assets_and_pools=assets_and_pools, allocations=allocations
+    )
+    response.dendrite.process_time = process_time
+    return response
+
+
+class TestBatchedRewards(TestCase):
+    def test_batched_rewards_match_get_rewards(self):
+        random.seed(69)
+        validator = SimpleNamespace(device="cpu")
+
+        for step in range(10):
+            assets_and_pools = generate_assets_and_pools()
+            pools = assets_and_pools["pools"]
+            synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+
+            responses = []
+            for algorithm in (
+                greedy_allocation_algorithm,
+                optimal_allocation_algorithm,
+                lazy_allocation_algorithm,
+            ):
+                responses.append(
+                    make_response(
+                        assets_and_pools, algorithm(synapse), random.random() * 12
+                    )
+                )
+
+            # no response at all
+            responses.append(make_response(assets_and_pools, None, None))
+            # allocating less than the borrow amount of a pool
+            below_borrow = lazy_allocation_algorithm(synapse)
+            below_borrow["0"] = pools["0"]["borrow_amount"] / 2
+            responses.append(make_response(assets_and_pools, below_borrow, 1.0))
+            # allocating more than the total assets
+            over_allocated = greedy_allocation_algorithm(synapse)
+            over_allocated["1"] += 1
+            responses.append(make_response(assets_and_pools, over_allocated, 2.0))
+            # only allocating to some of the pools
+            partial = {
+                pool_id: pool["borrow_amount"] * 2
+                for pool_id, pool in list(pools.items())[:3]
+            }
+            responses.append(make_response(assets_and_pools, partial, 3.0))
+
+            uids = random.sample(range(256), len(responses))
+            expected_rewards, expected_allocs = get_rewards(
+                validator, step, uids, assets_and_pools, responses
+            )
+            rewards, allocs = get_rewards_batched(
+                validator, step, uids, assets_and_pools, responses
+            )
+
+            self.assertIsInstance(rewards, torch.FloatTensor)
+            self.assertTrue(torch.allclose(rewards, expected_rewards, atol=1e-6))
+            self.assertEqual(allocs.keys(), expected_allocs.keys())
+            for uid, alloc_info in expected_allocs.items():
+                self.assertAlmostEqual(allocs[uid]["apy"], alloc_info["apy"], places=12)
+                self.assertEqual(allocs[uid]["allocations"], alloc_info["allocations"])
+
+    def test_rewards_on_scoring_executor(self):
+        random.seed(420)
+        assets_and_pools = generate_assets_and_pools()
+        synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+        responses = [
+            make_response(assets_and_pools, algorithm(synapse), random.random() * 5)
+            for algorithm in (
+                greedy_allocation_algorithm,
+                optimal_allocation_algorithm,
+                lazy_allocation_algorithm,
+            )
+        ]
+        uids = [3, 1, 2]
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            validator = SimpleNamespace(device="cpu", scoring_executor=executor)
+            rewards, allocs = asyncio.run(
+                get_rewards_async(validator, 0, uids, assets_and_pools, responses)
+            )
+
+        expected_rewards, expected_allocs = get_rewards_batched(
+            validator, 0, uids, assets_and_pools, responses
+        )
+        self.assertTrue(torch.equal(rewards, expected_rewards))
+        self.assertEqual(allocs, expected_allocs)
+
+    def test_streaming_scorer_matches_batched(self):
+        random.seed(1337)
+        validator = SimpleNamespace(device="cpu")
+        assets_and_pools = generate_assets_and_pools()
+        synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+        responses = [
+            make_response(assets_and_pools, algorithm(synapse), random.random() * 5)
+            for algorithm in (
+                lazy_allocation_algorithm,
+                greedy_allocation_algorithm,
+                optimal_allocation_algorithm,
+            )
+        ]
+        over_allocated = greedy_allocation_algorithm(synapse)
+        over_allocated["2"] += 1
+        responses.append(make_response(assets_and_pools, over_allocated, 1.0))
+        responses.append(make_response(assets_and_pools, None, None))
+        uids = [7, 0, 42, 5, 9]
+
+        scorer = StreamingScorer(assets_and_pools)
+        for uid, response in zip(uids, responses):
+            scorer.add(uid, response)
+        rewards, allocs = scorer.get_rewards(validator)
+
+        expected_rewards, expected_allocs = get_rewards_batched(
+            validator, 0, uids, assets_and_pools, responses
+        )
+        self.assertEqual(scorer.uids, uids)
+        self.assertTrue(torch.allclose(rewards, expected_rewards))
+        self.assertEqual(allocs, expected_allocs)
+
+        # the round is recorded out of what was packed as the responses came in
+        expected_args = pack_scoring_args(uids, assets_and_pools, responses)
+        for arg, expected in zip(scorer.scoring_args(), expected_args):
+            if isinstance(expected, np.ndarray):
+                self.assertTrue(np.array_equal(arg, expected, equal_nan=True))
+            elif isinstance(expected, PoolArrays):
+                self.assertEqual(arg.pool_ids, expected.pool_ids)
+            else:
+                self.assertEqual(arg, expected)
+
+    def test_exact_balance_checks(self):
+        random.seed(7)
+        validator = SimpleNamespace(device="cpu")
+        assets_and_pools = generate_assets_and_pools()
+        pools = assets_and_pools["pools"]
+        total_assets = Decimal(str(assets_and_pools["total_assets"]))
+
+        responses = []
+        for _ in range(200):
+            # honest allocations with more decimals than the fixed-point grid, adding up exactly
+            amounts = {
+                pool_id: Decimal(str(pool["borrow_amount"]))
+                + Decimal(random.randint(0, 10**12)) / 10**14
+                for pool_id, pool in pools.items()
+            }
+            last = list(pools)[-1]
+            amounts[last] += total_assets - sum(amounts.values())
+            responses.append(
+                make_response(
+                    assets_and_pools,
+                    {pool_id: float(amount) for pool_id, amount in amounts.items()},
+                    1.0,
+                )
+            )
+        honest = responses[0].allocations
+        # a tiny bit too much in total, or a tiny bit under a borrow amount
+        over = dict(
+            honest, **{"0": float(Decimal(str(honest["0"])) + Decimal("1e-12"))}
+        )
+        under = dict(honest, **{"1": pools["1"]["borrow_amount"] - 1e-12})
+        responses.append(make_response(assets_and_pools, over, 1.0))
+        responses.append(make_response(assets_and_pools, under, 1.0))
+        uids = list(range(len(responses)))
+
+        rewards, allocs = get_rewards_batched(
+            validator, 0, uids, assets_and_pools, responses
+        )
+        expected_rewards, _ = get_rewards(
+            validator, 0, uids, assets_and_pools, responses
+        )
+        self.assertTrue(torch.allclose(rewards, expected_rewards, atol=1e-6))
+        self.assertTrue(all(uid in allocs for uid in uids[:200]))
+        # submitted allocations are scored as they are
+        self.assertEqual(allocs[0]["allocations"], honest)
+        self.assertEqual(allocs[200]["apy"], sys.float_info.min)
+        self.assertEqual(allocs[201]["apy"], sys.float_info.min)
+
+
+if __name__ == "__main__":
+    unittest.main()
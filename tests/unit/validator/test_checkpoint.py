@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import torch
+
+from sturdy.utils.checkpoint import Checkpointer, load_checkpoint
+
+
+class TestCheckpointer(TestCase):
+    def test_saves_are_coalesced_and_flushed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "state.pt")
+            checkpointer = Checkpointer(path, interval=3600, step_threshold=5, keep=2)
+
+            # the very first save goes out right away
+            checkpointer.save(0, {"step": 0})
+            checkpointer.flush()
+            self.assertEqual(load_checkpoint(path)["step"], 0)
+
+            # the next ones are held back until they're 5 steps ahead
+            for step in range(1, 4):
+                checkpointer.save(step, {"step": step})
+            self.assertEqual(load_checkpoint(path)["step"], 0)
+
+            checkpointer.close()
+            self.assertEqual(load_checkpoint(path)["step"], 3)
+            self.assertEqual(load_checkpoint(f"{path}.1")["step"], 0)
+            self.assertFalse(os.path.exists(f"{path}.tmp"))
+
+    def test_rotation_and_corrupt_fallback(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "state.pt")
+            self.assertIsNone(load_checkpoint(path, keep=2))
+
+            checkpointer = Checkpointer(path, interval=0, step_threshold=1, keep=2)
+            for step in range(4):
+                checkpointer.save(step, {"scores": torch.full((3,), float(step))})
+                checkpointer.flush()
+            checkpointer.close()
+
+            self.assertEqual(
+                sorted(os.listdir(tmp_dir)), ["state.pt", "state.pt.1", "state.pt.2"]
+            )
+
+            with open(path, "wb") as f:
+                f.write(b"not a checkpoint")
+            state = load_checkpoint(path, keep=2)
+            self.assertTrue(torch.equal(state["scores"], torch.full((3,), 2.0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
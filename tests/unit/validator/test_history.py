@@ -0,0 +1,85 @@
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from sturdy.validator.history import (
+    RECORD_DTYPE,
+    ScoreHistoryStore,
+    make_records,
+    parse_size,
+)
+
+
+def round_records(round, uids):
+    return make_records(
+        round,
+        1000 + round,
+        uids,
+        np.full(len(uids), 0.5),
+        np.linspace(0.01, 0.1, len(uids)),
+        np.full(len(uids), 1.5),
+        np.zeros(len(uids), dtype=bool),
+    )
+
+
+class TestScoreHistory(TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size("2 GB"), 2 * 1000**3)
+        self.assertEqual(parse_size("500 MiB"), 500 * 1024**2)
+        self.assertEqual(parse_size("1024"), 1024)
+        self.assertIsNone(parse_size("1 week"))
+
+    def test_append_scan_and_reopen(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ScoreHistoryStore(tmp_dir, segment_rows=16)
+            for round in range(5):
+                store.append(round_records(round, list(range(7))))
+            self.assertEqual(len(store), 35)
+            # 35 rows over segments of 16
+            self.assertEqual([len(chunk) for chunk in store.scan()], [16, 16, 3])
+
+            records = store.read(uids=[3])
+            self.assertEqual(records.dtype, RECORD_DTYPE)
+            self.assertEqual(records["round"].tolist(), list(range(5)))
+            self.assertEqual(records["block"].tolist(), [1000 + r for r in range(5)])
+
+            # picks up where it left off
+            store = ScoreHistoryStore(tmp_dir, segment_rows=16)
+            store.append(round_records(5, list(range(7))))
+            self.assertEqual(len(store), 42)
+            self.assertEqual(store.read()["round"][-7:].tolist(), [5] * 7)
+
+    def test_retention(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ScoreHistoryStore(
+                tmp_dir, segment_rows=10, retention_bytes=25 * RECORD_DTYPE.itemsize
+            )
+            for round in range(10):
+                store.append(round_records(round, list(range(5))))
+            store.flush()
+            # only the two newest segments fit in the retention size
+            self.assertEqual(len(store.segments), 2)
+            self.assertEqual(store.read()["round"].tolist()[0], 6)
+            self.assertEqual(store.read()["round"].tolist()[-1], 9)
+            store.close()
+
+    def test_append_writes_in_the_background(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ScoreHistoryStore(tmp_dir, segment_rows=16)
+            # while a write is stuck, appending still returns right away
+            with store.lock:
+                for round in range(3):
+                    store.append(round_records(round, list(range(7))))
+                self.assertEqual(store.segments, [])
+            store.close()
+            self.assertEqual(len(store), 21)
+
+            store = ScoreHistoryStore(tmp_dir, segment_rows=16)
+            self.assertEqual(store.read()["round"].tolist(), sorted(list(range(3)) * 7))
+            store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from sturdy.constants import (
+    DEAD_AXON_FAILURES,
+    MAX_PROBE_BACKOFF,
+    MIN_QUERY_TIMEOUT,
+    QUERY_TIMEOUT,
+)
+from sturdy.validator.latency import LatencyProfiles
+
+
+class TestLatencyProfiles(TestCase):
+    def test_adaptive_timeouts(self):
+        profiles = LatencyProfiles(3)
+        # nothing known about a miner yet
+        self.assertEqual(profiles.timeout(0), QUERY_TIMEOUT)
+
+        for step in range(50):
+            profiles.record([0, 1], [0.05, 2.0 + (step % 5) * 0.1], step)
+
+        self.assertAlmostEqual(profiles.ewma[0], 0.05)
+        self.assertEqual(profiles.timeout(0), MIN_QUERY_TIMEOUT)
+        self.assertGreaterEqual(profiles.quantile(1, 0.99), 2.4)
+        self.assertLessEqual(profiles.quantile(1, 0.5), profiles.quantile(1, 0.99))
+        self.assertGreater(profiles.timeout(1), 2 * 2.4)
+        self.assertLess(profiles.timeout(1), QUERY_TIMEOUT)
+        self.assertTrue(np.isnan(profiles.quantile(2, 0.5)))
+
+    def test_dead_axons_are_probed_with_backoff(self):
+        profiles = LatencyProfiles(2)
+        step = 0
+        for _ in range(DEAD_AXON_FAILURES - 1):
+            profiles.record([0, 1], [None, 0.1], step)
+            step += 1
+            self.assertTrue(profiles.should_query([0], step).all())
+
+        backoffs = []
+        for _ in range(10):
+            profiles.record([0, 1], [None, 0.1], step)
+            backoffs.append(int(profiles.next_probe[0]) - step)
+            self.assertFalse(profiles.should_query([0], step).any())
+            self.assertTrue(profiles.should_query([1], step).all())
+            step = int(profiles.next_probe[0])
+        self.assertEqual(backoffs[:4], [1, 2, 4, 8])
+        self.assertEqual(max(backoffs), MAX_PROBE_BACKOFF)
+
+        # responding again brings it straight back
+        profiles.record([0], [0.2], step)
+        self.assertTrue(profiles.should_query([0], step + 1).all())
+        self.assertEqual(profiles.failures[0], 0)
+
+    def test_state_dict_round_trip(self):
+        profiles = LatencyProfiles(2)
+        profiles.record([0, 1], [0.3, None], 0)
+        restored = LatencyProfiles(4)
+        restored.load_state_dict(profiles.state_dict())
+        self.assertEqual(len(restored), 4)
+        self.assertEqual(restored.summary([0, 1]), profiles.summary([0, 1]))
+        self.assertIsNone(restored.summary([3])[3]["ewma"])
+
+
+if __name__ == "__main__":
+    unittest.main()
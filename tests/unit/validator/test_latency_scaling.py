@@ -1,11 +1,19 @@
+import math
 import random
 import unittest
 from unittest import TestCase
 
+import numpy as np
+
 from sturdy.protocol import AllocateAssets
 from sturdy.pools import generate_assets_and_pools
 from sturdy.utils.misc import greedy_allocation_algorithm
-from sturdy.validator.reward import sigmoid_scale, get_response_times
+from sturdy.constants import MAX_LATENCY_MIDPOINT
+from sturdy.validator.reward import (
+    get_response_times,
+    sigmoid_scale,
+    sigmoid_scale_batch,
+)
 from parameterized import parameterized
 
 
@@ -40,6 +48,39 @@ class TestLatencyScaling(TestCase):
         )
         self.assertAlmostEqual(output, expected, places=places)
 
+    @parameterized.expand(
+        [
+            [1.00, 0.99909, 4],
+            [7.00, 0.73106, 4],
+            [9.00, 0.26894, 4],
+        ]
+    )
+    def test_capped_midpoint(self, process_time: float, expected: float, places: int):
+        # the center of the curve stays within the timeout however many pools there are
+        output = sigmoid_scale(
+            process_time, num_pools=10000, max_midpoint=MAX_LATENCY_MIDPOINT
+        )
+        self.assertAlmostEqual(output, expected, places=places)
+
+    def test_live_rounds_unchanged(self):
+        # live rounds pass the number of miners, and score exactly like they always did
+        axon_times = np.array([0.01, 1.0, 5.0, 9.5, 12.0])
+        for num_miners in (10, 16, 64, 256):
+            expected = [
+                1 / (1 + math.exp(axon_time - float(num_miners) / 1.5))
+                if axon_time < 10
+                else 0
+                for axon_time in axon_times
+            ]
+            self.assertEqual(
+                [sigmoid_scale(t, num_pools=num_miners) for t in axon_times], expected
+            )
+            self.assertTrue(
+                np.array_equal(
+                    sigmoid_scale_batch(axon_times, num_pools=num_miners), expected
+                )
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
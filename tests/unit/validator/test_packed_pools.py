@@ -0,0 +1,147 @@
+import unittest
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from sturdy.pools import generate_pool_batch
+from sturdy.protocol import (
+    PACKED_POOLS_VERSION,
+    AllocateAssets,
+    pack_pools,
+    unpack_pools,
+)
+from neurons.miner import Miner
+from sturdy.validator.forward import query_multiple_miners, record_packed_version
+
+
+class TestPackedPools(TestCase):
+    def test_round_trip(self):
+        assets_and_pools = generate_pool_batch(
+            1, seed=0, num_pools=100
+        ).assets_and_pools(0)
+        synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+        packed = synapse.packed()
+        self.assertEqual(packed.assets_and_pools, {})
+        self.assertEqual(packed.packed_version, PACKED_POOLS_VERSION)
+        self.assertLess(len(packed.json()), len(synapse.json()) / 2)
+
+        received = AllocateAssets.parse_raw(packed.json())
+        received.unpack()
+        self.assertEqual(received.assets_and_pools, assets_and_pools)
+
+    def test_not_packable(self):
+        assets_and_pools = generate_pool_batch(1, seed=1).assets_and_pools(0)
+        assets_and_pools["pools"]["0"]["model"] = "exponential"
+        self.assertIsNone(pack_pools(assets_and_pools))
+        self.assertIsNone(AllocateAssets(assets_and_pools=assets_and_pools).packed())
+
+    def test_bad_payloads(self):
+        pool_ids, packed = pack_pools(
+            generate_pool_batch(1, seed=2).assets_and_pools(0)
+        )
+        with self.assertRaises(ValueError):
+            unpack_pools(pool_ids[:-1], packed)
+
+        synapse = AllocateAssets(
+            assets_and_pools={},
+            pool_ids=pool_ids,
+            packed_pools=packed,
+            packed_version=PACKED_POOLS_VERSION + 1,
+        )
+        with self.assertRaises(ValueError):
+            synapse.unpack()
+
+
+class FakeDendrite:
+    """Answers like miners would - uids in ``packed_uids`` accept packed pools, the rest are older miners."""
+
+    def __init__(self, packed_uids):
+        self.packed_uids = packed_uids
+        self.sent = []
+
+    async def forward(self, axons, synapse, timeout, deserialize, streaming):
+        uid = axons
+        self.sent.append((uid, synapse.packed_pools is not None))
+        response = synapse.copy()
+        response.dendrite.status_code = 200
+        if uid in self.packed_uids:
+            response.accepted_packed_version = PACKED_POOLS_VERSION
+        return response
+
+
+class TestPackedNegotiation(IsolatedAsyncioTestCase):
+    def make_validator(self, disable_packed_pools=False):
+        return SimpleNamespace(
+            config=SimpleNamespace(
+                neuron=SimpleNamespace(
+                    adaptive_timeouts=False,
+                    disable_packed_pools=disable_packed_pools,
+                )
+            ),
+            metagraph=SimpleNamespace(axons=[0, 1, 2]),
+            dendrite=FakeDendrite(packed_uids={0, 2}),
+            packed_versions={},
+        )
+
+    async def test_packed_once_accepted(self):
+        validator = self.make_validator()
+        synapse = AllocateAssets(
+            assets_and_pools=generate_pool_batch(1, seed=3).assets_and_pools(0)
+        )
+
+        await query_multiple_miners(validator, synapse, [0, 1, 2])
+        # nobody said they accept packed pools yet
+        self.assertEqual(validator.dendrite.sent, [(0, False), (1, False), (2, False)])
+        self.assertEqual(
+            validator.packed_versions,
+            {0: PACKED_POOLS_VERSION, 2: PACKED_POOLS_VERSION},
+        )
+
+        validator.dendrite.sent.clear()
+        await query_multiple_miners(validator, synapse, [0, 1, 2])
+        self.assertEqual(validator.dendrite.sent, [(0, True), (1, False), (2, True)])
+
+        # back to plain pools for miners that no longer say they accept packed ones
+        validator.dendrite.packed_uids = {0}
+        validator.dendrite.sent.clear()
+        await query_multiple_miners(validator, synapse, [0, 1, 2])
+        await query_multiple_miners(validator, synapse, [0, 1, 2])
+        self.assertEqual(
+            validator.dendrite.sent[3:], [(0, True), (1, False), (2, False)]
+        )
+
+    async def test_disabled(self):
+        validator = self.make_validator(disable_packed_pools=True)
+        validator.packed_versions = {0: PACKED_POOLS_VERSION}
+        synapse = AllocateAssets(
+            assets_and_pools=generate_pool_batch(1, seed=4).assets_and_pools(0)
+        )
+        await query_multiple_miners(validator, synapse, [0, 1])
+        self.assertEqual(validator.dendrite.sent, [(0, False), (1, False)])
+
+    async def test_fallback_on_bad_payload(self):
+        validator = self.make_validator()
+        validator.packed_versions = {0: PACKED_POOLS_VERSION}
+        pool_ids, packed = pack_pools(
+            generate_pool_batch(1, seed=5).assets_and_pools(0)
+        )
+        # a payload the miner can't decode
+        synapse = AllocateAssets(
+            assets_and_pools={},
+            pool_ids=pool_ids[:-1],
+            packed_pools=packed,
+            packed_version=PACKED_POOLS_VERSION,
+        )
+
+        miner = SimpleNamespace(extract_ip=lambda synapse: None)
+        response = await Miner.forward(miner, synapse)
+        response.dendrite.status_code = 200
+        self.assertIsNone(response.allocations)
+        self.assertIsNone(response.accepted_packed_version)
+
+        # back to plain pools for that miner
+        record_packed_version(validator, 0, True, response)
+        self.assertEqual(validator.packed_versions, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
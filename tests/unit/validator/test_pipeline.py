@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+from unittest import TestCase
+
+from sturdy.validator.pipeline import ScoringPipeline
+
+
+class TestScoringPipeline(TestCase):
+    def test_stages_run_in_order_with_timings(self):
+        pipeline = ScoringPipeline(max_pending=1)
+        order = []
+        release = threading.Event()
+
+        def stage(name, wait=False):
+            if wait:
+                release.wait(5)
+            order.append(name)
+
+        for step in range(3):
+            round_timings = pipeline.start_round(step)
+            pipeline.submit("score", stage, f"score {step}", step == 0)
+            pipeline.submit("sync", stage, f"sync {step}", round_timings=round_timings)
+            if step == 0:
+                # the first stage is still blocked, so the next round gets to go ahead
+                self.assertEqual(order, [])
+                release.set()
+
+        pipeline.wait_for_capacity()
+        self.assertLessEqual(len(pipeline.pending), 1)
+        pipeline.shutdown()
+
+        self.assertEqual(
+            order,
+            ["score 0", "sync 0", "score 1", "sync 1", "score 2", "sync 2"],
+        )
+        for step, round_timings in enumerate(pipeline.timings):
+            self.assertEqual(round_timings["step"], step)
+            for key in ("score", "score_wait", "sync", "sync_wait"):
+                self.assertGreaterEqual(round_timings[key], 0)
+
+    def test_failing_stage_does_not_stop_the_pipeline(self):
+        pipeline = ScoringPipeline()
+        ran = []
+
+        def fail():
+            raise ValueError("oops")
+
+        pipeline.start_round(0)
+        pipeline.submit("score", fail)
+        pipeline.submit("sync", lambda: ran.append(time.monotonic()))
+        pipeline.shutdown()
+        self.assertEqual(len(ran), 1)
+        self.assertIn("score", pipeline.current_round)
+
+
+if __name__ == "__main__":
+    unittest.main()
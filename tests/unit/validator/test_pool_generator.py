@@ -1,6 +1,13 @@
 import unittest
 import random
-from sturdy.pools import generate_assets_and_pools
+
+import numpy as np
+
+from sturdy.pools import (
+    borrow_amount_range,
+    generate_assets_and_pools,
+    generate_pool_batch,
+)
 from sturdy.constants import (
     MIN_BASE_RATE,
     MAX_BASE_RATE,
@@ -56,6 +63,81 @@ class TestGenerateAssetsAndPools(unittest.TestCase):
                     MIN_BORROW_AMOUNT <= pool_info["borrow_amount"] <= MAX_BORROW_AMOUNT
                 )
 
+    def test_num_pools(self):
+        random.seed(42)
+        for num_pools in (1, 100, 10000):
+            result = generate_assets_and_pools(num_pools)
+            self.assertEqual(len(result["pools"]), num_pools)
+            min_borrow, max_borrow, _ = borrow_amount_range(num_pools)
+            borrowed = sum(pool["borrow_amount"] for pool in result["pools"].values())
+            # the borrow amounts take up the same share of the assets as with NUM_POOLS pools
+            self.assertLessEqual(borrowed, NUM_POOLS * MAX_BORROW_AMOUNT)
+            for pool in result["pools"].values():
+                self.assertTrue(min_borrow <= pool["borrow_amount"] <= max_borrow)
+
+        self.assertEqual(
+            borrow_amount_range(NUM_POOLS),
+            (MIN_BORROW_AMOUNT, MAX_BORROW_AMOUNT, BORROW_AMOUNT_STEP),
+        )
+        batch = generate_pool_batch(4, seed=0, num_pools=10000)
+        self.assertLess(batch.borrow_amount.sum(axis=1).max(), TOTAL_ASSETS)
+
+
+class TestGeneratePoolBatch(unittest.TestCase):
+    def test_ranges(self):
+        batch = generate_pool_batch(10_000, seed=69)
+        self.assertEqual(len(batch), 10_000)
+        self.assertEqual(batch.base_slope.shape, (10_000, NUM_POOLS))
+        self.assertTrue(np.all(batch.total_assets == TOTAL_ASSETS))
+        self.assertTrue(np.all(batch.base_rate >= MIN_BASE_RATE))
+        self.assertTrue(np.all(batch.base_rate <= MAX_BASE_RATE))
+        self.assertTrue(np.all(batch.base_slope >= MIN_SLOPE))
+        self.assertTrue(np.all(batch.base_slope <= MAX_SLOPE))
+        self.assertTrue(np.all(batch.kink_slope >= MIN_KINK_SLOPE))
+        self.assertTrue(np.all(batch.kink_slope <= MAX_KINK_SLOPE))
+        self.assertTrue(np.all(batch.optimal_util_rate == OPTIMAL_UTIL_RATE))
+        self.assertTrue(np.all(batch.borrow_amount >= MIN_BORROW_AMOUNT))
+        self.assertTrue(np.all(batch.borrow_amount <= MAX_BORROW_AMOUNT))
+        # values are multiples of the step, like randrange_float gives
+        steps = (batch.kink_slope - MIN_KINK_SLOPE) / SLOPE_STEP
+        self.assertTrue(np.allclose(steps, np.round(steps)))
+
+    def test_borrow_amounts_fit_the_assets(self):
+        for num_pools in (11, 50, 1000):
+            batch = generate_pool_batch(1000, seed=num_pools, num_pools=num_pools)
+            min_borrow, max_borrow, _ = borrow_amount_range(num_pools)
+            self.assertTrue(np.all(batch.borrow_amount >= min_borrow))
+            self.assertTrue(np.all(batch.borrow_amount <= max_borrow))
+            # there is always something left over to allocate after the borrow amounts
+            self.assertTrue(np.all(batch.borrow_amount.sum(axis=1) < batch.total_assets))
+
+    def test_seeded(self):
+        first = generate_pool_batch(100, seed=1)
+        second = generate_pool_batch(100, seed=1)
+        other = generate_pool_batch(100, seed=2)
+        for field in first._fields:
+            self.assertTrue(np.array_equal(getattr(first, field), getattr(second, field)))
+        self.assertFalse(np.array_equal(first.kink_slope, other.kink_slope))
+
+    def test_assets_and_pools(self):
+        batch = generate_pool_batch(5, seed=3)
+        expected = generate_assets_and_pools()
+        for idx, assets_and_pools in enumerate(batch):
+            self.assertEqual(assets_and_pools["total_assets"], TOTAL_ASSETS)
+            self.assertEqual(
+                list(assets_and_pools["pools"]), list(expected["pools"])
+            )
+            for pool_id, pool in assets_and_pools["pools"].items():
+                self.assertEqual(set(pool), set(expected["pools"][pool_id]))
+                self.assertEqual(pool["pool_id"], pool_id)
+                self.assertEqual(pool["kink_slope"], batch.kink_slope[idx, int(pool_id)])
+
+            pool_arrays = batch.pool_arrays(idx)
+            self.assertEqual(pool_arrays.pool_ids, list(assets_and_pools["pools"]))
+            self.assertTrue(
+                np.array_equal(pool_arrays.borrow_amount, batch.borrow_amount[idx])
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
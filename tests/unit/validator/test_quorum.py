@@ -0,0 +1,43 @@
+import unittest
+from types import SimpleNamespace
+from unittest import TestCase
+
+from sturdy.validator.quorum import LatencyTracker, QuorumPolicy
+
+
+class TestQuorum(TestCase):
+    def test_quorum_policy(self):
+        config = SimpleNamespace(
+            quorum=SimpleNamespace(top_k=0, percent=100.0, grace_period=1.0)
+        )
+        self.assertIsNone(QuorumPolicy.from_config(config))
+        # would answer before a single miner responded
+        config.quorum.percent = 0.0
+        with self.assertRaises(ValueError):
+            QuorumPolicy.from_config(config)
+
+        top_k = QuorumPolicy(top_k=3)
+        self.assertFalse(top_k.reached(2, 100))
+        self.assertTrue(top_k.reached(3, 100))
+        # can't wait for more valid responses than miners were queried
+        self.assertTrue(top_k.reached(2, 2))
+
+        # only valid responses count, not failed or timed out ones
+        percent = QuorumPolicy(percent=50.0)
+        self.assertFalse(percent.reached(10, 21))
+        self.assertTrue(percent.reached(11, 21))
+
+    def test_latency_tracker(self):
+        tracker = LatencyTracker(window=100)
+        self.assertEqual(tracker.percentiles(), {"count": 0, "p50": None, "p99": None})
+
+        for latency in range(200):
+            tracker.record(float(latency))
+        summary = tracker.percentiles()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["p50"], 149.5)
+        self.assertAlmostEqual(summary["p99"], 198.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
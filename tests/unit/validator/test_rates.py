@@ -0,0 +1,120 @@
+import random
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from sturdy.pools import generate_assets_and_pools
+from sturdy.utils.misc import calculate_apy
+from sturdy.utils.rates import PoolArrays, allocation_yields, pool_rates
+
+
+def mixed_pools() -> dict:
+    """One pool of every rate model."""
+    return {
+        "0": {
+            "pool_id": "0",
+            "base_rate": 0.0,
+            "base_slope": 0.03,
+            "kink_slope": 1.5,
+            "optimal_util_rate": 0.8,
+            "borrow_amount": 0.05,
+        },
+        "1": {
+            "pool_id": "1",
+            "model": "multi_kink",
+            "base_rate": 0.01,
+            "kinks": [0.5, 0.9],
+            "slopes": [0.04, 0.2, 2.0],
+            "borrow_amount": 0.04,
+        },
+        "2": {
+            "pool_id": "2",
+            "model": "exponential",
+            "base_rate": 0.0,
+            "base_slope": 0.5,
+            "exponent": 4.0,
+            "borrow_amount": 0.06,
+        },
+        "3": {
+            "pool_id": "3",
+            "model": "table",
+            "utils": [0.0, 0.6, 0.85, 1.0],
+            "rates": [0.0, 0.03, 0.08, 1.0],
+            "borrow_amount": 0.03,
+        },
+        "4": {
+            "pool_id": "4",
+            "model": "table",
+            "utils": [0.2, 1.0],
+            "rates": [0.01, 0.4],
+            "borrow_amount": 0.02,
+        },
+    }
+
+
+class TestRates(TestCase):
+    def test_allocation_yields_match_calculate_apy(self):
+        random.seed(69)
+        rng = np.random.default_rng(69)
+        for _ in range(10):
+            pools = generate_assets_and_pools()["pools"]
+            pool_arrays = PoolArrays.from_pools(pools)
+            allocations = pool_arrays.borrow_amount + rng.uniform(
+                0, 0.2, size=(8, len(pools))
+            )
+
+            rates, yields = allocation_yields(allocations, pool_arrays)
+
+            for miner in range(allocations.shape[0]):
+                expected_yield = 0
+                for idx, pool_id in enumerate(pool_arrays.pool_ids):
+                    pool = pools[pool_id]
+                    allocation = allocations[miner, idx]
+                    rate = calculate_apy(pool["borrow_amount"] / allocation, pool)
+                    self.assertEqual(rates[miner, idx], rate)
+                    expected_yield += allocation * rate
+                self.assertAlmostEqual(yields[miner], expected_yield, places=12)
+
+    def test_rate_models_match_calculate_apy(self):
+        pools = mixed_pools()
+        pool_arrays = PoolArrays.from_pools(pools)
+        self.assertEqual(
+            [group.model for group in pool_arrays.models],
+            ["multi_kink", "exponential", "table"],
+        )
+
+        rng = np.random.default_rng(69)
+        allocations = pool_arrays.borrow_amount + rng.uniform(
+            0, 0.5, size=(16, len(pools))
+        )
+        # hit the kinks and table points exactly too
+        allocations[0] = pool_arrays.borrow_amount / np.array([0.8, 0.5, 1.0, 0.85, 0.2])
+        allocations[1] = pool_arrays.borrow_amount
+        rates = pool_rates(allocations, pool_arrays)
+
+        for miner in range(allocations.shape[0]):
+            for idx, pool_id in enumerate(pool_arrays.pool_ids):
+                pool = pools[pool_id]
+                util_rate = pool["borrow_amount"] / allocations[miner, idx]
+                self.assertAlmostEqual(
+                    rates[miner, idx], calculate_apy(util_rate, pool), places=12
+                )
+
+    def test_rate_models(self):
+        pools = mixed_pools()
+        self.assertAlmostEqual(calculate_apy(0.25, pools["1"]), 0.01 + 0.04 * 0.25)
+        self.assertAlmostEqual(
+            calculate_apy(0.95, pools["1"]), 0.01 + 0.04 * 0.5 + 0.2 * 0.4 + 2.0 * 0.05
+        )
+        self.assertAlmostEqual(calculate_apy(0.0, pools["2"]), 0.0)
+        self.assertAlmostEqual(calculate_apy(1.0, pools["2"]), 0.5)
+        self.assertAlmostEqual(calculate_apy(0.7, pools["3"]), 0.03 + 0.05 * 0.4)
+        self.assertAlmostEqual(calculate_apy(0.1, pools["4"]), 0.01)
+
+        with self.assertRaises(ValueError):
+            PoolArrays.from_pools({"0": {"model": "unknown", "borrow_amount": 0.1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import TestCase
+
+import numpy as np
+import torch
+
+from sturdy.pools import generate_assets_and_pools
+from sturdy.protocol import AllocateAssets
+from sturdy.utils.lazy import lazy_allocation_algorithm
+from sturdy.utils.misc import greedy_allocation_algorithm
+from sturdy.utils.optimal import optimal_allocation_algorithm
+from sturdy.validator.replay import (
+    ReplayParams,
+    RoundRecorder,
+    compare,
+    load_params,
+    load_round,
+    replay,
+    round_paths,
+)
+from sturdy.validator.reward import get_rewards_batched, pack_scoring_args
+
+
+def record_rounds(directory, num_rounds, rate_models=False):
+    """Records some rounds, returning the rewards they got live."""
+    recorder = RoundRecorder(directory)
+    live_rewards = []
+    validator = SimpleNamespace(device="cpu")
+    for step in range(num_rounds):
+        assets_and_pools = generate_assets_and_pools()
+        if rate_models:
+            assets_and_pools["pools"]["1"].update(
+                model="table", utils=[0.0, 0.9, 1.0], rates=[0.0, 0.05, 0.6]
+            )
+        synapse = AllocateAssets(assets_and_pools=assets_and_pools)
+        responses = []
+        for algorithm in (
+            greedy_allocation_algorithm,
+            optimal_allocation_algorithm,
+            lazy_allocation_algorithm,
+            lambda _: None,
+        ):
+            response = AllocateAssets(
+                assets_and_pools=assets_and_pools, allocations=algorithm(synapse)
+            )
+            response.dendrite.process_time = random.random() * 8
+            responses.append(response)
+        uids = random.sample(range(6), len(responses))
+        recorder.record(
+            step, uids, pack_scoring_args(uids, assets_and_pools, responses)
+        )
+        rewards, _ = get_rewards_batched(
+            validator, step, uids, assets_and_pools, responses
+        )
+        live_rewards.append((uids, rewards))
+    recorder.close()
+    return live_rewards
+
+
+class TestReplay(TestCase):
+    def test_replay_matches_live_scoring(self):
+        random.seed(69)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            live_rewards = record_rounds(tmp_dir, 8)
+            paths = round_paths(tmp_dir)
+            self.assertEqual(len(paths), 8)
+
+            result = replay(paths, n_uids=6)
+            self.assertEqual(result.steps.tolist(), list(range(8)))
+            self.assert_replayed(result, live_rewards)
+
+            parallel = replay(paths, n_uids=6, workers=2, chunksize=2)
+            self.assertTrue(np.array_equal(parallel.weights, result.weights))
+
+    def test_replay_rate_models(self):
+        random.seed(42)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            live_rewards = record_rounds(tmp_dir, 4, rate_models=True)
+            self.assert_replayed(replay(round_paths(tmp_dir), n_uids=6), live_rewards)
+
+    def assert_replayed(self, result, live_rewards):
+        # same moving average as BaseValidatorNeuron.update_scores
+        scores = torch.zeros(6)
+        for uids, rewards in live_rewards:
+            scattered = scores.scatter(0, torch.tensor(uids), rewards)
+            scores = 0.1 * scattered + 0.9 * scores
+        self.assertTrue(np.allclose(result.scores, scores.numpy(), atol=1e-6))
+        self.assertTrue(
+            np.allclose(
+                result.weights[-1],
+                torch.nn.functional.normalize(scores, p=1, dim=0).numpy(),
+                atol=1e-6,
+            )
+        )
+
+    def test_compare_params(self):
+        random.seed(420)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            record_rounds(tmp_dir, 5)
+            paths = round_paths(tmp_dir)
+            params = ReplayParams(latency_weight=1.0, apy_weight=0.0, alpha=0.5)
+            baseline_result, result, rank_changes = compare(paths, params)
+
+            self.assertEqual(baseline_result.weights.shape, result.weights.shape)
+            self.assertFalse(np.allclose(baseline_result.weights, result.weights))
+            self.assertEqual(rank_changes.sum(), 0)
+
+            same, also_same, no_changes = compare(paths, ReplayParams())
+            self.assertTrue(np.array_equal(same.weights, also_same.weights))
+            self.assertFalse(no_changes.any())
+
+    def test_rounds_of_the_same_step(self):
+        random.seed(7)
+        assets_and_pools = generate_assets_and_pools()
+        response = AllocateAssets(
+            assets_and_pools=assets_and_pools,
+            allocations=greedy_allocation_algorithm(
+                AllocateAssets(assets_and_pools=assets_and_pools)
+            ),
+        )
+        scoring_args = pack_scoring_args([0], assets_and_pools, [response])
+        params = ReplayParams(alpha=0.05)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # concurrent forwards and organic queries score rounds of the same step
+            recorder = RoundRecorder(tmp_dir, params=params)
+            for step in (3, 3, 4):
+                recorder.record(step, [0], scoring_args)
+            recorder.close()
+
+            # a restarted validator keeps on numbering the rounds
+            recorder = RoundRecorder(tmp_dir, params=params)
+            recorder.record(0, [0], scoring_args)
+            recorder.close()
+
+            paths = round_paths(tmp_dir)
+            self.assertEqual([load_round(path)[0] for path in paths], [3, 3, 4, 0])
+            self.assertEqual(load_params(tmp_dir), params)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import random
+import unittest
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import numpy as np
+import torch
+
+from sturdy.pools import generate_pool_batch
+from sturdy.protocol import AllocateAssets, AllocateAssetsBatch
+from sturdy.utils.misc import greedy_allocation_algorithm
+from sturdy.utils.optimal import optimal_allocation_algorithm
+from sturdy.validator.forward import query_and_score_scenarios
+from sturdy.validator.latency import LatencyProfiles
+from sturdy.validator.reward import get_rewards_batched, get_rewards_scenarios
+
+
+def make_batch_response(scenarios, algorithm, process_time):
+    response = AllocateAssetsBatch(scenarios=scenarios)
+    if algorithm is not None:
+        response.allocations = [
+            algorithm(AllocateAssets(assets_and_pools=assets_and_pools))
+            for assets_and_pools in scenarios
+        ]
+    response.dendrite.process_time = process_time
+    return response
+
+
+class TestScenarios(TestCase):
+    def test_split(self):
+        scenarios = list(generate_pool_batch(3, seed=0))
+        response = AllocateAssetsBatch.parse_raw(
+            make_batch_response(scenarios, optimal_allocation_algorithm, 1.5).json()
+        )
+        split = response.split()
+        self.assertEqual(len(split), 3)
+        for assets_and_pools, allocations, scenario in zip(
+            scenarios, response.allocations, split
+        ):
+            self.assertEqual(scenario.assets_and_pools, assets_and_pools)
+            self.assertEqual(scenario.allocations, allocations)
+            self.assertEqual(scenario.dendrite.process_time, 1.5)
+
+        # scenarios missing from the response count as not answered
+        response.allocations = response.allocations[:1]
+        response.scenarios = []
+        split = response.split(scenarios)
+        self.assertEqual(
+            [scenario.allocations is None for scenario in split], [False, True, True]
+        )
+
+    def test_rewards_are_averaged_over_scenarios(self):
+        random.seed(42)
+        validator = SimpleNamespace(device="cpu")
+        scenarios = list(generate_pool_batch(4, seed=1))
+        responses = [
+            make_batch_response(scenarios, optimal_allocation_algorithm, 1.0),
+            make_batch_response(scenarios, greedy_allocation_algorithm, 4.0),
+            make_batch_response(scenarios, None, None),
+        ]
+        # cheats in one of the scenarios only
+        cheater = make_batch_response(scenarios, optimal_allocation_algorithm, 2.0)
+        cheater.allocations[2]["0"] += 1
+        responses.append(cheater)
+        uids = [5, 3, 9, 1]
+
+        rewards, allocs = asyncio.run(
+            get_rewards_scenarios(validator, 0, uids, scenarios, responses)
+        )
+
+        expected = []
+        for idx, assets_and_pools in enumerate(scenarios):
+            scenario_rewards, scenario_allocs = get_rewards_batched(
+                validator,
+                0,
+                uids,
+                assets_and_pools,
+                [response.split()[idx] for response in responses],
+            )
+            expected.append(scenario_rewards)
+            self.assertEqual(allocs[idx].keys(), scenario_allocs.keys())
+        self.assertIsInstance(rewards, torch.FloatTensor)
+        self.assertTrue(
+            torch.allclose(rewards, torch.stack(expected).mean(dim=0), atol=1e-6)
+        )
+        self.assertNotIn(9, allocs[0])
+        self.assertGreater(rewards[0], rewards[3])
+
+
+class FakeDendrite:
+    """Answers every scenario optimally, keeping track of the timeouts it was given."""
+
+    def __init__(self):
+        self.timeouts = {}
+
+    async def forward(self, axons, synapse, timeout, deserialize, streaming):
+        self.timeouts[axons] = timeout
+        return make_batch_response(
+            synapse.scenarios, optimal_allocation_algorithm, timeout / 2
+        )
+
+
+class TestQueryScenarios(IsolatedAsyncioTestCase):
+    async def test_batch_timeouts(self):
+        latency_profiles = LatencyProfiles(3)
+        for step in range(10):
+            latency_profiles.record([0, 1], [0.2, 4.0], step)
+        validator = SimpleNamespace(
+            config=SimpleNamespace(
+                neuron=SimpleNamespace(
+                    adaptive_timeouts=True, disable_packed_pools=False
+                )
+            ),
+            availability_index=SimpleNamespace(serving_uids=np.array([0, 1])),
+            metagraph=SimpleNamespace(axons=[0, 1, 2]),
+            latency_profiles=latency_profiles,
+            dendrite=FakeDendrite(),
+            packed_versions={},
+            score_history=None,
+            step=10,
+            device="cpu",
+            update_scores=lambda rewards, uids: None,
+        )
+        before = latency_profiles.summary([0, 1])
+
+        scenarios = list(generate_pool_batch(4, seed=2))
+        await query_and_score_scenarios(validator, scenarios)
+        # as long as the scenarios would take one after the other, and no less than usual
+        self.assertEqual(validator.dendrite.timeouts[0], 10.0)
+        self.assertEqual(
+            validator.dendrite.timeouts[1], 4 * latency_profiles.timeout(1)
+        )
+        # batch response times say nothing about single scenarios
+        self.assertEqual(latency_profiles.summary([0, 1]), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
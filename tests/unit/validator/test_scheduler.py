@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import TestCase
+
+from sturdy.base.validator import BaseValidatorNeuron
+from sturdy.utils.scheduler import BlockScheduler
+
+
+class FakeSubtensor:
+    def __init__(self):
+        self.block = 100
+
+    def get_current_block(self):
+        # the chain moves on a block every time it is asked
+        self.block += 1
+        return self.block
+
+
+class TestBlockScheduler(TestCase):
+    def test_jobs_run_at_their_cadence(self):
+        scheduler = BlockScheduler(FakeSubtensor(), use_subscription=False)
+        runs = {"forward": [], "sync": []}
+        scheduler.add_job(
+            "forward", 2, lambda: runs["forward"].append(scheduler.last_block)
+        )
+        scheduler.add_job("sync", 4, lambda: runs["sync"].append(scheduler.last_block))
+
+        block = 100
+        for _ in range(8):
+            block = scheduler.wait_for_block(block)
+            scheduler.run_due(block)
+
+        self.assertEqual(runs["forward"], [101, 103, 105, 107])
+        self.assertEqual(runs["sync"], [101, 105])
+        stats = scheduler.stats()
+        self.assertEqual(stats["forward"]["runs"], 4)
+        self.assertEqual(stats["sync"]["over_budget"], 0)
+        self.assertAlmostEqual(stats["sync"]["budget"], 4 * scheduler.block_time)
+
+    def test_first_run_waits_for_the_cadence(self):
+        # how the validator runs its forwards: once more than QUERY_RATE blocks passed
+        scheduler = BlockScheduler(FakeSubtensor(), use_subscription=False)
+        runs = []
+        scheduler.add_job(
+            "forward", 3, lambda: runs.append(scheduler.last_block)
+        ).last_block = 100
+
+        block = 100
+        for _ in range(9):
+            block = scheduler.wait_for_block(block)
+            scheduler.run_due(block)
+        self.assertEqual(runs, [103, 106, 109])
+
+    def test_subscription_falls_back_to_polling(self):
+        scheduler = BlockScheduler(FakeSubtensor())
+        # FakeSubtensor has no substrate to subscribe to
+        self.assertEqual(scheduler.wait_for_block(100), 101)
+        self.assertFalse(scheduler.use_subscription)
+
+    def test_step_counts_forward_rounds(self):
+        scheduler = BlockScheduler(FakeSubtensor(), use_subscription=False)
+        forwards = []
+
+        async def concurrent_forward():
+            forwards.append(validator.step)
+
+        validator = SimpleNamespace(
+            step=0,
+            block=100,
+            pipeline=None,
+            loop=asyncio.new_event_loop(),
+            concurrent_forward=concurrent_forward,
+            config=SimpleNamespace(
+                organic=False, neuron=SimpleNamespace(sync_cadence=4)
+            ),
+        )
+        scheduler.add_job(
+            "forward", 2, lambda: BaseValidatorNeuron.run_forward(validator)
+        )
+
+        block = 100
+        for _ in range(8):
+            block = scheduler.wait_for_block(block)
+            scheduler.run_due(block)
+        validator.loop.close()
+
+        # blocks without a forward don't move the step on
+        self.assertEqual(forwards, [0, 1, 2, 3])
+        self.assertEqual(validator.step, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from types import SimpleNamespace
+from unittest import TestCase
+
+import torch
+
+from sturdy.utils.uids import AvailabilityIndex, diff_metagraph, get_random_uids
+
+
+def make_metagraph(serving):
+    return SimpleNamespace(
+        n=torch.tensor(len(serving)),
+        axons=[SimpleNamespace(is_serving=is_serving) for is_serving in serving],
+        S=torch.arange(len(serving), dtype=torch.float32),
+        validator_permit=torch.zeros(len(serving), dtype=torch.bool),
+    )
+
+
+class TestUids(TestCase):
+    def test_availability_index(self):
+        metagraph = make_metagraph([True, False, True, True, False])
+        index = AvailabilityIndex(metagraph)
+        self.assertEqual(index.serving_uids.tolist(), [0, 2, 3])
+        self.assertTrue(torch.equal(index.stake, metagraph.S))
+
+        metagraph.axons[1].is_serving = True
+        metagraph.axons[2].is_serving = False
+        metagraph.S[4] = 100.0
+        # only the given uids get checked again
+        index.update(metagraph, uids=[1])
+        self.assertEqual(index.serving_uids.tolist(), [0, 1, 2, 3])
+        self.assertEqual(index.stake[4].item(), 100.0)
+        index.update(metagraph)
+        self.assertEqual(index.serving_uids.tolist(), [0, 1, 3])
+
+    def test_get_random_uids(self):
+        torch.manual_seed(69)
+        metagraph = make_metagraph([True, False, True, True, False, True])
+        validator = SimpleNamespace(availability_index=AvailabilityIndex(metagraph))
+
+        uids = get_random_uids(validator, 3, exclude=[0])
+        self.assertEqual(sorted(uids.tolist()), [2, 3, 5])
+
+        # not enough candidates, so excluded uids are used to fill up
+        uids = get_random_uids(validator, 3, exclude=[0, 2, 3])
+        self.assertEqual(len(uids), 3)
+        self.assertEqual(len(set(uids.tolist())), 3)
+        self.assertIn(5, uids.tolist())
+
+        # can't return more uids than are available
+        self.assertEqual(sorted(get_random_uids(validator, 10).tolist()), [0, 2, 3, 5])
+
+    def test_diff_metagraph(self):
+        metagraph = make_metagraph([True, True, False])
+        metagraph.hotkeys = ["a", "b", "c"]
+        previous_hotkeys = list(metagraph.hotkeys)
+        previous_axons = list(metagraph.axons)
+        self.assertTrue(diff_metagraph(previous_hotkeys, previous_axons, metagraph).is_empty)
+
+        metagraph.hotkeys = ["a", "d", "c", "e"]
+        metagraph.axons = [
+            metagraph.axons[0],
+            SimpleNamespace(is_serving=False),
+            metagraph.axons[2],
+            SimpleNamespace(is_serving=True),
+        ]
+        diff = diff_metagraph(previous_hotkeys, previous_axons, metagraph)
+        self.assertEqual(diff.replaced_uids, [1])
+        self.assertEqual(diff.new_uids, [3])
+        self.assertEqual(diff.axon_changed_uids, [1])
+        self.assertFalse(diff.is_empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 from unittest import IsolatedAsyncioTestCase
 import sys
+import threading
+
+import torch
 
 from sturdy.protocol import AllocateAssets
 from neurons.validator import Validator
@@ -304,6 +307,30 @@ class TestValidator(IsolatedAsyncioTestCase):
 
         print(f"sorted rewards: {sorted_rewards}")
 
+    def test_concurrent_score_updates(self):
+        # organic and pipelined rounds update the scores from different threads
+        validator = self.validator
+        validator.scores = torch.zeros_like(validator.scores)
+        uids = [1, 2, 3]
+        rewards = torch.ones(len(uids))
+
+        def update():
+            for _ in range(50):
+                validator.update_scores(rewards, uids)
+
+        threads = [threading.Thread(target=update) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        alpha = validator.config.neuron.moving_average_alpha
+        expected = 1 - (1 - alpha) ** 400
+        self.assertTrue(
+            torch.allclose(validator.scores[uids], torch.full((3,), expected))
+        )
+        self.assertEqual(validator.scores[0].item(), 0)
+
 
 if __name__ == "__main__":
     print("hello")